@@ -2,24 +2,26 @@ import azure.functions as func
 import os
 import json
 import logging
+import re
 import time
 import requests
 import pyodbc
-from datetime import datetime
 import traceback # traceback 모듈 임포트
+from concurrent.futures import ThreadPoolExecutor
+from sql_plan_cache import SqlPlanCache
+from query_result_cache import QueryResultCache
+from db_pool import ConnectionPool, is_disconnect_error
+from result_serializer import RESULT_FORMATS, RESULT_MAX_BYTES, dumps, fetch_result, rows_as_dicts, serialize_response
+from sql_guard import SQL_QUERY_TIMEOUT, SqlCostError, SqlGuardError, check_static, validate
+from schema_catalog import SchemaCatalog
 
 # Application Insights 로깅 설정
 app = func.FunctionApp(http_auth_level=func.AuthLevel.ANONYMOUS)
 logger = logging.getLogger(__name__)
 
-# datetime 객체를 JSON 직렬화 가능하도록 변환하는 도우미 함수
-# (이전 테스트에서 datetime is not JSON serializable 오류를 해결했습니다)
-def json_serial(obj):
-    if isinstance(obj, datetime):
-        return obj.isoformat() # ISO 8601 형식의 문자열로 변환 (예: '2023-01-01T12:30:00')
-    raise TypeError(f"Object of type {obj.__class__.__name__} is not JSON serializable")
-
 # SCHEMA_INFO 정의 (데이터베이스 스키마 정보)
+# 실제 스키마는 SchemaCatalog가 INFORMATION_SCHEMA에서 읽어 오며, 이 값은 DB 카탈로그를 읽지 못했을 때만 사용합니다.
+# ga_data 테이블은 stream data/storeToSQL/sql/schema.sql 기준입니다.
 SCHEMA_INFO = """
 === Microsoft SQL Server 데이터베이스 ===
 
@@ -33,12 +35,246 @@ dbo 스키마:
 - dbo.vw_StockAnalysis: change_percent, close_price, date, ma_30, ma_7, prev_close, symbol
 
 ga_data 스키마:
-- ga_data.Analytics: actionType, adContent, browser, campaign, channelGrouping, city, country, date, deviceCategory, eventAction, eventCategory, fullVisitorId, hits, hostname, medium, operatingSystem, pagePath, pageTitle, pageviews, productBrand, productId, productPrice, productRevenue, referralPath, region, source, timeOnSite, totalTransactionRevenue, transactionId, transactions, visits, visitNumber
-- ga_data.CustomDimensions: cdId, dimensionIndex, dimensionValue, hitId, visitorId
-- ga_data.DateTracking: description, id, setting_key, setting_value, updated_at
-- ga_data.ProcessStatus: analytics_count, error_message, execution_time, processed_date, records_processed, run_date, status
+- ga_data.Sessions: session_key, primary_key, visitNumber, visitId, visitStartTime, date, fullVisitorId, channelGrouping, socialEngagementType
+- ga_data.Totals: session_key, primary_key, visitorId, visits, hits, pageviews, timeOnSite, bounces, transactions, newVisits, totalTransactionRevenue, sessionQualityDim
+- ga_data.Traffic: session_key, primary_key, visitorId, referralPath, campaign, source, medium, keyword, adContent, adwordsPage, adwordsSlot, gclId, adNetworkType, isTrueDirect
+- ga_data.DeviceGeo: session_key, primary_key, visitorId, browser, operatingSystem, deviceCategory, continent, subContinent, country, region, metro, city
+- ga_data.Hits: hit_key, session_key, hitId, primary_key, visitorId, hitNumber, time, hour, minute, isInteraction, isEntrance, isExit, pagePath, hostname, pageTitle, searchKeyword, transactionId, screenName, landingScreenName, exitScreenName, screenDepth, eventCategory, eventAction, eventLabel, actionType, hitType, socialNetwork, hasSocialSourceReferral, contentGroup1, contentGroup2, contentGroup3, previousContentGroup1, previousContentGroup2, previousContentGroup3, contentGroupUniqueViews1, contentGroupUniqueViews2, contentGroupUniqueViews3, product_productQuantity
+- ga_data.HitsProduct: product_hit_key, hit_key, productId, hitId, visitorId, hitNumber, v2ProductName, v2ProductCategory, productBrand, productPrice, productRevenue, isImpression, isClick, productListName, productListPosition, productSKU
 """
 
+# 배치 요청 한 번에 받을 수 있는 최대 질문 수 / 동시에 처리할 질문 수
+SQL_BATCH_MAX_QUESTIONS = int(os.environ.get("SQL_BATCH_MAX_QUESTIONS", "10"))
+SQL_BATCH_CONCURRENCY = int(os.environ.get("SQL_BATCH_CONCURRENCY", "4"))
+
+# 생성된 SQL이 실패했을 때 오류 메시지를 돌려주어 수정을 요청하는 최대 횟수
+SQL_REPAIR_MAX_ATTEMPTS = int(os.environ.get("SQL_REPAIR_MAX_ATTEMPTS", "2"))
+
+# SQL Database 연결 문자열을 만드는 함수 (연결 풀이 새 연결을 열 때 호출)
+def build_connection_string():
+    sql_server = os.environ.get('SQL_SERVER')
+    sql_database = os.environ.get('SQL_DATABASE')
+    sql_username = os.environ.get('SQL_USERNAME')
+    sql_password = os.environ.get('SQL_PASSWORD') # SQL_PASSWORD 환경 변수 사용
+
+    if not all([sql_server, sql_database, sql_username, sql_password]):
+        raise ValueError("SQL 연결을 위한 환경 변수(SERVER, DATABASE, USERNAME, PASSWORD)가 설정되지 않았습니다.")
+
+    # pyodbc 연결 문자열 (드라이버 18 사용)
+    return (
+        f"DRIVER={{ODBC Driver 18 for SQL Server}};"
+        f"SERVER={sql_server};"
+        f"DATABASE={sql_database};"
+        f"UID={sql_username};"
+        f"PWD={sql_password}"
+    )
+
+# 질문 → SQL 템플릿 캐시 / 쿼리 결과 캐시 / 연결 풀 / 스키마 카탈로그 (워커 프로세스 단위로 공유)
+schema_catalog = SchemaCatalog(SCHEMA_INFO)
+plan_cache = SqlPlanCache()
+result_cache = QueryResultCache()
+db_pool = ConnectionPool(build_connection_string)
+db_pool.warm_async() # 호스트 시작 시 연결을 미리 열어 첫 요청의 로그인 지연을 없앱니다
+
+# Azure OpenAI Chat Completions API를 호출하여 SQL 텍스트를 받는 함수
+def call_openai_sql(prompt):
+    # OpenAI API 관련 환경 변수 확인 (미리 테스트 완료)
+    azure_openai_api_key = os.environ.get("AZURE_OPENAI_API_KEY")
+    azure_openai_endpoint = os.environ.get("AZURE_OPENAI_ENDPOINT")
+    azure_deployment_name = os.environ.get("AZURE_DEPLOYMENT_NAME")
+
+    if not all([azure_openai_api_key, azure_openai_endpoint, azure_deployment_name]):
+        raise ValueError("OpenAI API 환경 변수(API_KEY, ENDPOINT, DEPLOYMENT_NAME)가 설정되지 않았습니다.")
+
+    api_headers = {
+        "Content-Type": "application/json",
+        "api-key": azure_openai_api_key
+    }
+    
+    payload = {
+        "messages": [{"role": "user", "content": prompt}],
+        "max_tokens": 250,
+        "temperature": 0,
+        "top_p": 1,
+        "frequency_penalty": 0,
+        "presence_penalty": 0
+    }
+    
+    api_url = f"{azure_openai_endpoint}/openai/deployments/{azure_deployment_name}/chat/completions?api-version=2024-12-01-preview"
+    
+    response = requests.post(api_url, headers=api_headers, json=payload, timeout=30) # OpenAI API 호출 타임아웃
+    response.raise_for_status() # HTTP 오류 발생 시 예외 발생 (4xx, 5xx)
+    
+    generated_sql = response.json()['choices'][0]['message']['content'].strip()
+
+    # OpenAI가 생성한 쿼리에서 마크다운 백틱(```sql, ```)을 제거합니다.
+    generated_sql = generated_sql.replace("```sql", "").replace("```", "").strip()
+
+    # SELECT 전용/허용 테이블 정적 검사, TOP이 없으면 TOP 추가
+    try:
+        return check_static(generated_sql, schema_catalog.tables())
+    except SqlGuardError as e:
+        e.sql = generated_sql # 수정 요청 시 거부된 원래 SQL을 함께 보내기 위해 보관
+        raise
+
+# Azure OpenAI로 자연어 질문에 대한 SQL 쿼리를 생성하는 함수
+def generate_sql(user_question):
+    # 질문과 관련된 테이블/컬럼만 프롬프트에 포함
+    schema_text = schema_catalog.schema_for_question(user_question)
+
+    prompt = f"""
+    당신은 Microsoft SQL Server 전문가입니다. 아래 스키마만 사용하여 SELECT 쿼리를 생성하세요.
+    {schema_text}
+    STRICT RULES:
+    1. ONLY SELECT statements allowed
+    2. USE ONLY Microsoft SQL Server syntax
+    3. USE TOP instead of LIMIT
+    4. ONLY use tables/columns from schema above
+    5. NO DROP/DELETE/UPDATE/INSERT commands
+    Question: {user_question}
+    Return ONLY the SQL query:"""
+    return call_openai_sql(prompt)
+
+# 실패한 SQL과 오류 메시지를 돌려주어 수정된 SQL을 받는 함수
+def repair_sql(user_question, failed_sql, error_message):
+    # 질문 관련 테이블 + 실패한 SQL이 참조한 테이블의 컬럼을 함께 보여 줍니다
+    schema_text = schema_catalog.schema_for_sql(user_question, failed_sql)
+
+    prompt = f"""
+    당신은 Microsoft SQL Server 전문가입니다. 아래 SQL이 오류로 실패했습니다. 스키마를 참고하여 오류를 고친 SELECT 쿼리를 작성하세요.
+    {schema_text}
+    Question: {user_question}
+    Failed SQL: {failed_sql}
+    Error: {error_message}
+    STRICT RULES:
+    1. ONLY SELECT statements allowed
+    2. USE ONLY Microsoft SQL Server syntax
+    3. ONLY use tables/columns from schema above
+    Return ONLY the corrected SQL query:"""
+    return call_openai_sql(prompt)
+
+# pyodbc 오류 메시지에서 드라이버 접두어([Microsoft][ODBC Driver 18 ...])와 호출 정보를 제거하는 함수
+def sql_error_message(error):
+    message = str(error.args[1]) if isinstance(error, pyodbc.Error) and len(error.args) > 1 else str(error)
+    message = re.sub(r"\[[^\]]*\]", "", message)
+    message = re.sub(r"\s*\((?:\d+|SQL\w+)\)", "", message)
+    return " ".join(message.split())[:500]
+
+# 연결 풀에서 연결을 빌려 쿼리를 실행하고, 연결/쿼리 시간을 timings에 누적하는 함수
+# Azure SQL이 유휴 연결을 끊어 실행이 실패하면 새 연결로 한 번 더 시도합니다
+def run_sql(sql, params, timings):
+    for attempt in range(2):
+        connect_start = time.time()
+        try:
+            with db_pool.connection() as conn:
+                query_start = time.time()
+                timings["connect"] += query_start - connect_start
+                try:
+                    return execute_query_cached(conn, sql, params)
+                finally:
+                    timings["query"] += time.time() - query_start
+        except pyodbc.Error as e:
+            if attempt == 0 and is_disconnect_error(e):
+                logger.warning(f"SQL 연결 끊김 감지, 새 연결로 재시도: {e}")
+                continue
+            raise
+
+# 결과 캐시를 먼저 확인하고, 없으면 쿼리를 실행해 캐시에 저장하는 함수
+def execute_query_cached(conn, sql, params=None):
+    watermark = result_cache.watermark(conn)
+    result = result_cache.get(sql, params, watermark)
+    if result is not None:
+        return result, True
+    validate(conn, sql, params) # 실제 실행 전 예상 실행 계획 비용 검사 / dry-run 컴파일 확인
+    result = execute_query(conn, sql, params)
+    result_cache.put(sql, params, watermark, result)
+    return result, False
+
+# 쿼리를 실행하고 fetchmany로 결과를 나누어 가져오는 함수 (RESULT_MAX_ROWS 행까지)
+def execute_query(conn, sql, params=None):
+    conn.timeout = SQL_QUERY_TIMEOUT # 쿼리 실행 타임아웃 (초)
+    cursor = conn.cursor()
+    try:
+        if params:
+            cursor.execute(sql, params) # 템플릿 SQL은 파라미터 바인딩으로 실행
+        else:
+            cursor.execute(sql)
+        return fetch_result(cursor)
+    finally:
+        cursor.close()
+
+# 스키마 카탈로그 갱신 (TTL 경과 시). 스키마가 바뀌면 이전 스키마로 만든 SQL 템플릿은 버립니다
+def refresh_schema(start_time):
+    if schema_catalog.refresh(db_pool.connection) and len(plan_cache):
+        logger.info(f"[{time.time() - start_time:.2f}s] 스키마 버전 변경({schema_catalog.version}): SQL 템플릿 캐시 초기화")
+        plan_cache.clear()
+
+# 질문 하나에 대해 SQL 템플릿 캐시 → (미스 시) LLM 생성/수정 → 실행까지 수행하는 함수
+# 단일 질문 요청과 배치 요청이 함께 사용하며, 연결/LLM/쿼리 시간은 timings에 누적합니다
+def answer_question(user_question, timings, start_time):
+    # 2. 캐시된 SQL 템플릿 재사용 시도 (적중 시 LLM 호출 생략)
+    result = None
+    sql_params = []
+    cache_status = "miss"
+    result_cached = False
+    cached = plan_cache.lookup(user_question)
+    if cached:
+        validated_sql, sql_params, template = cached
+        logger.info(f"[{time.time() - start_time:.2f}s] SQL 템플릿 캐시 적중: '{validated_sql}' params={sql_params}")
+        try:
+            result, result_cached = run_sql(validated_sql, sql_params, timings)
+            plan_cache.record_success(template)
+            cache_status = "hit"
+        except pyodbc.Error as cache_error:
+            # 템플릿 실행이 실패하면 실패를 기록하고 LLM으로 새로 생성합니다
+            logger.warning(f"[{time.time() - start_time:.2f}s] 캐시된 템플릿 실행 실패, LLM으로 재생성: {cache_error}")
+            plan_cache.record_failure(template)
+            sql_params = []
+
+    # 3. 캐시 미스: OpenAI API 호출로 SQL 쿼리 생성 후 연결 풀의 연결로 실행 (LLM 호출 동안에는 연결을 점유하지 않습니다)
+    # 컴파일/형 변환 오류나 정적 검사 거부는 오류 메시지를 모델에 돌려주어 최대 SQL_REPAIR_MAX_ATTEMPTS번 수정합니다
+    repairs = 0
+    if result is None:
+        validated_sql = failed_sql = error_message = None
+        while True:
+            try:
+                llm_start = time.time()
+                try:
+                    if failed_sql is None:
+                        logger.info(f"[{time.time() - start_time:.2f}s] OpenAI API 호출 시작...")
+                        validated_sql = generate_sql(user_question)
+                    else:
+                        validated_sql = repair_sql(user_question, failed_sql, error_message)
+                finally:
+                    timings["llm"] += time.time() - llm_start
+                logger.info(f"[{time.time() - start_time:.2f}s] 쿼리 실행 시도: '{validated_sql}'")
+                result, result_cached = run_sql(validated_sql, None, timings)
+                break
+            except SqlCostError:
+                raise # 비용 초과는 SQL 오류가 아니므로 수정 요청하지 않습니다
+            except (SqlGuardError, pyodbc.ProgrammingError, pyodbc.DataError) as sql_error:
+                rejected_sql = getattr(sql_error, "sql", None) or validated_sql
+                if repairs >= SQL_REPAIR_MAX_ATTEMPTS or rejected_sql is None:
+                    raise
+                failed_sql = rejected_sql
+                error_message = sql_error_message(sql_error)
+                repairs += 1
+                logger.warning(f"[{time.time() - start_time:.2f}s] SQL 실패, 수정 요청 ({repairs}/{SQL_REPAIR_MAX_ATTEMPTS}): {error_message}")
+
+        # 실행에 성공한 SQL만 템플릿으로 저장
+        if plan_cache.store(user_question, validated_sql, repairs=repairs):
+            logger.info(f"[{time.time() - start_time:.2f}s] SQL 템플릿 캐시에 저장 (총 {len(plan_cache)}개, 수정 {repairs}회)")
+    logger.info(f"[{time.time() - start_time:.2f}s] 쿼리 결과 처리 완료 (연결 {timings['connect']:.2f}s, 쿼리 {timings['query']:.2f}s)")
+
+    return {
+        "sql_query": validated_sql,
+        "sql_params": sql_params,
+        "plan_cache": cache_status,
+        "result_cache": "hit" if result_cached else "miss",
+        "sql_repairs": repairs,
+        "result": result,
+    }
+
 @app.function_name(name="SqlQueryFunction")
 @app.route(route="sqlquery", methods=["GET", "POST"])
 def sql_query_function(req: func.HttpRequest) -> func.HttpResponse:
@@ -48,12 +284,15 @@ def sql_query_function(req: func.HttpRequest) -> func.HttpResponse:
     try:
         # 1. 사용자 질문 파싱
         user_question = req.params.get('question')
-        if not user_question:
+        result_format = req.params.get('format')
+        if not user_question or not result_format:
             try:
                 req_body = req.get_json()
-                user_question = req_body.get('question')
+                user_question = user_question or req_body.get('question')
+                result_format = result_format or req_body.get('format')
             except ValueError:
                 pass # JSON body가 없거나 파싱 오류
+        result_format = (result_format or "rows").lower()
             
         if not user_question:
             logger.warning(f"[{time.time() - start_time:.2f}s] 질문이 제공되지 않았습니다.")
@@ -62,114 +301,62 @@ def sql_query_function(req: func.HttpRequest) -> func.HttpResponse:
                 status_code=400,
                 mimetype="application/json"
             )
+        if result_format not in RESULT_FORMATS:
+            return func.HttpResponse(
+                json.dumps({"error": f"지원하지 않는 응답 형식입니다: {result_format} (rows, columnar, ndjson 중 선택)"}, ensure_ascii=False),
+                status_code=400,
+                mimetype="application/json"
+            )
         logger.info(f"[{time.time() - start_time:.2f}s] 사용자 질문: '{user_question}'")
 
-        # 2. OpenAI API 호출 및 SQL 쿼리 생성
-        logger.info(f"[{time.time() - start_time:.2f}s] OpenAI API 호출 시작...")
-        
-        # OpenAI API 관련 환경 변수 확인 (미리 테스트 완료)
-        azure_openai_api_key = os.environ.get("AZURE_OPENAI_API_KEY")
-        azure_openai_endpoint = os.environ.get("AZURE_OPENAI_ENDPOINT")
-        azure_deployment_name = os.environ.get("AZURE_DEPLOYMENT_NAME")
+        timings = {"connect": 0.0, "llm": 0.0, "query": 0.0}
 
-        if not all([azure_openai_api_key, azure_openai_endpoint, azure_deployment_name]):
-            raise ValueError("OpenAI API 환경 변수(API_KEY, ENDPOINT, DEPLOYMENT_NAME)가 설정되지 않았습니다.")
+        refresh_schema(start_time)
 
-        api_headers = {
-            "Content-Type": "application/json",
-            "api-key": azure_openai_api_key
-        }
-        
-        prompt = f"""
-        당신은 Microsoft SQL Server 전문가입니다. 아래 스키마만 사용하여 SELECT 쿼리를 생성하세요.
-        {SCHEMA_INFO}
-        STRICT RULES:
-        1. ONLY SELECT statements allowed
-        2. USE ONLY Microsoft SQL Server syntax
-        3. USE TOP instead of LIMIT
-        4. ONLY use tables/columns from schema above
-        5. NO DROP/DELETE/UPDATE/INSERT commands
-        Question: {user_question}
-        Return ONLY the SQL query:"""
-        
-        payload = {
-            "messages": [{"role": "user", "content": prompt}],
-            "max_tokens": 250,
-            "temperature": 0,
-            "top_p": 1,
-            "frequency_penalty": 0,
-            "presence_penalty": 0
-        }
-        
-        api_url = f"{azure_openai_endpoint}/openai/deployments/{azure_deployment_name}/chat/completions?api-version=2024-12-01-preview"
-        
-        response = requests.post(api_url, headers=api_headers, json=payload, timeout=30) # OpenAI API 호출 타임아웃
-        response.raise_for_status() # HTTP 오류 발생 시 예외 발생 (4xx, 5xx)
-        
-        generated_sql = response.json()['choices'][0]['message']['content'].strip()
-        logger.info(f"[{time.time() - start_time:.2f}s] OpenAI로부터 생성된 SQL: '{generated_sql}'")
-
-        # 3. SQL 쿼리 유효성 검사 및 수정 (가장 최근 수정 부분!)
-        # OpenAI가 생성한 쿼리에서 마크다운 백틱(```sql, ```)을 제거합니다.
-        validated_sql = generated_sql.replace("```sql", "").replace("```", "").strip() 
-        logger.info(f"[{time.time() - start_time:.2f}s] 최종 실행할 SQL (유효성 검사 후): '{validated_sql}'")
-
-        # 4. SQL Database 연결 및 쿼리 실행
-        sql_server = os.environ.get('SQL_SERVER')
-        sql_database = os.environ.get('SQL_DATABASE')
-        sql_username = os.environ.get('SQL_USERNAME')
-        sql_password = os.environ.get('SQL_PASSWORD') # SQL_PASSWORD 환경 변수 사용
-
-        if not all([sql_server, sql_database, sql_username, sql_password]):
-            raise ValueError("SQL 연결을 위한 환경 변수(SERVER, DATABASE, USERNAME, PASSWORD)가 설정되지 않았습니다.")
-
-        # pyodbc 연결 문자열 (드라이버 18 사용)
-        conn_str = (
-            f"DRIVER={{ODBC Driver 18 for SQL Server}};"
-            f"SERVER={sql_server};"
-            f"DATABASE={sql_database};"
-            f"UID={sql_username};"
-            f"PWD={sql_password}"
+        # 2~3. 템플릿 캐시 또는 LLM으로 SQL을 얻어 실행
+        answer = answer_question(user_question, timings, start_time)
+        result = answer.pop("result")
+
+        # 4. 최종 응답 반환 (행 단위로 인코딩하며 RESULT_MAX_BYTES 초과 시 잘라냄)
+        response_meta = dict(question=user_question, **answer)
+
+        def response_timings():
+            execution_time = time.time() - start_time
+            return {
+                "execution_time": f"{execution_time:.2f}s",
+                "connect_time": f"{timings['connect']:.2f}s",
+                "llm_time": f"{timings['llm']:.2f}s",
+                "query_time": f"{timings['query']:.2f}s"
+            }
+
+        body, mimetype = serialize_response(response_meta, result, result_format, trailer=response_timings)
+        return func.HttpResponse(body, mimetype=mimetype)
+
+    except SqlGuardError as e:
+        # 안전성/비용 검사 거부는 서버 오류가 아니라 요청(질문) 문제로 응답합니다
+        execution_time = time.time() - start_time
+        logger.warning(f"[{execution_time:.2f}s] SQL 안전성/비용 검사 거부: {str(e)}")
+        return func.HttpResponse(
+            json.dumps({
+                "error": str(e),
+                "message": "생성된 쿼리가 안전성/비용 검사를 통과하지 못했습니다.",
+                "execution_time": f"{execution_time:.2f}s"
+            }, ensure_ascii=False),
+            status_code=422,
+            mimetype="application/json"
         )
-        
-        logger.info(f"[{time.time() - start_time:.2f}s] DB 연결 시도 중...")
-        # pyodbc 연결 타임아웃 (300초 = 5분)
-        conn = pyodbc.connect(conn_str, timeout=300) 
-        logger.info(f"[{time.time() - start_time:.2f}s] DB 연결 성공!")
-        
-        cursor = conn.cursor()
-        
-        logger.info(f"[{time.time() - start_time:.2f}s] 쿼리 실행 시도: '{validated_sql}'")
-        cursor.execute(validated_sql) # SQL 쿼리 실행
-        logger.info(f"[{time.time() - start_time:.2f}s] 쿼리 실행 완료. 결과 가져오는 중...")
-
-        columns = [column[0] for column in cursor.description]
-        rows = []
-        for row_tuple in cursor.fetchall(): # 모든 결과 가져오기
-            row_dict = dict(zip(columns, row_tuple))
-            processed_row = {}
-            for k, v in row_dict.items():
-                if isinstance(v, datetime):
-                    processed_row[k] = v.isoformat() # datetime 객체 ISO 형식 문자열로 변환
-                else:
-                    processed_row[k] = v
-            rows.append(processed_row)
-        
-        cursor.close()
-        conn.close()
-        logger.info(f"[{time.time() - start_time:.2f}s] 쿼리 결과 처리 및 DB 연결 종료.")
 
-        # 5. 최종 응답 반환
+    except (pyodbc.ProgrammingError, pyodbc.DataError) as e:
+        # 수정 요청을 모두 사용한 뒤에도 SQL이 실패한 경우 (서버 오류가 아니므로 traceback 없이 응답)
         execution_time = time.time() - start_time
-        response_data = {
-            "question": user_question,
-            "sql_query": validated_sql,
-            "results": rows,
-            "execution_time": f"{execution_time:.2f}s"
-        }
-        
+        logger.warning(f"[{execution_time:.2f}s] SQL 수정 {SQL_REPAIR_MAX_ATTEMPTS}회 후에도 실행 실패: {str(e)}")
         return func.HttpResponse(
-            json.dumps(response_data, ensure_ascii=False),
+            json.dumps({
+                "error": sql_error_message(e),
+                "message": "질문에 맞는 SQL을 생성하지 못했습니다.",
+                "execution_time": f"{execution_time:.2f}s"
+            }, ensure_ascii=False),
+            status_code=422,
             mimetype="application/json"
         )
 
@@ -188,4 +375,87 @@ def sql_query_function(req: func.HttpRequest) -> func.HttpResponse:
             json.dumps(error_response_data, ensure_ascii=False),
             status_code=500,
             mimetype="application/json"
-        )
\ No newline at end of file
+        )
+
+@app.function_name(name="SqlBatchQueryFunction")
+@app.route(route="sqlquery/batch", methods=["POST"])
+def sql_batch_query_function(req: func.HttpRequest) -> func.HttpResponse:
+    """여러 질문을 한 번의 HTTP 호출로 처리합니다.
+
+    요청: {"questions": ["질문1", "질문2", ...]}
+    응답: {"results": {"질문1": {sql_query, ..., results, row_count, truncated} 또는 {"error": ...}}, ...}
+
+    질문마다 SQL 생성(LLM)과 실행을 SQL_BATCH_CONCURRENCY개까지 동시에 진행하며,
+    실행은 각자 연결 풀에서 연결을 빌리므로 동시 연결 수도 같은 값(최대 풀 크기)으로 제한됩니다.
+    한 질문이 실패해도 나머지 질문의 결과는 그대로 반환합니다.
+    """
+    start_time = time.time()
+    logger.info(f"[{time.time() - start_time:.2f}s] SqlBatchQueryFunction 요청 시작")
+
+    try:
+        req_body = req.get_json()
+        questions = req_body.get('questions')
+    except (ValueError, AttributeError):
+        questions = None
+    if not isinstance(questions, list) or not questions or not all(isinstance(q, str) and q.strip() for q in questions):
+        return func.HttpResponse(
+            json.dumps({"error": "questions에 질문 문자열 목록을 입력해주세요."}, ensure_ascii=False),
+            status_code=400,
+            mimetype="application/json"
+        )
+    if len(questions) > SQL_BATCH_MAX_QUESTIONS:
+        return func.HttpResponse(
+            json.dumps({"error": f"한 번에 최대 {SQL_BATCH_MAX_QUESTIONS}개 질문까지 처리할 수 있습니다."}, ensure_ascii=False),
+            status_code=400,
+            mimetype="application/json"
+        )
+    questions = list(dict.fromkeys(q.strip() for q in questions)) # 중복 질문은 한 번만 처리
+    logger.info(f"[{time.time() - start_time:.2f}s] 배치 질문 {len(questions)}개")
+
+    try:
+        refresh_schema(start_time)
+    except Exception as e:
+        logger.warning(f"[{time.time() - start_time:.2f}s] 스키마 카탈로그 갱신 실패: {e}")
+
+    def answer_one(question):
+        timings = {"connect": 0.0, "llm": 0.0, "query": 0.0}
+        try:
+            answer = answer_question(question, timings, start_time)
+        except SqlGuardError as e:
+            return {"error": str(e), "status": 422}
+        except (pyodbc.ProgrammingError, pyodbc.DataError) as e:
+            return {"error": sql_error_message(e), "status": 422}
+        except Exception as e:
+            logger.error(f"[{time.time() - start_time:.2f}s] 배치 질문 처리 오류 ('{question}'): {str(e)}", exc_info=True)
+            return {"error": str(e), "status": 500}
+        result = answer.pop("result")
+        answer.update(
+            results=rows_as_dicts(result),
+            row_count=len(result["rows"]),
+            truncated=result["truncated"],
+            llm_time=f"{timings['llm']:.2f}s",
+            query_time=f"{timings['query']:.2f}s",
+        )
+        return answer
+
+    with ThreadPoolExecutor(max_workers=min(SQL_BATCH_CONCURRENCY, db_pool.max_size, len(questions))) as executor:
+        answers = list(executor.map(answer_one, questions))
+
+    # 전체 응답이 RESULT_MAX_BYTES를 넘지 않도록, 넘치는 질문의 결과는 오류로 대체합니다
+    results = {}
+    written = 0
+    for question, answer in zip(questions, answers):
+        encoded = dumps(answer)
+        if written + len(encoded) > RESULT_MAX_BYTES:
+            answer = {"error": "응답 크기 상한을 넘어 결과를 생략했습니다. 질문을 나누어 요청해 주세요.", "status": 413}
+        else:
+            written += len(encoded)
+        results[question] = answer
+
+    execution_time = time.time() - start_time
+    failed = sum(1 for answer in results.values() if "error" in answer)
+    logger.info(f"[{execution_time:.2f}s] SqlBatchQueryFunction 완료 (성공 {len(results) - failed}개, 실패 {failed}개)")
+    return func.HttpResponse(
+        dumps({"results": results, "execution_time": f"{execution_time:.2f}s"}),
+        mimetype="application/json"
+    )
@@ -0,0 +1,199 @@
+import os
+import re
+import json
+import time
+import hashlib
+import logging
+import threading
+from collections import OrderedDict
+
+# 쿼리 결과 캐시
+# ga_data 테이블은 storeToSQL이 적재할 때만 바뀌므로, storeToSQL이 적재 후 올리는
+# ga_data.IngestionWatermark.version 값이 같은 동안에는 같은 SQL + 파라미터의 결과를 메모리에서 반환합니다.
+# 워터마크는 ga_data 적재만 반영하므로, ga_data 밖의 테이블/뷰(dbo.News, dbo.StockPrices, dbo.vw_* 등)나
+# 스키마를 생략한 테이블을 읽는 SQL은 워터마크가 같아도 RESULT_CACHE_FALLBACK_TTL이 지나면 만료됩니다.
+
+RESULT_CACHE_MAX_ENTRIES = int(os.environ.get("RESULT_CACHE_MAX_ENTRIES", "512"))
+RESULT_CACHE_MAX_BYTES = int(os.environ.get("RESULT_CACHE_MAX_BYTES", str(64 * 1024 * 1024)))
+# 워터마크 행을 다시 읽기 전까지 기다리는 시간(초) - 적재 직후 최대 이 시간만큼 이전 결과가 반환될 수 있습니다
+WATERMARK_CHECK_INTERVAL = float(os.environ.get("WATERMARK_CHECK_INTERVAL", "30"))
+# 워터마크 테이블이 없거나 SQL이 ga_data 밖의 테이블을 읽을 때 사용하는 결과 유효 시간(초)
+RESULT_CACHE_FALLBACK_TTL = float(os.environ.get("RESULT_CACHE_FALLBACK_TTL", "300"))
+
+WATERMARK_QUERY = "SELECT version FROM ga_data.IngestionWatermark WHERE id = 1"
+# 적재 워터마크가 변경을 추적하는 스키마
+WATERMARK_SCHEMA = "ga_data"
+
+_SQL_STRING_RE = re.compile(r"N?'(?:[^']|'')*'")
+_FROM_ITEM_END_RE = re.compile(
+    r"(?:where|group|order|having|union|except|intersect|join|on|cross|inner|left|right|full|outer|option|select)\b",
+    re.IGNORECASE,
+)
+_TABLE_NAME_RE = re.compile(r"\s*(\[?\w+\]?(?:\s*\.\s*\[?\w+\]?){0,2})")
+
+logger = logging.getLogger(__name__)
+
+
+def normalize_sql(sql):
+    """캐시 키용으로 SQL을 정규화합니다.
+
+    문자열 리터럴 밖의 공백을 하나로 줄이고 소문자로 바꾸며, 끝의 세미콜론을 제거합니다.
+    문자열 리터럴 안의 내용은 그대로 유지합니다.
+    """
+    parts, pos = [], 0
+    for literal in _SQL_STRING_RE.finditer(sql):
+        parts.append(" ".join(sql[pos:literal.start()].split()).lower())
+        parts.append(literal.group(0))
+        pos = literal.end()
+    parts.append(" ".join(sql[pos:].split()).lower())
+    return " ".join(p for p in parts if p).rstrip(";").strip()
+
+
+def _from_items(sql, start):
+    """FROM 뒤에서 괄호 깊이 0의 쉼표로 나뉜 항목들 (FROM a, b 형태)"""
+    items, depth, item_start, i = [], 0, start, start
+    while i < len(sql):
+        ch = sql[i]
+        if ch == "(":
+            depth += 1
+        elif ch == ")":
+            if depth == 0:
+                break
+            depth -= 1
+        elif depth == 0:
+            if ch == ",":
+                items.append(sql[item_start:i])
+                item_start = i + 1
+            elif not (sql[i - 1].isalnum() or sql[i - 1] == "_") and _FROM_ITEM_END_RE.match(sql, i):
+                break
+        i += 1
+    items.append(sql[item_start:i])
+    return items
+
+
+def referenced_tables(sql):
+    """FROM/JOIN으로 읽는 테이블 이름 집합 (소문자, 대괄호 제거, CTE 이름과 하위 쿼리 제외)"""
+    masked = _SQL_STRING_RE.sub("''", sql)
+    cte_names = {m.group(1).lower() for m in re.finditer(
+        r"(?:\bwith\b|,)\s*\[?(\w+)\]?\s*(?:\([^)]*\))?\s+as\s*\(", masked, re.IGNORECASE)}
+    tables = set()
+    for m in re.finditer(r"\b(from|join)\b", masked, re.IGNORECASE):
+        items = [masked[m.end():]] if m.group(1).lower() == "join" else _from_items(masked, m.end())
+        for item in items:
+            name = _TABLE_NAME_RE.match(item)
+            if not name or item[name.end():].lstrip().startswith("("):
+                continue
+            name = re.sub(r"[\[\]\s]", "", name.group(1)).lower()
+            if name not in cte_names:
+                tables.add(name)
+    return tables
+
+
+def watermark_covers(sql):
+    """SQL이 읽는 테이블이 모두 적재 워터마크가 추적하는 스키마(ga_data)에 있는지"""
+    tables = referenced_tables(sql)
+    return bool(tables) and all(name.split(".")[-2:-1] == [WATERMARK_SCHEMA] for name in tables)
+
+
+def make_cache_key(sql, params=None):
+    raw = normalize_sql(sql) + "\x00" + json.dumps(list(params or []), ensure_ascii=False, default=str)
+    return hashlib.sha1(raw.encode("utf-8")).hexdigest()
+
+
+class QueryResultCache:
+    """정규화된 SQL + 파라미터를 키로 하는 크기 제한 LRU 결과 캐시
+
+    모든 항목은 저장 당시의 적재 워터마크를 함께 기록하며,
+    워터마크가 바뀌면 이전 워터마크로 저장된 결과는 모두 무효화됩니다.
+    ga_data 밖의 테이블을 읽는 항목은 워터마크와 상관없이 RESULT_CACHE_FALLBACK_TTL이 지나면 만료됩니다.
+    """
+
+    def __init__(self, max_entries=RESULT_CACHE_MAX_ENTRIES, max_bytes=RESULT_CACHE_MAX_BYTES):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()
+        self._total_bytes = 0
+        self._lock = threading.Lock()
+        self._watermark = None
+        self._watermark_checked_at = 0.0
+
+    def watermark(self, conn):
+        """현재 적재 워터마크를 반환합니다 (WATERMARK_CHECK_INTERVAL 동안은 메모리 값 사용).
+
+        워터마크 테이블을 읽을 수 없으면 None을 반환하고, 이때는 FALLBACK_TTL로만 만료를 판단합니다.
+        간격이 지났을 때 워터마크를 다시 읽는 것은 한 호출뿐이며, 그동안 동시에 들어온 호출은 메모리 값을 사용합니다.
+        """
+        now = time.monotonic()
+        with self._lock:
+            if now - self._watermark_checked_at < WATERMARK_CHECK_INTERVAL:
+                return self._watermark
+            # 확인 시각을 먼저 기록해 이 호출만 DB를 읽도록 함
+            self._watermark_checked_at = now
+
+        cursor = conn.cursor()
+        try:
+            cursor.execute(WATERMARK_QUERY)
+            row = cursor.fetchone()
+            version = row[0] if row else None
+        except Exception as e:
+            logger.warning(f"적재 워터마크 조회 실패 (TTL 기반 만료 사용): {e}")
+            version = None
+        finally:
+            cursor.close()
+
+        with self._lock:
+            if version != self._watermark:
+                if self._entries:
+                    logger.info(f"적재 워터마크 변경 ({self._watermark} → {version}): 결과 캐시 {len(self._entries)}개 무효화")
+                self._entries.clear()
+                self._total_bytes = 0
+                self._watermark = version
+        return version
+
+    def get(self, sql, params, watermark):
+        key = make_cache_key(sql, params)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            expired = entry["watermark"] != watermark or (
+                (watermark is None or not entry["covered"])
+                and time.monotonic() - entry["stored_at"] > RESULT_CACHE_FALLBACK_TTL)
+            if expired:
+                self._evict(key)
+                return None
+            self._entries.move_to_end(key)
+            return entry["value"]
+
+    def put(self, sql, params, watermark, value):
+        size = len(json.dumps(value, ensure_ascii=False, default=str).encode("utf-8"))
+        # 단일 결과가 캐시 용량의 1/4을 넘으면 저장하지 않습니다 (다른 결과를 모두 밀어내지 않도록)
+        if size > self.max_bytes // 4:
+            return False
+        key = make_cache_key(sql, params)
+        with self._lock:
+            if key in self._entries:
+                self._evict(key)
+            self._entries[key] = {
+                "value": value,
+                "watermark": watermark,
+                "covered": watermark_covers(sql),
+                "stored_at": time.monotonic(),
+                "size": size,
+            }
+            self._total_bytes += size
+            while self._entries and (len(self._entries) > self.max_entries or self._total_bytes > self.max_bytes):
+                self._evict(next(iter(self._entries)))
+        return True
+
+    def _evict(self, key):
+        entry = self._entries.pop(key)
+        self._total_bytes -= entry["size"]
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._total_bytes = 0
+
+    def __len__(self):
+        return len(self._entries)
@@ -0,0 +1,127 @@
+import os
+import json
+import uuid
+from datetime import date, datetime, time as dt_time
+from decimal import Decimal
+
+try:
+    import orjson  # 빠른 JSON 인코더 (datetime 기본 지원)
+except ImportError:  # orjson이 없으면 표준 json으로 동작
+    orjson = None
+
+# 쿼리 결과 직렬화
+# cursor.fetchmany로 나누어 가져온 행을 한 행씩 JSON 바이트로 인코딩하여 이어 붙입니다.
+# 전체 결과를 dict 목록으로 만든 뒤 한 번에 json.dumps 하지 않으므로, 중간 객체가 줄고
+# 행/바이트 상한에 도달하면 즉시 멈출 수 있습니다.
+
+RESULT_FETCH_SIZE = int(os.environ.get("RESULT_FETCH_SIZE", "500"))
+RESULT_MAX_ROWS = int(os.environ.get("RESULT_MAX_ROWS", "5000"))
+RESULT_MAX_BYTES = int(os.environ.get("RESULT_MAX_BYTES", str(4 * 1024 * 1024)))
+
+# 지원하는 응답 형식
+# - rows: 기존 형식. results가 행마다 {컬럼: 값} 객체인 목록
+# - columnar: columns 한 번 + rows는 값 배열 목록 (키 이름이 반복되지 않아 훨씬 작음)
+# - ndjson: 첫 줄은 메타데이터, 이후 한 줄에 한 행 객체 (application/x-ndjson)
+RESULT_FORMATS = ("rows", "columnar", "ndjson")
+
+
+def _default(obj):
+    if isinstance(obj, (datetime, date, dt_time)):
+        return obj.isoformat()
+    if isinstance(obj, Decimal):
+        return float(obj)
+    if isinstance(obj, uuid.UUID):
+        return str(obj)
+    if isinstance(obj, (bytes, bytearray, memoryview)):
+        return bytes(obj).hex()
+    raise TypeError(f"Object of type {obj.__class__.__name__} is not JSON serializable")
+
+
+def dumps(obj):
+    """객체를 UTF-8 JSON 바이트로 인코딩합니다 (datetime/Decimal 포함)."""
+    if orjson is not None:
+        return orjson.dumps(obj, default=_default)
+    return json.dumps(obj, ensure_ascii=False, default=_default, separators=(",", ":")).encode("utf-8")
+
+
+def fetch_result(cursor, max_rows=RESULT_MAX_ROWS, fetch_size=RESULT_FETCH_SIZE):
+    """실행된 커서에서 fetchmany로 최대 max_rows 행을 가져옵니다.
+
+    Returns:
+        dict: {"columns": [...], "rows": [[...], ...], "truncated": bool}
+    """
+    columns = [column[0] for column in cursor.description]
+    rows = []
+    truncated = False
+    while True:
+        batch = cursor.fetchmany(fetch_size)
+        if not batch:
+            break
+        for row in batch:
+            if len(rows) >= max_rows:
+                truncated = True
+                break
+            rows.append(list(row))
+        if truncated:
+            break
+    return {"columns": columns, "rows": rows, "truncated": truncated}
+
+
+def rows_as_dicts(result):
+    """columnar 결과를 기존 형식(행마다 dict)으로 변환합니다."""
+    columns = result["columns"]
+    return [dict(zip(columns, row)) for row in result["rows"]]
+
+
+def serialize_response(meta, result, fmt="rows", max_bytes=RESULT_MAX_BYTES, trailer=None):
+    """응답 본문을 행 단위로 인코딩하여 bytes로 만듭니다.
+
+    Args:
+        meta (dict): 결과 앞에 들어갈 필드 (question, sql_query 등)
+        result (dict): fetch_result()가 반환한 결과
+        fmt (str): rows / columnar / ndjson
+        max_bytes (int): 결과 행 부분의 최대 바이트 수 (초과 시 잘라내고 truncated=True)
+        trailer (callable): 결과 뒤에 붙일 필드를 반환하는 함수 (execution_time처럼 마지막에 계산할 값)
+
+    Returns:
+        tuple: (body bytes, mimetype)
+    """
+    columns = result["columns"]
+    truncated = result["truncated"]
+    chunks = []
+    written = 0
+    row_count = 0
+
+    for row in result["rows"]:
+        if fmt == "columnar":
+            encoded = dumps(row)
+        else:
+            encoded = dumps(dict(zip(columns, row)))
+        if written + len(encoded) > max_bytes:
+            truncated = True
+            break
+        chunks.append(encoded)
+        written += len(encoded) + 1
+        row_count += 1
+
+    tail = {"row_count": row_count, "truncated": truncated}
+    tail.update(trailer() if trailer else {})
+
+    if fmt == "ndjson":
+        header = dict(meta, columns=columns)
+        lines = [dumps(header)] + chunks + [dumps(tail)]
+        return b"\n".join(lines) + b"\n", "application/x-ndjson"
+
+    # JSON 객체의 앞부분/결과 배열/뒷부분을 따로 인코딩해 이어 붙입니다
+    head = dict(meta)
+    if fmt == "columnar":
+        head["columns"] = columns
+        results_key = b'"rows":['
+    else:
+        results_key = b'"results":['
+    head_bytes = dumps(head)[:-1]  # 닫는 중괄호 제거
+    if len(head_bytes) > 1:
+        head_bytes += b","
+    tail_bytes = dumps(tail)[1:]   # 여는 중괄호 제거
+    body = head_bytes + results_key + b",".join(chunks) + b"]," + tail_bytes
+    return body, "application/json"
@@ -0,0 +1,230 @@
+import os
+import re
+import time
+import math
+import hashlib
+import logging
+import threading
+
+import requests
+
+# 스키마 카탈로그
+# INFORMATION_SCHEMA에서 실제 테이블/컬럼을 한 번 읽어 버전(해시)과 함께 캐시하고,
+# 질문과 관련된 테이블만 골라 프롬프트에 넣습니다. 손으로 관리하던 SCHEMA_INFO가 실제 스키마와
+# 달라 생기던 쿼리 실패를 없애고, 프롬프트 토큰 수(= LLM 지연 시간)를 줄입니다.
+
+# 카탈로그를 다시 읽는 주기(초)
+SCHEMA_CATALOG_TTL = float(os.environ.get("SCHEMA_CATALOG_TTL", "3600"))
+# 프롬프트에 넣을 최대 테이블 수
+SCHEMA_MAX_TABLES = int(os.environ.get("SCHEMA_MAX_TABLES", "4"))
+# 카탈로그에 포함할 스키마
+SCHEMA_CATALOG_SCHEMAS = [s.strip() for s in os.environ.get("SCHEMA_CATALOG_SCHEMAS", "dbo,ga_data").split(",") if s.strip()]
+
+CATALOG_QUERY = f"""
+SELECT c.TABLE_SCHEMA, c.TABLE_NAME, c.COLUMN_NAME, c.DATA_TYPE
+FROM INFORMATION_SCHEMA.COLUMNS c
+WHERE c.TABLE_SCHEMA IN ({", ".join("?" for _ in SCHEMA_CATALOG_SCHEMAS)})
+ORDER BY c.TABLE_SCHEMA, c.TABLE_NAME, c.ORDINAL_POSITION
+"""
+
+# 테이블별 질문 키워드 (한국어/영어). 컬럼 이름은 별도로 자동 매칭합니다.
+TABLE_KEYWORDS = {
+    "ga_data.sessions": ["세션", "방문", "날짜", "일자", "일별", "월별", "채널", "session", "visit", "date", "daily", "channel"],
+    "ga_data.totals": ["페이지뷰", "체류", "이탈", "신규", "재방문", "거래", "수익", "매출", "pageview", "bounce", "new visitor", "transaction", "revenue"],
+    "ga_data.traffic": ["유입", "소스", "매체", "캠페인", "키워드", "광고", "추천", "source", "medium", "campaign", "keyword", "referral"],
+    "ga_data.devicegeo": ["기기", "디바이스", "브라우저", "운영체제", "모바일", "데스크톱", "국가", "나라", "지역", "도시", "대륙", "device", "browser", "mobile", "country", "region", "city"],
+    "ga_data.hits": ["페이지", "이벤트", "히트", "행동", "장바구니", "결제", "구매", "시간대", "page", "event", "hit", "action", "cart", "checkout", "purchase", "hour"],
+    "ga_data.hitsproduct": ["상품", "제품", "가격", "브랜드", "카테고리", "판매", "product", "price", "brand", "category", "sku"],
+    "dbo.news": ["뉴스", "기사", "감성", "언론", "news", "article", "sentiment"],
+    "dbo.stockprices": ["주가", "주식", "종가", "stock", "share", "close"],
+}
+
+# 테이블 간 조인 키 안내 (선택된 테이블이 둘 이상일 때 프롬프트에 추가)
+JOIN_HINTS = """조인 키:
+- ga_data.Sessions / Totals / Traffic / DeviceGeo: session_key 로 서로 조인
+- ga_data.Hits: session_key 로 세션 테이블과 조인, hit_key 로 HitsProduct와 조인
+- ga_data.HitsProduct: hit_key 로 Hits와 조인"""
+
+# 상품 테이블과 세션 단위 테이블을 함께 쓰려면 Hits를 거쳐야 합니다
+_SESSION_TABLES = {"ga_data.sessions", "ga_data.totals", "ga_data.traffic", "ga_data.devicegeo"}
+
+logger = logging.getLogger(__name__)
+
+
+def _keyword_in(keyword, text):
+    # 영문 키워드는 단어 단위로(예: "category"가 "deviceCategory"에 걸리지 않도록), 한국어는 부분 문자열로 비교
+    if keyword.isascii():
+        return re.search(rf"(?<![a-z0-9_]){re.escape(keyword)}s?(?![a-z0-9_])", text) is not None
+    return keyword in text
+
+
+def _cosine(a, b):
+    dot = sum(x * y for x, y in zip(a, b))
+    norm = math.sqrt(sum(x * x for x in a)) * math.sqrt(sum(y * y for y in b))
+    return dot / norm if norm else 0.0
+
+
+class SchemaCatalog:
+    """INFORMATION_SCHEMA 기반 스키마 카탈로그
+
+    Args:
+        fallback_schema_info (str): 카탈로그를 읽지 못했을 때 사용할 "- schema.Table: col, ..." 형식 텍스트
+    """
+
+    def __init__(self, fallback_schema_info):
+        self._fallback = self._parse_schema_info(fallback_schema_info)
+        self._tables = None       # {"schema.Table": [(column, data_type), ...]}
+        self._version = None
+        self._loaded_at = 0.0
+        self._table_embeddings = None
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _parse_schema_info(schema_info):
+        tables = {}
+        for match in re.finditer(r"^\s*-\s*(\w+\.\w+):\s*(.*)$", schema_info, re.MULTILINE):
+            tables[match.group(1)] = [(c.strip(), None) for c in match.group(2).split(",") if c.strip()]
+        return tables
+
+    @property
+    def version(self):
+        return self._version
+
+    def tables(self):
+        """현재 카탈로그의 테이블 → 컬럼 목록 (카탈로그가 없으면 대체 스키마)"""
+        return self._tables if self._tables is not None else self._fallback
+
+    def refresh(self, conn_factory, force=False):
+        """TTL이 지났으면 INFORMATION_SCHEMA를 다시 읽습니다.
+
+        Args:
+            conn_factory: with 문으로 연결을 빌려 주는 함수 (예: db_pool.connection)
+
+        Returns:
+            bool: 스키마 버전이 바뀌었으면 True
+        """
+        if not force and self._tables is not None and time.monotonic() - self._loaded_at < SCHEMA_CATALOG_TTL:
+            return False
+        with self._lock:
+            if not force and self._tables is not None and time.monotonic() - self._loaded_at < SCHEMA_CATALOG_TTL:
+                return False
+            try:
+                with conn_factory() as conn:
+                    cursor = conn.cursor()
+                    try:
+                        cursor.execute(CATALOG_QUERY, SCHEMA_CATALOG_SCHEMAS)
+                        rows = cursor.fetchall()
+                    finally:
+                        cursor.close()
+            except Exception as e:
+                # 다음 요청에서 다시 시도할 수 있도록 loaded_at은 갱신하지 않습니다
+                logger.warning(f"스키마 카탈로그 조회 실패, {'이전 카탈로그' if self._tables else '기본 SCHEMA_INFO'} 사용: {e}")
+                return False
+
+            tables = {}
+            for schema, table, column, data_type in rows:
+                tables.setdefault(f"{schema}.{table}", []).append((column, data_type))
+            version = hashlib.sha1(repr(sorted(tables.items())).encode("utf-8")).hexdigest()[:12]
+
+            changed = version != self._version
+            self._tables = tables
+            self._loaded_at = time.monotonic()
+            if changed:
+                self._version = version
+                self._table_embeddings = None
+                logger.info(f"스키마 카탈로그 로드: {len(tables)}개 테이블 (version={version})")
+            return changed
+
+    def _keyword_scores(self, question):
+        text = question.lower()
+        tokens = set(re.findall(r"[a-z_][a-z0-9_]*", text))
+        scores = {}
+        for name, columns in self.tables().items():
+            key = name.lower()
+            score = sum(2 for kw in TABLE_KEYWORDS.get(key, []) if _keyword_in(kw, text))
+            table_name = key.split(".", 1)[1]
+            if table_name in tokens:
+                score += 3
+            # 질문에 컬럼 이름이 그대로 나오면 가중치 부여 (예: "deviceCategory별")
+            score += sum(1 for column, _ in columns if column.lower() in tokens)
+            if score:
+                scores[name] = score
+        return scores
+
+    def _embedding_scores(self, question):
+        """Azure OpenAI 임베딩으로 질문과 테이블 설명의 유사도를 구합니다 (설정이 없으면 빈 dict)."""
+        endpoint = os.environ.get("AZURE_OPENAI_ENDPOINT")
+        api_key = os.environ.get("AZURE_OPENAI_API_KEY")
+        deployment = os.environ.get("AZURE_OPENAI_EMBEDDING_DEPLOYMENT")
+        if not all([endpoint, api_key, deployment]):
+            return {}
+
+        def embed(texts):
+            response = requests.post(
+                f"{endpoint}/openai/deployments/{deployment}/embeddings?api-version=2023-05-15",
+                headers={"Content-Type": "application/json", "api-key": api_key},
+                json={"input": texts},
+                timeout=10
+            )
+            response.raise_for_status()
+            return [item["embedding"] for item in response.json()["data"]]
+
+        try:
+            tables = self.tables()
+            if self._table_embeddings is None:
+                names = list(tables)
+                descriptions = [
+                    f"{name}: {' '.join(TABLE_KEYWORDS.get(name.lower(), []))} {', '.join(c for c, _ in tables[name])}"
+                    for name in names
+                ]
+                self._table_embeddings = dict(zip(names, embed(descriptions)))
+            question_vector = embed([question])[0]
+        except Exception as e:
+            logger.warning(f"스키마 임베딩 매칭 실패: {e}")
+            return {}
+        return {name: _cosine(question_vector, vector) for name, vector in self._table_embeddings.items()}
+
+    def select_tables(self, question, max_tables=SCHEMA_MAX_TABLES):
+        """질문과 관련된 테이블 이름 목록을 고릅니다.
+
+        키워드/컬럼 이름 매칭을 먼저 사용하고, 매칭되는 테이블이 없을 때만 임베딩 유사도를 사용합니다.
+        둘 다 실패하면 ga_data 스키마 전체를 사용합니다.
+        """
+        scores = self._keyword_scores(question)
+        if not scores:
+            similarities = self._embedding_scores(question)
+            scores = {name: sim for name, sim in sorted(similarities.items(), key=lambda kv: kv[1], reverse=True)[:max_tables]}
+        if not scores:
+            return [name for name in self.tables() if name.lower().startswith("ga_data.")][:max_tables + 2]
+
+        selected = [name for name, _ in sorted(scores.items(), key=lambda kv: kv[1], reverse=True)[:max_tables]]
+        lowered = {name.lower() for name in selected}
+        if "ga_data.hitsproduct" in lowered and lowered & _SESSION_TABLES and "ga_data.hits" not in lowered:
+            hits = next((name for name in self.tables() if name.lower() == "ga_data.hits"), None)
+            if hits:
+                selected.append(hits)
+        return selected
+
+    def render(self, table_names):
+        """선택된 테이블을 프롬프트용 텍스트로 만듭니다."""
+        tables = self.tables()
+        lines = ["=== Microsoft SQL Server 데이터베이스 ==="]
+        for name in table_names:
+            columns = ", ".join(column for column, _ in tables[name])
+            lines.append(f"- {name}: {columns}")
+        if sum(1 for name in table_names if name.lower().startswith("ga_data.")) > 1:
+            lines.append(JOIN_HINTS)
+        return "\n".join(lines)
+
+    def schema_for_question(self, question):
+        """질문과 관련된 스키마 일부를 프롬프트용 텍스트로 반환합니다."""
+        return self.render(self.select_tables(question))
+
+    def schema_for_sql(self, question, sql):
+        """SQL 수정 요청용 스키마: 질문 관련 테이블 + 실패한 SQL이 참조한 테이블"""
+        selected = self.select_tables(question)
+        words = {w.lower() for w in re.findall(r"\w+", sql)}
+        for name in self.tables():
+            if name not in selected and name.split(".", 1)[1].lower() in words:
+                selected.append(name)
+        return self.render(selected)
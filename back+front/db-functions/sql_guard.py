@@ -0,0 +1,303 @@
+import os
+import re
+import logging
+import xml.etree.ElementTree as ET
+
+import pyodbc
+
+# LLM이 생성한 SQL 실행 전 안전성/비용 검사
+# 1. 정적 검사: 단일 SELECT 문인지, 금지 키워드가 없는지, 스키마에 있는 테이블만 쓰는지 확인
+# 2. 재작성: 최상위 SELECT에 TOP이 없으면 TOP (SQL_MAX_ROWS)을 넣음
+# 3. 비용 검사: SET SHOWPLAN_XML로 실행 없이 예상 실행 계획을 받아 예상 비용/행 수가 예산을 넘으면 거부
+#    (컬럼 이름 오류도 이 단계에서 컴파일 오류로 걸러집니다)
+# 4. 비용 검사를 쓸 수 없으면 SET FMTONLY ON으로 결과 형식만 받아오는 dry-run으로 컴파일 오류를 먼저 확인
+
+SQL_MAX_ROWS = int(os.environ.get("SQL_MAX_ROWS", "1000"))
+# 쿼리 실행 타임아웃(초) - pyodbc Connection.timeout
+SQL_QUERY_TIMEOUT = int(os.environ.get("SQL_QUERY_TIMEOUT", "30"))
+# 예상 실행 계획 비용 상한 (StatementSubTreeCost, SQL Server 옵티마이저 단위)
+SQL_MAX_ESTIMATED_COST = float(os.environ.get("SQL_MAX_ESTIMATED_COST", "50"))
+# 예상 결과 행 수 상한 (StatementEstRows)
+SQL_MAX_ESTIMATED_ROWS = float(os.environ.get("SQL_MAX_ESTIMATED_ROWS", "100000"))
+# SHOWPLAN 기반 비용 검사 사용 여부 (SHOWPLAN 권한이 없으면 false로 설정)
+SQL_COST_CHECK_ENABLED = os.environ.get("SQL_COST_CHECK_ENABLED", "true").lower() == "true"
+
+FORBIDDEN_KEYWORDS = {
+    "insert", "update", "delete", "merge", "drop", "alter", "create", "truncate",
+    "exec", "execute", "grant", "revoke", "deny", "into", "openrowset", "openquery",
+    "opendatasource", "bulk", "waitfor", "shutdown", "dbcc", "backup", "restore",
+    "use", "declare", "set", "kill", "reconfigure",
+}
+# 두 부분 이름(schema.table)으로 참조될 때 허용 목록 검사를 하는 스키마
+KNOWN_SCHEMAS = {"dbo", "ga_data", "sys", "information_schema"}
+
+_SHOWPLAN_NS = "{http://schemas.microsoft.com/sqlserver/2004/07/showplan}"
+
+logger = logging.getLogger(__name__)
+
+# SHOWPLAN 권한이 없다고 확인되면 이후 요청에서는 계획 조회를 시도하지 않음 (워커 프로세스 단위)
+_showplan_denied = False
+
+
+class SqlGuardError(ValueError):
+    """SQL이 안전성/비용 검사를 통과하지 못했을 때 발생하는 예외"""
+
+
+class SqlCostError(SqlGuardError):
+    """예상 비용/행 수가 예산을 넘었을 때 발생하는 예외 (SQL 수정으로는 해결되지 않으므로 재생성하지 않습니다)"""
+
+
+_QUOTED_RE = re.compile(r"N?'(?:[^']|'')*'|\[(?:[^\]]|\]\])*\]")
+
+
+def _mask(sql):
+    """주석을 제거하고 문자열 리터럴/대괄호 식별자 내용을 공백으로 가려, 키워드 검사가 값이나 [set] 같은 이름에 속지 않도록 합니다.
+
+    Returns:
+        tuple: (주석을 제거한 SQL, 리터럴과 대괄호 식별자를 가린 SQL, 리터럴만 가린 SQL - 테이블 이름 검사용)
+        세 문자열의 길이와 위치는 같습니다.
+    """
+    sql = re.sub(r"--[^\n]*", " ", sql)
+    sql = re.sub(r"/\*.*?\*/", " ", sql, flags=re.DOTALL)
+
+    def blank(m, keep_identifiers):
+        token = m.group(0)
+        if keep_identifiers and token.startswith("["):
+            return token
+        return token[0] + " " * (len(token) - 2) + token[-1]
+
+    masked = _QUOTED_RE.sub(lambda m: blank(m, False), sql)
+    names = _QUOTED_RE.sub(lambda m: blank(m, True), sql)
+    return sql, masked, names
+
+
+def _top_level_positions(masked, keyword):
+    """괄호 깊이 0에서 keyword가 나타나는 위치 목록"""
+    positions = []
+    depth = 0
+    for m in re.finditer(rf"\(|\)|\b{keyword}\b", masked, re.IGNORECASE):
+        token = m.group(0)
+        if token == "(":
+            depth += 1
+        elif token == ")":
+            depth -= 1
+        elif depth == 0:
+            positions.append(m.start())
+    return positions
+
+
+def _inject_top(sql, masked, max_rows):
+    """최상위 SELECT에 TOP이 없으면 TOP (max_rows)를 넣습니다.
+
+    UNION/EXCEPT/INTERSECT나 OFFSET/FETCH가 있는 쿼리는 재작성하지 않고 행 수 상한(fetch)에 맡깁니다.
+    """
+    if re.search(r"\boffset\b.*\bfetch\b", masked, re.IGNORECASE | re.DOTALL):
+        return sql
+    if any(_top_level_positions(masked, kw) for kw in ("union", "except", "intersect")):
+        return sql
+    selects = _top_level_positions(masked, "select")
+    if not selects:
+        return sql
+    pos = selects[0]
+    head = re.match(r"select\s+(?:(distinct|all)\s+)?", masked[pos:], re.IGNORECASE)
+    after = masked[pos + head.end():]
+    if re.match(r"top\b", after, re.IGNORECASE):
+        return sql
+    insert_at = pos + head.end()
+    return f"{sql[:insert_at]}TOP ({max_rows}) {sql[insert_at:]}"
+
+
+_FROM_LIST_END = re.compile(
+    r"(?:where|group|order|having|union|except|intersect|join|on|cross|inner|left|right|full|outer|option|for|select)\b",
+    re.IGNORECASE,
+)
+_TABLE_NAME = re.compile(r"\s*(\[?\w+\]?(?:\s*\.\s*\[?\w+\]?){0,2})")
+
+
+def _from_list(masked, start):
+    """FROM 뒤에서 괄호 깊이 0의 쉼표로 나뉜 항목들을 절이 끝날 때까지 잘라 반환합니다."""
+    items, depth, item_start, i = [], 0, start, start
+    while i < len(masked):
+        ch = masked[i]
+        if ch == "(":
+            depth += 1
+        elif ch == ")":
+            if depth == 0:
+                break
+            depth -= 1
+        elif depth == 0:
+            if ch == ",":
+                items.append(masked[item_start:i])
+                item_start = i + 1
+            elif not (masked[i - 1].isalnum() or masked[i - 1] == "_") and _FROM_LIST_END.match(masked, i):
+                break
+        i += 1
+    items.append(masked[item_start:i])
+    return items
+
+
+def _table_references(masked):
+    """FROM/JOIN으로 참조한 테이블 이름 목록 (대괄호 제거, 하위 쿼리/함수 호출 항목 제외)"""
+    names = []
+    for m in re.finditer(r"\b(from|join)\b", masked, re.IGNORECASE):
+        items = [masked[m.end():]] if m.group(1).lower() == "join" else _from_list(masked, m.end())
+        for item in items:
+            name = _TABLE_NAME.match(item)
+            if name and not item[name.end():].lstrip().startswith("("):
+                names.append(re.sub(r"[\[\]\s]", "", name.group(1)))
+    return names
+
+
+def check_static(sql, allowed_tables, max_rows=SQL_MAX_ROWS):
+    """정적 검사를 수행하고, 통과하면 TOP이 보강된 SQL을 반환합니다.
+
+    Args:
+        sql (str): 검사할 SQL
+        allowed_tables (Iterable[str]): 허용 테이블 ("schema.table", 대소문자 무시)
+        max_rows (int): TOP이 없을 때 넣을 행 수
+
+    Raises:
+        SqlGuardError: 검사를 통과하지 못한 경우
+    """
+    sql, masked, names = _mask(sql.strip())
+    sql = sql.strip().rstrip(";").strip()
+    masked = masked.strip().rstrip(";").strip()
+    names = names.strip().rstrip(";").strip()
+    if not sql:
+        raise SqlGuardError("빈 SQL입니다.")
+    if ";" in masked:
+        raise SqlGuardError("하나의 SELECT 문만 실행할 수 있습니다.")
+
+    first = re.match(r"\s*(\w+)", masked)
+    if not first or first.group(1).lower() not in ("select", "with"):
+        raise SqlGuardError("SELECT 문만 실행할 수 있습니다.")
+
+    words = {w.lower() for w in re.findall(r"\b[a-zA-Z_]+\b", masked)}
+    forbidden = sorted(words & FORBIDDEN_KEYWORDS)
+    if forbidden:
+        raise SqlGuardError(f"허용되지 않은 키워드가 포함되어 있습니다: {', '.join(forbidden)}")
+    if re.search(r"\b(xp|sp)_\w+", masked, re.IGNORECASE):
+        raise SqlGuardError("시스템 프로시저는 호출할 수 없습니다.")
+
+    allowed = {t.lower() for t in allowed_tables}
+    cte_names = {m.group(1).lower() for m in re.finditer(r"(?:\bwith\b|,)\s*\[?(\w+)\]?\s*(?:\([^)]*\))?\s+as\s*\(", names, re.IGNORECASE)}
+    referenced = set()
+    # schema.table 형태 참조 (3부분 이름 db.schema.table 포함)
+    for m in re.finditer(r"(?<![\w.\]])(?:\[?\w+\]?\.)?\[?(\w+)\]?\.\[?(\w+)\]?(?![\w\[])", names):
+        if m.group(1).lower() in KNOWN_SCHEMAS:
+            referenced.add(f"{m.group(1)}.{m.group(2)}".lower())
+    # FROM/JOIN 뒤 (쉼표로 나열한 FROM a, b 포함)의 테이블 이름. 알 수 없는 스키마의 두 부분 이름도 검사
+    for name in _table_references(names):
+        parts = name.lower().split(".")
+        if len(parts) == 1:
+            if parts[0] not in cte_names:
+                referenced.add(parts[0])
+        else:
+            referenced.add(".".join(parts[-2:]))
+    unknown = sorted(name for name in referenced
+                     if name not in allowed and not any(t.endswith("." + name) for t in allowed))
+    if unknown:
+        raise SqlGuardError(f"스키마에 없는 테이블입니다: {', '.join(unknown)}")
+
+    return _inject_top(sql, masked, max_rows)
+
+
+def estimate_plan(conn, sql, params=None):
+    """SET SHOWPLAN_XML ON 상태에서 SQL을 보내 실행 없이 예상 비용/행 수를 구합니다.
+
+    Returns:
+        tuple: (예상 비용, 예상 행 수) - 계획에 여러 문이 있으면 가장 큰 값
+    """
+    cursor = conn.cursor()
+    try:
+        cursor.execute("SET SHOWPLAN_XML ON")
+        try:
+            if params:
+                cursor.execute(sql, params)
+            else:
+                cursor.execute(sql)
+            plan_xml = cursor.fetchone()[0]
+        finally:
+            cursor.execute("SET SHOWPLAN_XML OFF")
+    finally:
+        cursor.close()
+
+    root = ET.fromstring(plan_xml)
+    cost, rows = 0.0, 0.0
+    for stmt in root.iter(f"{_SHOWPLAN_NS}StmtSimple"):
+        cost = max(cost, float(stmt.get("StatementSubTreeCost", 0)))
+        rows = max(rows, float(stmt.get("StatementEstRows", 0)))
+    return cost, rows
+
+
+def _is_showplan_permission_error(error):
+    """SHOWPLAN 권한 없음 오류인지 (SQL Server 오류 262, SQLSTATE 42000)"""
+    message = " ".join(str(arg) for arg in error.args)
+    return "(262)" in message or "showplan permission" in message.lower()
+
+
+def check_cost(conn, sql, params=None):
+    """예상 실행 계획이 예산 안에 있는지 확인합니다.
+
+    SHOWPLAN 권한이 없는 등 계획을 구할 수 없으면 경고만 남기고 통과시킵니다
+    (이 경우에도 TOP과 쿼리 타임아웃이 실행 시간을 제한합니다).
+
+    Raises:
+        SqlCostError: 예상 비용이나 행 수가 예산을 넘는 경우
+        pyodbc.ProgrammingError: 컴파일 오류 (없는 컬럼 등)
+    """
+    global _showplan_denied
+    if not SQL_COST_CHECK_ENABLED or _showplan_denied:
+        return None
+    try:
+        cost, rows = estimate_plan(conn, sql, params)
+    except pyodbc.ProgrammingError as e:
+        # 권한 오류도 ProgrammingError(42000)로 오므로 컴파일 오류와 구분해 검사만 생략 (validate가 dry-run으로 넘어감)
+        if _is_showplan_permission_error(e):
+            _showplan_denied = True
+            logger.warning(f"SHOWPLAN 권한이 없어 비용 검사를 생략합니다 (SQL_COST_CHECK_ENABLED=false로 끌 수 있음): {e}")
+            return None
+        raise
+    except (pyodbc.Error, ET.ParseError, TypeError) as e:
+        logger.warning(f"예상 실행 계획 조회 실패, 비용 검사 생략: {e}")
+        return None
+
+    logger.info(f"예상 실행 계획: cost={cost:.3f}, rows={rows:.0f}")
+    if cost > SQL_MAX_ESTIMATED_COST:
+        raise SqlCostError(f"쿼리 예상 비용이 너무 큽니다 (cost={cost:.1f}, 상한 {SQL_MAX_ESTIMATED_COST:g}). 기간이나 조건을 좁혀 주세요.")
+    if rows > SQL_MAX_ESTIMATED_ROWS:
+        raise SqlCostError(f"쿼리 예상 결과 행 수가 너무 많습니다 (rows={rows:.0f}, 상한 {SQL_MAX_ESTIMATED_ROWS:g}). 집계하거나 조건을 추가해 주세요.")
+    return cost, rows
+
+
+def dry_run(conn, sql, params=None):
+    """SET FMTONLY ON 상태에서 SQL을 보내 행을 읽지 않고 컴파일/결과 형식만 확인합니다.
+
+    없는 컬럼/테이블, 문법 오류, 형 변환 오류를 실제 실행 전에 저렴하게 찾아냅니다.
+    FMTONLY를 사용할 수 없는 환경이면 경고만 남기고 통과시킵니다.
+
+    Raises:
+        pyodbc.ProgrammingError, pyodbc.DataError: 컴파일 오류
+    """
+    cursor = conn.cursor()
+    try:
+        cursor.execute("SET FMTONLY ON")
+        try:
+            if params:
+                cursor.execute(sql, params)
+            else:
+                cursor.execute(sql)
+        finally:
+            cursor.execute("SET FMTONLY OFF")
+    except (pyodbc.ProgrammingError, pyodbc.DataError):
+        raise
+    except pyodbc.Error as e:
+        logger.warning(f"FMTONLY dry-run 실패, 검사 생략: {e}")
+    finally:
+        cursor.close()
+
+
+def validate(conn, sql, params=None):
+    """실제 실행 전 검증: 비용 검사(SHOWPLAN, 컴파일 포함)를 하고, 계획을 구하지 못했으면 dry-run으로 컴파일만 확인합니다."""
+    if check_cost(conn, sql, params) is None:
+        dry_run(conn, sql, params)
@@ -0,0 +1,254 @@
+import os
+import re
+import threading
+import unicodedata
+from collections import OrderedDict
+
+# 질문 → SQL 템플릿 캐시
+# LLM이 생성하고 실제 실행에 성공한 SQL을 "질문 형태(shape)" 단위로 저장해 두었다가,
+# 날짜/숫자/이름 같은 리터럴만 다른 질문이 들어오면 LLM 호출 없이 파라미터만 바인딩해서 재사용합니다.
+# 템플릿 SQL은 항상 같은 텍스트로 실행되므로 SQL Server 쪽 실행 계획도 재사용됩니다.
+
+PLAN_CACHE_MAX_SIZE = int(os.environ.get("PLAN_CACHE_MAX_SIZE", "256"))
+# 한 형태(shape)에 저장할 수 있는 템플릿 변형 수 (고정 리터럴이 다른 경우)
+PLAN_CACHE_MAX_VARIANTS = 4
+# 이 횟수 이상 연속 실패한 템플릿은 캐시에서 제거
+PLAN_CACHE_MAX_FAILURES = 2
+# 한 질문에서 추출할 최대 리터럴 수
+MAX_LITERALS = 6
+
+# 자주 쓰이는 한국어 국가명 → GA 데이터(DeviceGeo.country)에 저장된 영문 표기
+COUNTRY_ALIASES = {
+    "미국": "United States",
+    "한국": "South Korea",
+    "대한민국": "South Korea",
+    "일본": "Japan",
+    "중국": "China",
+    "캐나다": "Canada",
+    "영국": "United Kingdom",
+    "독일": "Germany",
+    "프랑스": "France",
+    "인도": "India",
+    "인도네시아": "Indonesia",
+    "호주": "Australia",
+    "브라질": "Brazil",
+    "멕시코": "Mexico",
+    "스페인": "Spain",
+    "이탈리아": "Italy",
+    "대만": "Taiwan",
+    "베트남": "Vietnam",
+    "태국": "Thailand",
+    "네덜란드": "Netherlands",
+}
+
+_QUOTED_RE = re.compile(r"'([^']+)'|\"([^\"]+)\"|‘([^’]+)’|“([^”]+)”|「([^」]+)」")
+# "일"은 숫자에 바로 붙은 경우만 날짜의 일부로 봅니다 ("2017-08-01 일본"의 "일"을 먹지 않도록)
+_DATE_RE = re.compile(r"(?<!\d)(\d{4})\s*[-./년]\s*(\d{1,2})\s*[-./월]\s*(\d{1,2})일?(?!\d)")
+_COMPACT_DATE_RE = re.compile(r"(?<!\d)(20\d{2})(0[1-9]|1[0-2])(0[1-9]|[12]\d|3[01])(?!\d)")
+_NAME_RE = re.compile(r"(?<![\w'])[A-Z][\w'&.\-]*(?:\s+[A-Z0-9][\w'&.\-]*)*")
+# 한국어 조사/단위가 바로 붙는 경우("10개", "3위")가 많아 숫자 앞뒤로는 영문/숫자만 경계로 봅니다
+_NUMBER_RE = re.compile(r"(?<![A-Za-z0-9.])\d+(?:\.\d+)?(?![A-Za-z0-9.])")
+_COUNTRY_RE = re.compile("|".join(sorted(map(re.escape, COUNTRY_ALIASES), key=len, reverse=True)))
+_SQL_STRING_RE = re.compile(r"N?'(?:[^']|'')*'")
+
+
+def _normalize(text):
+    text = unicodedata.normalize("NFKC", text).lower()
+    text = re.sub(r"[^\w<>\s]", " ", text)
+    return " ".join(text.split())
+
+
+def extract_literals(question):
+    """질문에서 리터럴(문자열/날짜/국가/이름/숫자)을 추출하고 자리표시자로 치환한 형태를 반환합니다.
+
+    Returns:
+        tuple: (shape, literals) - shape는 정규화된 질문 형태, literals는 (종류, 값) 목록
+    """
+    literals = []
+    text = unicodedata.normalize("NFKC", question)
+
+    def take(kind, value_fn):
+        def repl(match):
+            if len(literals) >= MAX_LITERALS:
+                return match.group(0)
+            literals.append((kind, value_fn(match)))
+            return f" <{kind}{len(literals) - 1}> "
+        return repl
+
+    # 순서가 중요합니다: 따옴표 문자열 → 날짜 → 국가 → 영문 이름 → 숫자
+    text = _QUOTED_RE.sub(take("str", lambda m: next(g for g in m.groups() if g)), text)
+    text = _DATE_RE.sub(take("date", lambda m: f"{int(m.group(1)):04d}-{int(m.group(2)):02d}-{int(m.group(3)):02d}"), text)
+    text = _COMPACT_DATE_RE.sub(take("date", lambda m: f"{m.group(1)}-{m.group(2)}-{m.group(3)}"), text)
+    text = _COUNTRY_RE.sub(take("country", lambda m: COUNTRY_ALIASES[m.group(0)]), text)
+    text = _NAME_RE.sub(take("name", lambda m: m.group(0).strip()), text)
+    text = _NUMBER_RE.sub(take("num", lambda m: m.group(0)), text)
+
+    # 자리표시자 번호는 슬롯 구분용이므로 shape 키에서는 종류만 남깁니다
+    shape = re.sub(r"<(\w+?)\d+>", r"<\1>", _normalize(text))
+    return shape, literals
+
+
+def _date_formats(value):
+    yyyy, mm, dd = value.split("-")
+    return {"iso": value, "compact": f"{yyyy}{mm}{dd}"}
+
+
+def _render(kind, value, fmt):
+    if kind == "date":
+        return _date_formats(value)[fmt]
+    return value
+
+
+def _find_occurrences(sql, kind, value):
+    """SQL 안에서 리터럴이 나타나는 위치와 바인딩 방식을 찾습니다.
+
+    Returns:
+        list: (start, end, replacement, prefix, suffix, fmt) 목록
+    """
+    found = []
+    if kind == "num":
+        # 숫자는 문자열 리터럴 밖에서 독립된 토큰으로 나타날 때만 인정합니다
+        masked = _SQL_STRING_RE.sub(lambda m: " " * len(m.group(0)), sql)
+        for m in re.finditer(rf"(?<![\w.@]){re.escape(value)}(?![\w.])", masked):
+            top = re.search(r"\bTOP\s*\(?\s*$", masked[:m.start()], re.IGNORECASE)
+            if top and "(" not in top.group(0):
+                found.append((m.start(), m.end(), "(?)", "", "", None))
+            else:
+                found.append((m.start(), m.end(), "?", "", "", None))
+        return found
+
+    formats = _date_formats(value) if kind == "date" else {None: value}
+    for literal in _SQL_STRING_RE.finditer(sql):
+        body = literal.group(0)
+        body = body[2:-1] if body.startswith("N") else body[1:-1]
+        body = body.replace("''", "'")
+        for fmt, rendered in formats.items():
+            if body == rendered:
+                found.append((literal.start(), literal.end(), "?", "", "", fmt))
+            elif kind != "date" and body.strip("%") == rendered and body != rendered:
+                # LIKE '%값%' 형태
+                prefix = "%" if body.startswith("%") else ""
+                suffix = "%" if body.endswith("%") else ""
+                found.append((literal.start(), literal.end(), "?", prefix, suffix, fmt))
+    return found
+
+
+def build_template(sql, literals):
+    """실행에 성공한 SQL과 질문 리터럴로 파라미터화된 템플릿을 만듭니다.
+
+    SQL에서 값을 찾을 수 있는 리터럴만 파라미터(?)로 바꾸고,
+    찾을 수 없거나 모호한 리터럴은 템플릿 재사용 조건(fixed)으로 남깁니다.
+
+    Returns:
+        dict: {"sql", "binds", "fixed"} 형태의 템플릿
+    """
+    occurrences = []
+    fixed = {}
+    for idx, (kind, value) in enumerate(literals):
+        found = _find_occurrences(sql, kind, value)
+        # 0/1 같은 작은 숫자는 질문과 무관한 조건(newVisits = 1 등)과 우연히 겹치기 쉬우므로 고정값으로 둡니다
+        ambiguous = kind == "num" and (value in ("0", "1") or len(found) != 1)
+        if not found or ambiguous:
+            fixed[idx] = value
+            continue
+        occurrences.extend((start, end, repl, idx, prefix, suffix, fmt)
+                           for start, end, repl, prefix, suffix, fmt in found)
+
+    occurrences.sort()
+    # 서로 겹치는 위치가 있으면 파라미터화할 수 없음
+    for prev, cur in zip(occurrences, occurrences[1:]):
+        if cur[0] < prev[1]:
+            return None
+
+    parts, binds, pos = [], [], 0
+    for start, end, repl, idx, prefix, suffix, fmt in occurrences:
+        parts.append(sql[pos:start])
+        parts.append(repl)
+        binds.append((idx, prefix, suffix, fmt))
+        pos = end
+    parts.append(sql[pos:])
+    return {"sql": "".join(parts), "binds": binds, "fixed": fixed}
+
+
+def bind_params(template, literals):
+    """템플릿의 바인딩 정보에 맞춰 현재 질문의 리터럴로 파라미터 목록을 만듭니다."""
+    params = []
+    for idx, prefix, suffix, fmt in template["binds"]:
+        kind, value = literals[idx]
+        rendered = _render(kind, value, fmt)
+        if kind == "num" and not (prefix or suffix):
+            params.append(float(rendered) if "." in rendered else int(rendered))
+        else:
+            params.append(f"{prefix}{rendered}{suffix}")
+    return params
+
+
+class SqlPlanCache:
+    """검증된 질문 형태 → SQL 템플릿을 보관하는 LRU 캐시
+
+    같은 워커 프로세스 안의 모든 호출이 공유하며, 스레드 안전합니다.
+    """
+
+    def __init__(self, max_size=PLAN_CACHE_MAX_SIZE):
+        self.max_size = max_size
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def lookup(self, question):
+        """질문에 맞는 템플릿을 찾아 (sql, params, template)를 반환합니다. 없으면 None."""
+        shape, literals = extract_literals(question)
+        with self._lock:
+            variants = self._entries.get(shape)
+            if not variants:
+                return None
+            for template in variants:
+                if all(literals[idx][1] == value for idx, value in template["fixed"].items()):
+                    self._entries.move_to_end(shape)
+                    template["hits"] += 1
+                    return template["sql"], bind_params(template, literals), template
+        return None
+
+    def store(self, question, sql, repairs=0):
+        """실행에 성공한 질문/SQL 쌍을 템플릿으로 저장합니다.
+
+        Args:
+            repairs (int): 이 SQL을 얻기까지 오류 수정 요청을 보낸 횟수
+        """
+        shape, literals = extract_literals(question)
+        template = build_template(sql, literals)
+        if template is None:
+            return None
+        template.update({"shape": shape, "hits": 0, "successes": 1, "failures": 0, "repairs": repairs})
+        with self._lock:
+            variants = self._entries.setdefault(shape, [])
+            variants[:] = [t for t in variants if t["fixed"] != template["fixed"]]
+            variants.insert(0, template)
+            del variants[PLAN_CACHE_MAX_VARIANTS:]
+            self._entries.move_to_end(shape)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+        return template
+
+    def record_success(self, template):
+        with self._lock:
+            template["successes"] += 1
+            template["failures"] = 0
+
+    def record_failure(self, template):
+        """템플릿 실행 실패를 기록하고, 실패가 누적되면 캐시에서 제거합니다."""
+        with self._lock:
+            template["failures"] += 1
+            if template["failures"] < PLAN_CACHE_MAX_FAILURES:
+                return
+            variants = self._entries.get(template["shape"], [])
+            if template in variants:
+                variants.remove(template)
+            if not variants:
+                self._entries.pop(template["shape"], None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self):
+        return len(self._entries)
@@ -0,0 +1,87 @@
+import unittest
+from unittest.mock import MagicMock, patch
+import sys
+import os
+import threading
+import time
+
+# 상위 디렉토리를 import 경로에 추가
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import query_result_cache
+from query_result_cache import QueryResultCache, referenced_tables, watermark_covers
+
+
+class TestReferencedTables(unittest.TestCase):
+    """referenced_tables / watermark_covers: 워터마크로 무효화할 수 있는 SQL인지 판단"""
+
+    def test_from_join_and_comma_items(self):
+        self.assertEqual(
+            referenced_tables("SELECT * FROM [ga_data].[Sessions] s, ga_data.Totals t "
+                              "JOIN ga_data.DeviceGeo d ON d.session_key = s.session_key"),
+            {"ga_data.sessions", "ga_data.totals", "ga_data.devicegeo"},
+        )
+
+    def test_ctes_subqueries_and_literals_are_ignored(self):
+        sql = ("WITH daily AS (SELECT date, COUNT(*) AS n FROM ga_data.Sessions GROUP BY date) "
+               "SELECT * FROM daily, (SELECT 1 AS x) t WHERE note <> 'from dbo.News'")
+        self.assertEqual(referenced_tables(sql), {"ga_data.sessions"})
+        self.assertTrue(watermark_covers(sql))
+
+    def test_tables_outside_ga_data_are_not_covered(self):
+        for sql in [
+            "SELECT TOP 10 title FROM dbo.News",
+            "SELECT * FROM ga_data.Sessions s JOIN dbo.vw_DailyStock v ON v.date = s.date",
+            "SELECT * FROM ga_data.Sessions, Totals",  # 스키마 생략
+            "SELECT 1",
+        ]:
+            self.assertFalse(watermark_covers(sql), sql)
+
+
+class TestQueryResultCache(unittest.TestCase):
+    """QueryResultCache: 워터마크 변경 시 무효화, ga_data 밖 테이블은 TTL 만료, 워터마크는 한 호출만 조회"""
+
+    def _conn(self, version, delay=0.0):
+        conn = MagicMock()
+        cursor = conn.cursor.return_value
+
+        def execute(sql):
+            time.sleep(delay)
+
+        cursor.execute.side_effect = execute
+        cursor.fetchone.return_value = (version,)
+        return conn
+
+    def test_watermark_change_invalidates(self):
+        cache = QueryResultCache()
+        version = cache.watermark(self._conn(1))
+        cache.put("SELECT * FROM ga_data.Sessions", [], version, [{"n": 1}])
+        self.assertEqual(cache.get("select *  from ga_data.Sessions;", [], version), [{"n": 1}])
+        with patch.object(query_result_cache, "WATERMARK_CHECK_INTERVAL", 0):
+            self.assertEqual(cache.watermark(self._conn(2)), 2)
+        self.assertEqual(len(cache), 0)
+
+    def test_uncovered_tables_expire_on_ttl(self):
+        cache = QueryResultCache()
+        cache.put("SELECT * FROM dbo.News", [], 1, ["news"])
+        cache.put("SELECT * FROM ga_data.Sessions", [], 1, ["sessions"])
+        with patch.object(query_result_cache, "RESULT_CACHE_FALLBACK_TTL", -1):
+            self.assertIsNone(cache.get("SELECT * FROM dbo.News", [], 1))
+            self.assertEqual(cache.get("SELECT * FROM ga_data.Sessions", [], 1), ["sessions"])
+
+    def test_concurrent_callers_refresh_once(self):
+        cache = QueryResultCache()
+        conn = self._conn(7, delay=0.2)
+        results = []
+        threads = [threading.Thread(target=lambda: results.append(cache.watermark(conn))) for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join(5)
+        self.assertEqual(conn.cursor.return_value.execute.call_count, 1)
+        self.assertIn(7, results)
+        self.assertEqual(cache.watermark(conn), 7)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,115 @@
+import unittest
+from unittest.mock import MagicMock, patch
+import sys
+import os
+
+# 상위 디렉토리를 import 경로에 추가
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import pyodbc
+import sql_guard
+from sql_guard import SqlGuardError, check_static
+
+ALLOWED_TABLES = ["ga_data.Sessions", "ga_data.Totals", "dbo.News"]
+
+
+class TestCheckStatic(unittest.TestCase):
+    """check_static 정적 검사 단위 테스트"""
+
+    def assertRejected(self, sql, message):
+        with self.assertRaises(SqlGuardError) as ctx:
+            check_static(sql, ALLOWED_TABLES)
+        self.assertIn(message, str(ctx.exception))
+
+    def test_injects_top(self):
+        """TOP이 없는 최상위 SELECT에 TOP을 넣는지 확인"""
+        self.assertEqual(
+            check_static("SELECT date FROM ga_data.Sessions;", ALLOWED_TABLES, max_rows=50),
+            "SELECT TOP (50) date FROM ga_data.Sessions",
+        )
+        self.assertEqual(
+            check_static("SELECT DISTINCT TOP 5 date FROM ga_data.Sessions", ALLOWED_TABLES),
+            "SELECT DISTINCT TOP 5 date FROM ga_data.Sessions",
+        )
+
+    def test_forbidden_keywords(self):
+        """변경 구문/금지 키워드/시스템 프로시저 거부"""
+        self.assertRejected("DELETE FROM ga_data.Sessions", "SELECT 문만")
+        self.assertRejected("SELECT * INTO dbo.Copy FROM ga_data.Sessions", "into")
+        self.assertRejected("SELECT 1; DROP TABLE dbo.News", "하나의 SELECT")
+        self.assertRejected("SELECT * FROM ga_data.Sessions WHERE 1 = 1 WAITFOR DELAY '00:01'", "waitfor")
+        self.assertRejected("SELECT * FROM sys.objects WHERE name = sp_who", "시스템 프로시저")
+
+    def test_keywords_inside_literals_and_comments(self):
+        """문자열 리터럴/주석 안의 키워드는 무시"""
+        sql = "SELECT title FROM dbo.News WHERE title LIKE N'%delete; drop%' -- update\n"
+        self.assertEqual(check_static(sql, ALLOWED_TABLES),
+                         "SELECT TOP (1000) title FROM dbo.News WHERE title LIKE N'%delete; drop%'")
+
+    def test_keywords_inside_bracketed_identifiers(self):
+        """[set], [update], [Date Exec] 같은 대괄호 식별자 안의 키워드는 무시하고, 대괄호 테이블 이름은 계속 검사"""
+        sql = "SELECT [set], [update], [Date Exec] FROM [dbo].[News] WHERE [delete;] = 1"
+        self.assertEqual(check_static(sql, ALLOWED_TABLES),
+                         "SELECT TOP (1000) [set], [update], [Date Exec] FROM [dbo].[News] WHERE [delete;] = 1")
+        self.assertRejected("SELECT [set] FROM [other].[update]", "other.update")
+        self.assertRejected("SELECT [x] FROM dbo.News; UPDATE dbo.News SET [x] = 1", "하나의 SELECT")
+
+    def test_comma_join_checks_every_table(self):
+        """쉼표로 나열한 FROM 절의 테이블도 모두 허용 목록과 비교"""
+        check_static("SELECT s.date FROM ga_data.Sessions s, ga_data.Totals t WHERE s.session_key = t.session_key",
+                     ALLOWED_TABLES)
+        self.assertRejected("SELECT * FROM ga_data.Sessions s, Users u", "users")
+        self.assertRejected("SELECT * FROM ga_data.Sessions, [other].[Secrets]", "other.secrets")
+        self.assertRejected(
+            "SELECT * FROM dbo.News WHERE id IN (SELECT id FROM ga_data.Totals, dbo.Secret)", "dbo.secret")
+
+    def test_unknown_tables(self):
+        """알 수 없는 스키마/테이블 거부, CTE와 하위 쿼리는 허용"""
+        self.assertRejected("SELECT * FROM other.secrets", "other.secrets")
+        self.assertRejected("SELECT * FROM ga_data.Sessions JOIN Users ON 1 = 1", "users")
+        check_static("WITH m AS (SELECT * FROM ga_data.Sessions), n AS (SELECT 1 AS x) SELECT * FROM m, n",
+                     ALLOWED_TABLES)
+        check_static("SELECT * FROM (SELECT * FROM ga_data.Totals) t, [ga_data].[Sessions] s", ALLOWED_TABLES)
+
+
+class TestCheckCost(unittest.TestCase):
+    """check_cost: SHOWPLAN 권한 오류는 건너뛰고 컴파일 오류는 그대로 전달"""
+
+    def setUp(self):
+        self.patcher = patch.object(sql_guard, "_showplan_denied", False)
+        self.patcher.start()
+
+    def tearDown(self):
+        self.patcher.stop()
+
+    def _conn(self, error):
+        conn = MagicMock()
+
+        def execute(sql, *params):
+            if not sql.startswith("SET "):
+                raise error
+
+        conn.cursor.return_value.execute.side_effect = execute
+        return conn
+
+    def test_permission_error_falls_through_to_dry_run(self):
+        """SHOWPLAN 권한 오류(262)면 None을 반환하고 validate가 dry-run을 실행"""
+        error = pyodbc.ProgrammingError(
+            "42000", "[42000] [Microsoft][ODBC Driver 18 for SQL Server][SQL Server]"
+                     "SHOWPLAN permission denied in database 'ga'. (262) (SQLExecDirectW)")
+        conn = self._conn(error)
+        with patch.object(sql_guard, "dry_run") as dry_run:
+            sql_guard.validate(conn, "SELECT 1")
+        dry_run.assert_called_once_with(conn, "SELECT 1", None)
+        self.assertTrue(sql_guard._showplan_denied)
+
+    def test_compile_error_is_raised(self):
+        """없는 컬럼 등 컴파일 오류는 다시 발생"""
+        error = pyodbc.ProgrammingError("42S22", "[42S22] Invalid column name 'foo'. (207) (SQLExecDirectW)")
+        with self.assertRaises(pyodbc.ProgrammingError):
+            sql_guard.check_cost(self._conn(error), "SELECT foo FROM dbo.News")
+        self.assertFalse(sql_guard._showplan_denied)
+
+
+if __name__ == "__main__":
+    unittest.main()
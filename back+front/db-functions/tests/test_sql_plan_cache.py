@@ -0,0 +1,91 @@
+import unittest
+import sys
+import os
+
+# 상위 디렉토리를 import 경로에 추가
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sql_plan_cache import SqlPlanCache, bind_params, build_template, extract_literals
+
+TOP_COUNTRY_SQL = (
+    "SELECT TOP 10 d.city, COUNT(*) AS sessions FROM ga_data.Sessions s "
+    "JOIN ga_data.DeviceGeo d ON d.session_key = s.session_key "
+    "WHERE s.date = '20170801' AND d.country = N'United States' AND s.newVisits = 1 GROUP BY d.city"
+)
+
+
+class TestExtractLiterals(unittest.TestCase):
+    """extract_literals: 리터럴 추출과 질문 형태(shape)"""
+
+    def test_kinds_and_shape(self):
+        shape, literals = extract_literals("2017-08-01 미국 'Google' 세션 수 상위 10개")
+        self.assertEqual(shape, "<date> <country> <str> 세션 수 상위 <num> 개")
+        self.assertEqual(literals, [("str", "Google"), ("date", "2017-08-01"),
+                                    ("country", "United States"), ("num", "10")])
+
+    def test_korean_date_and_following_word(self):
+        """날짜 뒤의 '일'은 숫자에 붙어 있을 때만 날짜로 봄"""
+        self.assertEqual(extract_literals("2017년 8월 1일 세션 수")[1], [("date", "2017-08-01")])
+        self.assertEqual(extract_literals("2016-12-31 일본 세션 수"),
+                         ("<date> <country> 세션 수", [("date", "2016-12-31"), ("country", "Japan")]))
+
+
+class TestBuildTemplate(unittest.TestCase):
+    """build_template / bind_params: 성공한 SQL을 파라미터화하고 다른 리터럴로 다시 바인딩"""
+
+    def test_parameterizes_found_literals(self):
+        _, literals = extract_literals("2017-08-01 미국 세션 수 상위 10개")
+        template = build_template(TOP_COUNTRY_SQL, literals)
+        self.assertEqual(
+            template["sql"],
+            "SELECT TOP (?) d.city, COUNT(*) AS sessions FROM ga_data.Sessions s "
+            "JOIN ga_data.DeviceGeo d ON d.session_key = s.session_key "
+            "WHERE s.date = ? AND d.country = ? AND s.newVisits = 1 GROUP BY d.city",
+        )
+        self.assertEqual(template["fixed"], {})
+        self.assertEqual(bind_params(template, literals), [10, "20170801", "United States"])
+
+        _, other = extract_literals("2016-12-31 일본 세션 수 상위 5개")
+        self.assertEqual(bind_params(template, other), [5, "20161231", "Japan"])
+
+    def test_like_pattern_keeps_wildcards(self):
+        _, literals = extract_literals("'Google' 상품 매출")
+        template = build_template(
+            "SELECT SUM(productRevenue) FROM ga_data.HitsProduct WHERE v2ProductName LIKE '%Google%'", literals)
+        self.assertTrue(template["sql"].endswith("LIKE ?"))
+        self.assertEqual(bind_params(template, [("str", "YouTube")]), ["%YouTube%"])
+
+    def test_literal_missing_from_sql_is_fixed(self):
+        """SQL에서 찾을 수 없거나 0/1처럼 모호한 숫자는 재사용 조건(fixed)으로 남김"""
+        _, literals = extract_literals("신규 방문 1회 이상 사용자 중 미국 사용자 수")
+        template = build_template(
+            "SELECT COUNT(*) FROM ga_data.Totals t JOIN ga_data.DeviceGeo d ON d.session_key = t.session_key "
+            "WHERE t.newVisits = 1 AND d.country = 'United States'", literals)
+        self.assertEqual(literals, [("country", "United States"), ("num", "1")])
+        self.assertEqual(template["fixed"], {1: "1"})
+        self.assertEqual(template["binds"], [(0, "", "", None)])
+
+
+class TestSqlPlanCache(unittest.TestCase):
+    """SqlPlanCache: 같은 형태의 질문은 LLM 없이 템플릿 재사용, 고정값이 다르면 미스"""
+
+    def test_lookup_binds_new_literals(self):
+        cache = SqlPlanCache()
+        self.assertIsNotNone(cache.store("2017-08-01 미국 세션 수 상위 10개", TOP_COUNTRY_SQL))
+        sql, params, template = cache.lookup("2016-12-31 일본 세션 수 상위 5개")
+        self.assertIn("TOP (?)", sql)
+        self.assertEqual(params, [5, "20161231", "Japan"])
+        self.assertEqual(template["hits"], 1)
+        self.assertIsNone(cache.lookup("2016-12-31 일본 방문자 수 상위 5개"))
+
+    def test_failures_evict_template(self):
+        cache = SqlPlanCache()
+        template = cache.store("2017-08-01 미국 세션 수 상위 10개", TOP_COUNTRY_SQL)
+        cache.record_failure(template)
+        self.assertEqual(len(cache), 1)
+        cache.record_failure(template)
+        self.assertEqual(len(cache), 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -15,6 +15,8 @@ const ChatWindow = () => {
   const [abortController, setAbortController] = useState(null);
   const containerRef = useRef(null);
   const typingRef = useRef(null);
+  // 멀티턴 대화용 세션 ID (첫 응답에서 백엔드가 발급)
+  const sessionIdRef = useRef(null);
 
   const handleSend = async () => {
     if (!input.trim() || isWaitingForResponse || isTyping) return;
@@ -29,7 +31,7 @@ const ChatWindow = () => {
     setAbortController(controller);
 
     try {
-      const gptReply = await GptResponse(input, controller.signal);
+      const gptReply = await GptResponse(input, controller.signal, sessionIdRef);
       const id = Date.now();
       setTypingId(id);
       setCurrentTypingText(gptReply);
@@ -225,19 +227,27 @@ const ChatWindow = () => {
   );
 };
 
-export const GptResponse = async (prompt, signal) => {
+export const GptResponse = async (prompt, signal, sessionIdRef) => {
   try {
     const response = await axios.post('http://127.0.0.1:8000/api/chat_smart/', {
-      question: prompt
+      question: prompt,
+      session_id: sessionIdRef?.current
     }, {
       signal // AbortController signal 전달
     });
+    if (sessionIdRef && response.data.session_id) {
+      sessionIdRef.current = response.data.session_id;
+    }
     return response.data.answer;
   } catch (error) {
     if (error.name === 'AbortError') {
       throw error; // abort 에러는 그대로 throw
     }
     console.error('백엔드 API 호출 실패:', error);
+    // 요청이 몰린 경우(429/503) 서버가 보낸 안내 문구를 표시
+    if (error.response && [429, 503].includes(error.response.status) && error.response.data?.error) {
+      return error.response.data.error;
+    }
     return '서버와 연결할 수 없습니다. 나중에 다시 시도해주세요.';
   }
 };
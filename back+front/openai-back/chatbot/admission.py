@@ -0,0 +1,158 @@
+import os
+import math
+import time
+import threading
+from contextlib import contextmanager
+
+# 챗봇 요청 수락 제어
+# 1. single-flight: 대화 기록이 없는 같은 질문이 동시에 여러 번 들어오면 먼저 온 요청(leader)만 파이프라인을 실행하고
+#    나머지(follower)는 그 결과를 기다렸다가 함께 받습니다. 끝난 뒤에는 공유하지 않습니다(진행 중인 요청만 합침).
+# 2. 업스트림별 동시 호출 제한: openai / search / sql마다 동시에 보낼 수 있는 호출 수를 정하고, 넘치면 대기열에서
+#    UPSTREAM_QUEUE_TIMEOUT까지 기다립니다. 대기열이 가득 찼거나 시간이 지나면 Saturated를 발생시켜
+#    뷰가 503 + Retry-After로 응답합니다 (요청이 몰려도 업스트림 rate limit을 넘겨 전부 타임아웃되지 않도록).
+#    단, 문서 검색 단계(번역/임베딩/검색)는 포화 시 기존 대체 경로(로컬 FAISS, 검색 실패 문구)로 넘어갑니다.
+# OpenAI가 429를 돌려주면 뷰는 그 Retry-After로 429를 응답합니다.
+
+UPSTREAM_CONCURRENCY = {
+    "openai": int(os.getenv("UPSTREAM_CONCURRENCY_OPENAI", "8")),
+    "search": int(os.getenv("UPSTREAM_CONCURRENCY_SEARCH", "16")),
+    "sql": int(os.getenv("UPSTREAM_CONCURRENCY_SQL", "4")),
+}
+# 자리가 날 때까지 기다리는 최대 시간(초) / 업스트림별 최대 대기 요청 수
+UPSTREAM_QUEUE_TIMEOUT = float(os.getenv("UPSTREAM_QUEUE_TIMEOUT", "15"))
+UPSTREAM_MAX_QUEUE = int(os.getenv("UPSTREAM_MAX_QUEUE", "64"))
+# follower가 leader 결과를 기다리는 최대 시간(초). SQL 호출 타임아웃(360초)보다 길게 둠
+CHAT_COALESCE_WAIT_SECONDS = float(os.getenv("CHAT_COALESCE_WAIT_SECONDS", "400"))
+
+
+class Saturated(Exception):
+    """업스트림 호출 자리를 얻지 못함 (retry_after: 다시 시도까지 권장 대기 초)"""
+
+    def __init__(self, upstream, retry_after):
+        super().__init__(f"{upstream} 업스트림이 포화 상태입니다 (retry after {retry_after}s)")
+        self.upstream = upstream
+        self.retry_after = retry_after
+
+
+class UpstreamLimiter:
+    """업스트림 하나의 동시 호출 수 제한 + 대기열"""
+
+    def __init__(self, name, limit, queue_timeout=UPSTREAM_QUEUE_TIMEOUT, max_queue=UPSTREAM_MAX_QUEUE):
+        self.name = name
+        self.limit = max(1, limit)
+        self.queue_timeout = queue_timeout
+        self.max_queue = max_queue
+        self.active = 0
+        self.waiting = 0
+        self.rejected = 0
+        # 호출 한 번이 자리를 잡고 있는 평균 시간(초, 지수 이동 평균). Retry-After 추정에 사용
+        self.avg_hold = 1.0
+        self._condition = threading.Condition()
+
+    def retry_after(self):
+        """지금 대기열이 비기까지 걸릴 예상 시간(초)"""
+        return max(1, math.ceil(self.avg_hold * (self.waiting + 1) / self.limit))
+
+    @contextmanager
+    def slot(self, span=None):
+        """자리를 얻을 때까지 기다린 뒤 호출을 실행합니다. span이 있으면 대기 시간을 queue_ms로 기록."""
+        start = time.monotonic()
+        with self._condition:
+            if self.active >= self.limit:
+                if self.waiting >= self.max_queue:
+                    self.rejected += 1
+                    raise Saturated(self.name, self.retry_after())
+                self.waiting += 1
+                try:
+                    acquired = self._condition.wait_for(lambda: self.active < self.limit, timeout=self.queue_timeout)
+                finally:
+                    self.waiting -= 1
+                if not acquired:
+                    self.rejected += 1
+                    raise Saturated(self.name, self.retry_after())
+            self.active += 1
+        acquired_at = time.monotonic()
+        if span is not None:
+            span["queue_ms"] = round((acquired_at - start) * 1000, 1)
+        try:
+            yield
+        finally:
+            with self._condition:
+                self.active -= 1
+                self.avg_hold = 0.8 * self.avg_hold + 0.2 * (time.monotonic() - acquired_at)
+                self._condition.notify()
+
+    def stats(self):
+        with self._condition:
+            return {"limit": self.limit, "active": self.active, "waiting": self.waiting,
+                    "rejected": self.rejected, "avg_hold_ms": round(self.avg_hold * 1000, 1)}
+
+
+upstreams = {name: UpstreamLimiter(name, limit) for name, limit in UPSTREAM_CONCURRENCY.items()}
+
+
+class _Call:
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+        self.followers = 0
+
+
+class SingleFlight:
+    """같은 키의 진행 중인 계산을 하나로 합칩니다."""
+
+    def __init__(self, wait_seconds=CHAT_COALESCE_WAIT_SECONDS):
+        self.wait_seconds = wait_seconds
+        self.coalesced = 0
+        self._calls = {}
+        self._lock = threading.Lock()
+
+    def do(self, key, fn):
+        """fn()을 실행하거나, 같은 키가 실행 중이면 그 결과를 기다립니다.
+
+        Returns:
+            tuple: (결과, follower였는지 여부)
+
+        Raises:
+            Saturated: follower가 wait_seconds 안에 결과를 받지 못함
+        """
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+            else:
+                call.followers += 1
+                self.coalesced += 1
+
+        if not leader:
+            if not call.done.wait(self.wait_seconds):
+                raise Saturated("single-flight", max(1, math.ceil(self.wait_seconds / 10)))
+            if call.error is not None:
+                raise call.error
+            return call.result, True
+
+        try:
+            call.result = fn()
+            return call.result, False
+        except Exception as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+
+    def stats(self):
+        with self._lock:
+            return {"in_flight": len(self._calls), "coalesced": self.coalesced,
+                    "waiting_followers": sum(call.followers for call in self._calls.values())}
+
+
+def coalesce_key(question):
+    """같은 질문으로 볼 키 (공백/대소문자/끝 문장부호 차이 무시)"""
+    return " ".join(question.lower().split()).rstrip("?.!。 ")
+
+
+single_flight = SingleFlight()
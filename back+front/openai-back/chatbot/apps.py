@@ -4,3 +4,13 @@ from django.apps import AppConfig
 class ChatbotConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'chatbot'
+
+    def ready(self):
+        # 로컬 FAISS 인덱스가 있으면 시작할 때 memory-map으로 열어 둠 (첫 검색 지연 방지)
+        from chatbot.vector_store import get_vector_store
+        try:
+            store = get_vector_store()
+            if len(store):
+                print(f"DEBUG: Local vector store loaded ({len(store)} chunks, read_only={store.read_only}).")
+        except Exception as e:
+            print(f"WARNING: Failed to load local vector store: {e}")
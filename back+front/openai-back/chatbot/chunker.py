@@ -0,0 +1,227 @@
+import os
+import re
+import statistics
+
+try:
+    import tiktoken  # OpenAI 임베딩 모델과 같은 토크나이저
+except ImportError:  # tiktoken이 없으면 글자 수 기반 추정으로 동작
+    tiktoken = None
+
+# 구조 보존 토큰 기반 청커
+# PyMuPDF의 블록/글꼴 정보로 제목(섹션)을 찾고, 본문은 문장 단위로 잘라 목표 토큰 수에 맞춰 묶습니다.
+# 500자마다 자르던 방식과 달리 단어/문장이 중간에 끊기지 않고, 각 청크에 페이지 번호와 섹션 제목이 붙습니다.
+# (pdf_processor/chunker.py와 back+front/openai-back/chatbot/chunker.py는 같은 파일입니다)
+
+# 청크 목표 토큰 수 / 이전 청크와 겹치는 토큰 수 / 이보다 짧은 청크는 버림
+CHUNK_TARGET_TOKENS = int(os.getenv("CHUNK_TARGET_TOKENS", "350"))
+CHUNK_OVERLAP_TOKENS = int(os.getenv("CHUNK_OVERLAP_TOKENS", "50"))
+CHUNK_MIN_TOKENS = int(os.getenv("CHUNK_MIN_TOKENS", "30"))
+TOKENIZER_ENCODING = os.getenv("TOKENIZER_ENCODING", "cl100k_base")
+
+# 본문 글자 크기 대비 이 비율 이상이면 제목으로 판단
+HEADING_SIZE_RATIO = 1.15
+# 이 제목이 나오면 이후 내용은 청크로 만들지 않음
+STOP_SECTIONS = ("references", "bibliography", "acknowledgments", "acknowledgements", "참고문헌")
+
+LIGATURE_MAP = {
+    'ﬁ': 'fi',
+    'ﬂ': 'fl',
+    '©': '', '®': '', '™': '', '–': '-', '—': '-', '…': '...',
+    '“': '"', '”': '"', '‘': "'", '’': "'",
+}
+# 문장 끝으로 보지 않는 약어 (소문자, 마침표 제외)
+ABBREVIATIONS = {"e.g", "i.e", "et al", "fig", "figs", "eq", "eqs", "vs", "no", "cf", "approx", "dr", "mr", "ms"}
+
+_SENTENCE_END_RE = re.compile(r"[.!?。](?:[\"')\]])?\s+")
+_CAPTION_RE = re.compile(r"^(figure|fig\.|table|tab\.)\s*\d+", re.IGNORECASE)
+_NUMBERED_HEADING_RE = re.compile(r"^(\d+(\.\d+)*|[IVX]+)\.?\s+\S")
+
+_encoder = None
+_encoder_failed = False
+
+
+def count_tokens(text):
+    """임베딩 모델 기준 토큰 수 (tiktoken이 없으면 영문 약 4자, 그 외 1자 = 1토큰으로 추정)"""
+    global _encoder, _encoder_failed
+    if _encoder is None and tiktoken is not None and not _encoder_failed:
+        try:
+            _encoder = tiktoken.get_encoding(TOKENIZER_ENCODING)
+        except Exception:
+            # 인코딩 파일을 받을 수 없는 환경(오프라인 등)이면 추정 방식으로 계속
+            _encoder_failed = True
+    if _encoder is not None:
+        return len(_encoder.encode(text))
+    ascii_chars = sum(1 for ch in text if ord(ch) < 128)
+    return max(1, ascii_chars // 4 + (len(text) - ascii_chars))
+
+
+def clean_text(text):
+    """줄바꿈/특수 공백/합자/제어 문자 정리"""
+    text = text.replace('\n', ' ').replace('\xa0', ' ')
+    for bad_char, replacement in LIGATURE_MAP.items():
+        text = text.replace(bad_char, replacement)
+    text = re.sub(r'[\x00-\x1F\x7F]', '', text)
+    return ' '.join(text.split())
+
+
+def split_sentences(text):
+    """문장 단위로 나눕니다 (약어 뒤의 마침표에서는 나누지 않음)."""
+    sentences, start = [], 0
+    for match in _SENTENCE_END_RE.finditer(text):
+        head = text[start:match.start()]
+        last_word = head.rsplit(" ", 2)
+        tail = " ".join(last_word[-2:]).lower() if len(last_word) > 1 else head.lower()
+        if any(tail.endswith(abbr) for abbr in ABBREVIATIONS) or re.search(r"\b[A-Z]$", head):
+            continue
+        sentences.append(text[start:match.end()].strip())
+        start = match.end()
+    if text[start:].strip():
+        sentences.append(text[start:].strip())
+    return sentences
+
+
+def _split_long(sentence, max_tokens):
+    """목표 토큰 수보다 긴 문장은 단어 단위로 나눕니다."""
+    parts, current = [], []
+    for word in sentence.split():
+        current.append(word)
+        if count_tokens(" ".join(current)) >= max_tokens:
+            parts.append(" ".join(current))
+            current = []
+    if current:
+        parts.append(" ".join(current))
+    return parts
+
+
+def _block_lines(block):
+    """PyMuPDF dict 블록 → (텍스트, 최대 글자 크기, 굵은 글꼴 여부)"""
+    lines, sizes, bold = [], [], True
+    for line in block.get("lines", []):
+        spans = [span for span in line.get("spans", []) if span.get("text", "").strip()]
+        if not spans:
+            continue
+        lines.append("".join(span["text"] for span in spans))
+        sizes.extend(span.get("size", 0) for span in spans)
+        bold = bold and all(span.get("flags", 0) & 16 for span in spans)
+    # 줄 끝 하이픈으로 나뉜 단어 복원
+    text = ""
+    for line in lines:
+        if text.endswith("-") and line[:1].islower():
+            text = text[:-1] + line
+        else:
+            text = f"{text} {line}" if text else line
+    return clean_text(text), max(sizes, default=0), bold and bool(lines)
+
+
+def extract_blocks(doc, page_numbers=None):
+    """페이지 순서대로 (페이지 번호(1부터), 텍스트, 제목 여부) 블록을 내보냅니다.
+
+    제목은 같은 페이지 본문 글자 크기(글자 수 가중 중앙값)보다 큰 짧은 블록이거나,
+    번호가 붙은 짧은 굵은 글씨 블록입니다.
+    """
+    for page_index in (page_numbers if page_numbers is not None else range(len(doc))):
+        page = doc[page_index]
+        blocks = [
+            _block_lines(block)
+            for block in page.get_text("dict").get("blocks", [])
+            if block.get("type", 0) == 0
+        ]
+        blocks = [b for b in blocks if b[0]]
+        weighted = [size for text, size, _ in blocks for _ in range(min(len(text), 2000))]
+        body_size = statistics.median(weighted) if weighted else 0
+        for text, size, bold in blocks:
+            short = len(text) <= 120 and len(text.split()) <= 14 and not text.endswith(".")
+            heading = short and (
+                (body_size and size >= body_size * HEADING_SIZE_RATIO)
+                or (bold and _NUMBERED_HEADING_RE.match(text) is not None)
+            )
+            yield page_index + 1, text, bool(heading)
+
+
+def chunk_blocks(blocks, target_tokens=CHUNK_TARGET_TOKENS, overlap_tokens=CHUNK_OVERLAP_TOKENS,
+                 min_tokens=CHUNK_MIN_TOKENS):
+    """블록을 문장 단위로 묶어 청크를 만듭니다.
+
+    섹션(제목)이 바뀌면 청크를 새로 시작하고, 같은 섹션 안에서는 직전 청크 끝의 문장을
+    overlap_tokens 이내로 다음 청크 앞에 다시 넣습니다.
+
+    Yields:
+        dict: {"text", "section", "page_start", "page_end", "tokens"}
+    """
+    section = ""
+    sentences = []  # (문장, 토큰 수, 페이지)
+    tokens = 0
+    carried_count = 0
+    pending = None  # 아직 내보내지 않은 직전 청크 (짧은 마지막 조각을 합치기 위해 한 개 보류)
+
+    def make_chunk(items):
+        return {
+            "text": " ".join(s for s, _, _ in items),
+            "section": section,
+            "page_start": items[0][2],
+            "page_end": items[-1][2],
+            "tokens": sum(t for _, t, _ in items),
+        }
+
+    def flush(keep_overlap):
+        nonlocal sentences, tokens, pending, carried_count
+        own = sentences[carried_count:]  # 이전 청크에서 넘어온 겹침 문장 제외
+        out = []
+        if own:
+            own_tokens = sum(t for _, t, _ in own)
+            if pending is not None and own_tokens < min_tokens and pending["section"] == section \
+                    and pending["tokens"] + own_tokens <= target_tokens * 1.25:
+                # 짧은 마지막 조각은 직전 청크에 붙입니다
+                pending = _merge(pending, make_chunk(own))
+            else:
+                if pending is not None and pending["tokens"] >= min_tokens:
+                    out.append(pending)
+                pending = make_chunk(sentences)
+        carried, carried_tokens = [], 0
+        if own and keep_overlap and overlap_tokens > 0:
+            for item in reversed(sentences):
+                if carried_tokens + item[1] > overlap_tokens or len(carried) + 1 >= len(sentences):
+                    break
+                carried.insert(0, item)
+                carried_tokens += item[1]
+        sentences, tokens, carried_count = carried, carried_tokens, len(carried)
+        return out
+
+    for page, text, heading in blocks:
+        if heading:
+            yield from flush(keep_overlap=False)
+            title = text.strip()
+            if re.sub(r"^[\dIVX.\s]+", "", title).lower() in STOP_SECTIONS:
+                break
+            section = title
+            continue
+        if _CAPTION_RE.match(text):
+            continue  # 그림/표 캡션은 제외
+        for sentence in split_sentences(text):
+            sentence_tokens = count_tokens(sentence)
+            pieces = [sentence] if sentence_tokens <= target_tokens else _split_long(sentence, target_tokens)
+            for piece in pieces:
+                piece_tokens = sentence_tokens if len(pieces) == 1 else count_tokens(piece)
+                if sentences and tokens + piece_tokens > target_tokens:
+                    yield from flush(keep_overlap=True)
+                sentences.append((piece, piece_tokens, page))
+                tokens += piece_tokens
+
+    yield from flush(keep_overlap=False)
+    if pending is not None and pending["tokens"] >= min_tokens:
+        yield pending
+
+
+def _merge(first, second):
+    return {
+        "text": f"{first['text']} {second['text']}",
+        "section": first["section"],
+        "page_start": first["page_start"],
+        "page_end": second["page_end"],
+        "tokens": first["tokens"] + second["tokens"],
+    }
+
+
+def chunk_document(doc, page_numbers=None, **kwargs):
+    """PyMuPDF 문서를 청크 목록으로 나눕니다 (chunk_blocks 인자 전달 가능)."""
+    return chunk_blocks(extract_blocks(doc, page_numbers), **kwargs)
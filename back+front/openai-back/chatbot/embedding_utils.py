@@ -1,10 +1,13 @@
 import os
+import re
+import hashlib
 import fitz  # PyMuPDF
 import numpy as np
-import faiss
 from openai import AzureOpenAI
 from dotenv import load_dotenv
 from azure.storage.blob import BlobServiceClient
+from chunker import chunk_document
+from vector_store import VectorStore
 
 # 환경변수 로드
 load_dotenv()
@@ -20,38 +23,52 @@ embedding_client = AzureOpenAI(
 # 임베딩 차원
 EMBEDDING_DIM = int(os.getenv("EMBEDDING_DIMENSION"))
 
+# 임베딩 요청 한 번에 보낼 최대 청크 수 / 토큰 수 (여러 문서의 청크를 섞어서 채움)
+EMBEDDING_BATCH_SIZE = int(os.getenv("EMBEDDING_BATCH_SIZE", "64"))
+EMBEDDING_BATCH_MAX_TOKENS = int(os.getenv("EMBEDDING_BATCH_MAX_TOKENS", "8000"))
+
 # Blob Storage 연결
 blob_service_client = BlobServiceClient.from_connection_string(os.getenv("AZURE_STORAGE_CONNECTION_STRING"))
 container_name = os.getenv("BLOB_CONTAINER_NAME")
 container_client = blob_service_client.get_container_client(container_name)
 
-# 텍스트 정제
-def clean_text(text):
-    text = text.replace('\n', ' ').replace('\xa0', ' ')
-    text = ' '.join(text.split())
-    return text
+# PDF에서 섹션/문장 단위 청크 추출 (각 청크: text, section, page_start, page_end, tokens)
+def extract_chunks_from_pdf(pdf_path):
+    with fitz.open(pdf_path) as doc:
+        return list(chunk_document(doc))
+
+# 프로세스 풀에서 실행할 추출 작업: (PDF 경로, 페이지 수, 청크 목록)
+def extract_document(pdf_path):
+    with fitz.open(pdf_path) as doc:
+        return pdf_path, len(doc), list(chunk_document(doc))
 
-# PDF에서 텍스트 추출
-def extract_text_from_pdf(pdf_path):
-    doc = fitz.open(pdf_path)
-    full_text = ""
-    for page in doc:
-        full_text += page.get_text()
-    return clean_text(full_text)
+# 문서 ID: 입력 루트(디렉터리/glob의 고정 부분) 기준 상대 경로. 루트가 없으면 파일 이름
+# 다른 폴더의 같은 이름 파일도 서로 다른 문서로 구분됩니다 (FAISS 문서 교체 / Blob 접두사에 사용).
+def document_id(pdf_path, root=None):
+    path = os.path.relpath(pdf_path, root) if root else os.path.basename(pdf_path)
+    return path.replace(os.sep, "/")
 
-# 유효한 chunk 판별
-def is_valid_chunk(chunk):
-    chunk_lower = chunk.lower()
-    if len(chunk.strip()) < 20:
-        return False
-    if chunk_lower.startswith(("figure", "table", "references", "doi", "copyright")):
-        return False
-    return True
+# 문서별 Blob 이름 접두사: 파일 이름의 ASCII slug + 문서 ID 해시 (pdf_processor의 slug와 같은 문자 집합)
+# Blob 이름이 그대로 AI Search 문서 키가 되므로 키에 쓸 수 없는 한글 등은 빼고, 남는 글자가 없으면 해시만 씁니다.
+# 예: 2023/Marketing Plan.pdf → paper-processed-marketing-plan-1a2b3c4d, 마케팅/전략.pdf → paper-processed-1a2b3c4d
+def document_prefix(pdf_path, root=None):
+    base = os.path.splitext(os.path.basename(pdf_path))[0]
+    slug = re.sub(r'[^a-z0-9]+', '-', base.lower()).strip("-")
+    digest = hashlib.sha1(document_id(pdf_path, root).encode("utf-8")).hexdigest()[:8]
+    return f"paper-processed-{slug}-{digest}" if slug else f"paper-processed-{digest}"
 
-# 텍스트 분할
-def split_text(text, chunk_size=500):
-    chunks = [text[i:i + chunk_size] for i in range(0, len(text), chunk_size)]
-    return [chunk for chunk in chunks if is_valid_chunk(chunk)]
+# (키, 청크) 목록을 요청당 개수/토큰 제한에 맞는 배치로 나누는 함수
+def batch_chunks(items, max_items=EMBEDDING_BATCH_SIZE, max_tokens=EMBEDDING_BATCH_MAX_TOKENS):
+    batch, tokens = [], 0
+    for item in items:
+        item_tokens = item[1]["tokens"]
+        if batch and (len(batch) >= max_items or tokens + item_tokens > max_tokens):
+            yield batch
+            batch, tokens = [], 0
+        batch.append(item)
+        tokens += item_tokens
+    if batch:
+        yield batch
 
 # 임베딩 생성
 def get_embeddings(text_list):
@@ -61,26 +78,45 @@ def get_embeddings(text_list):
     )
     return [np.array(e.embedding, dtype=np.float32) for e in response.data]
 
-# FAISS 인덱스 구축
-def build_faiss_index(embeddings):
-    index = faiss.IndexFlatL2(EMBEDDING_DIM)
-    index.add(np.array(embeddings))
-    return index
+# 디스크에 저장된 FAISS 인덱스 열기 (없으면 새로 만듦)
+def open_vector_store():
+    store = VectorStore.load()
+    if store.dim is None:
+        store.dim = EMBEDDING_DIM
+    return store
 
-# Chunk를 Blob에 업로드
-def upload_chunks_to_blob(chunks, prefix="paper-processed"):
+# Chunk를 Blob에 업로드 (prefix: document_prefix 결과). 이전에 더 많았던 청크 Blob은 삭제
+def upload_chunks_to_blob(chunks, prefix):
+    names = set()
     for i, chunk in enumerate(chunks):
         blob_name = f"{prefix}-{i+1:03}.txt"
         container_client.upload_blob(name=blob_name, data=chunk.encode("utf-8"), overwrite=True)
+        names.add(blob_name)
+    for blob in container_client.list_blobs(name_starts_with=f"{prefix}-"):
+        stale = blob.name not in names and re.fullmatch(rf"{re.escape(prefix)}-\d+\.txt", blob.name)
+        if stale:
+            container_client.delete_blob(blob.name)
 
 # 전체 파이프라인
-def process_pdf_and_build_index(pdf_path):
+# 청크 임베딩을 영구 인덱스(vector_store.py)에 문서 단위로 추가합니다 (같은 문서를 다시 넣으면 교체).
+# store를 넘기지 않으면 인덱스를 열어 추가한 뒤 바로 저장합니다.
+# root: 문서 ID/Blob 접두사를 만들 입력 루트 (document_id 참고)
+def process_pdf_and_build_index(pdf_path, store=None, root=None):
     print(f"Processing: {os.path.basename(pdf_path)}")
-    text = extract_text_from_pdf(pdf_path)
-    chunks = split_text(text)
+    chunks = extract_chunks_from_pdf(pdf_path)
     if not chunks:
         raise ValueError("No valid chunks to process.")
-    embeddings = get_embeddings(chunks)
-    index = build_faiss_index(embeddings)
-    upload_chunks_to_blob(chunks)
-    return index, chunks
+    texts = [chunk["text"] for chunk in chunks]
+    embeddings = [
+        vector
+        for batch in batch_chunks(list(enumerate(chunks)))
+        for vector in get_embeddings([chunk["text"] for _, chunk in batch])
+    ]
+
+    save = store is None
+    store = store or open_vector_store()
+    store.add_document(document_id(pdf_path, root), chunks, np.array(embeddings))
+    if save:
+        store.save()
+    upload_chunks_to_blob(texts, document_prefix(pdf_path, root))
+    return store, texts
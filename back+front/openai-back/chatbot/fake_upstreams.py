@@ -0,0 +1,220 @@
+import json
+import time
+import zlib
+import random
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# 벤치마크용 가짜 업스트림 (Azure OpenAI / AI Search / SQL Azure Function)
+# 로컬 HTTP 서버 하나가 실제 SDK가 호출하는 경로를 흉내 내며, 경로별로 지연 시간을 주고 미리 정한 응답을 돌려줍니다.
+# - POST /openai/deployments/{배포}/chat/completions: 질문 분해(JSON) / 번역 / 최종 답변
+# - POST /openai/deployments/{배포}/embeddings: 입력 텍스트 해시로 만든 고정 벡터
+# - POST /indexes('{인덱스}')/docs/search.post.search: 문서 풀에서 top개
+# - POST /sql: 고정 SQL 결과 행
+# SDK 클라이언트는 환경 변수(upstream_env)로 이 서버를 가리키게 합니다.
+
+# 종류별 기본 지연 시간 (ms). 실제 값은 ±LATENCY_JITTER 비율로 흔들림
+DEFAULT_LATENCY_MS = {
+    "decompose": 900,
+    "translate": 400,
+    "final": 2500,
+    "embed": 80,
+    "search": 150,
+    "sql": 1500,
+}
+LATENCY_JITTER = 0.2
+EMBEDDING_DIM = 1536
+
+DEFAULT_SQL_ROWS = [
+    {"month": f"2017-{m:02d}", "sessions": 60000 + m * 1375, "transactions": 900 + m * 31}
+    for m in range(1, 13)
+]
+DEFAULT_DOCUMENTS = [
+    "RFM analysis segments customers by recency, frequency and monetary value to target retention campaigns.",
+    "Session duration and pages per session are leading indicators of purchase intent in e-commerce funnels.",
+    "Referral and organic search channels show higher conversion rates than display advertising in most studies.",
+    "Cart abandonment emails sent within one hour recover a larger share of revenue than next-day reminders.",
+    "Mobile sessions grow faster than desktop, but desktop sessions still convert at a higher rate.",
+    "Customer lifetime value models combine purchase frequency with churn probability to prioritize segments.",
+    "A/B tests on landing pages should run for full weekly cycles to avoid day-of-week bias.",
+    "Personalized product recommendations increase average order value when placed near the checkout step.",
+]
+DEFAULT_ANSWER = (
+    "2017년 월별 세션 수는 꾸준히 증가했으며, 특히 하반기에 거래 수가 함께 늘었습니다. "
+    "RFM 분석으로 최근 방문과 구매 빈도가 높은 고객군을 먼저 공략하는 전략을 권장합니다. "
+) * 4
+
+
+def _estimate_tokens(text):
+    return max(1, len(text) // 3)
+
+
+class FakeUpstreams:
+    """가짜 업스트림 서버
+
+    Args:
+        latency_ms (dict): 종류별 평균 지연 시간 (DEFAULT_LATENCY_MS를 덮어씀)
+        decompositions (dict): 질문 → {"db_query", "rag_query", "reasoning"} (없으면 질문을 db/rag 양쪽에 사용)
+        sql_rows (list[dict]), documents (list[str]), answer (str): 고정 응답
+    """
+
+    def __init__(self, latency_ms=None, decompositions=None, sql_rows=None, documents=None, answer=None,
+                 host="127.0.0.1", port=0):
+        self.latency_ms = {**DEFAULT_LATENCY_MS, **(latency_ms or {})}
+        self.decompositions = decompositions or {}
+        self.sql_rows = sql_rows if sql_rows is not None else DEFAULT_SQL_ROWS
+        self.documents = documents or DEFAULT_DOCUMENTS
+        self.answer = answer or DEFAULT_ANSWER
+        self.calls = {kind: 0 for kind in self.latency_ms}
+        self._calls_lock = threading.Lock()
+        self._server = ThreadingHTTPServer((host, port), self._handler_class())
+        self._server.daemon_threads = True
+        self._thread = None
+
+    @property
+    def url(self):
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self):
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    def upstream_env(self):
+        """views.py / search_index.py가 이 서버를 쓰도록 하는 환경 변수"""
+        return {
+            "AZURE_OPENAI_ENDPOINT": self.url,
+            "AZURE_OPENAI_API_KEY": "bench",
+            "AZURE_API_VERSION": "2024-10-21",
+            "AZURE_DEPLOYMENT_NAME": "bench-chat",
+            "AZURE_OPENAI_EMBEDDING_DEPLOYMENT": "bench-embedding",
+            "AZURE_SEARCH_ENDPOINT": self.url,
+            "AZURE_SEARCH_ADMIN_KEY": "bench",
+            "AZURE_SEARCH_INDEX_NAME": "bench-index",
+            "AZURE_FUNCTION_SQL_API_URL": f"{self.url}/sql",
+            # 활성 인덱스 포인터 Blob을 읽지 않도록 비움
+            "AZURE_STORAGE_CONNECTION_STRING": "",
+        }
+
+    def _wait(self, kind):
+        with self._calls_lock:
+            self.calls[kind] += 1
+        mean = self.latency_ms.get(kind, 0)
+        if mean > 0:
+            time.sleep(mean * random.uniform(1 - LATENCY_JITTER, 1 + LATENCY_JITTER) / 1000)
+
+    # 응답 본문 생성
+    def _chat_completion(self, body):
+        messages = body.get("messages", [])
+        system = messages[0]["content"] if messages else ""
+        user = messages[-1]["content"] if messages else ""
+        if "세 가지 항목" in system:
+            kind = "decompose"
+            decomposed = self.decompositions.get(user.strip()) or {"db_query": user, "rag_query": user, "reasoning": ""}
+            content = json.dumps(decomposed, ensure_ascii=False)
+        elif system.startswith("Translate"):
+            kind = "translate"
+            content = f"(en) {user}"
+        else:
+            kind = "final"
+            content = self.answer
+        self._wait(kind)
+        prompt_tokens = sum(_estimate_tokens(m.get("content", "")) for m in messages)
+        completion_tokens = _estimate_tokens(content)
+        return {
+            "id": f"chatcmpl-bench-{random.getrandbits(32):x}",
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": body.get("model", "bench-chat"),
+            "choices": [{
+                "index": 0,
+                "message": {"role": "assistant", "content": content},
+                "finish_reason": "stop",
+            }],
+            "usage": {
+                "prompt_tokens": prompt_tokens,
+                "completion_tokens": completion_tokens,
+                "total_tokens": prompt_tokens + completion_tokens,
+            },
+        }
+
+    def _embeddings(self, body):
+        self._wait("embed")
+        inputs = body.get("input", [])
+        if isinstance(inputs, str):
+            inputs = [inputs]
+        data = []
+        for index, text in enumerate(inputs):
+            rng = random.Random(zlib.crc32(str(text).encode("utf-8")))
+            data.append({"object": "embedding", "index": index,
+                         "embedding": [rng.uniform(-1, 1) for _ in range(EMBEDDING_DIM)]})
+        tokens = sum(_estimate_tokens(str(text)) for text in inputs)
+        return {"object": "list", "data": data, "model": body.get("model", "bench-embedding"),
+                "usage": {"prompt_tokens": tokens, "total_tokens": tokens}}
+
+    def _search(self, body):
+        self._wait("search")
+        top = int(body.get("top") or 5)
+        # 질문마다 다른 순서가 나오도록 검색어 해시로 섞음
+        rng = random.Random(zlib.crc32(str(body.get("search", "")).encode("utf-8")))
+        order = list(range(len(self.documents)))
+        rng.shuffle(order)
+        value = [
+            {"@search.score": round(1.0 / (rank + 1), 4), "id": f"bench-chunk-{i}", "chunk": self.documents[i]}
+            for rank, i in enumerate(order[:top])
+        ]
+        return {"value": value}
+
+    def _sql(self, body):
+        self._wait("sql")
+        return {"question": body.get("question", ""), "results": self.sql_rows}
+
+    def _handler_class(self):
+        upstreams = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def do_POST(self):
+                length = int(self.headers.get("Content-Length") or 0)
+                try:
+                    body = json.loads(self.rfile.read(length) or b"{}")
+                except ValueError:
+                    body = {}
+                path = self.path.split("?", 1)[0]
+                if path.endswith("/chat/completions"):
+                    payload = upstreams._chat_completion(body)
+                elif path.endswith("/embeddings"):
+                    payload = upstreams._embeddings(body)
+                elif path.endswith("/docs/search.post.search"):
+                    payload = upstreams._search(body)
+                elif path.rstrip("/").endswith("/sql"):
+                    payload = upstreams._sql(body)
+                else:
+                    self._send(404, {"error": f"unknown path {path}"})
+                    return
+                self._send(200, payload)
+
+            def _send(self, status_code, payload):
+                data = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+                self.send_response(status_code)
+                self.send_header("Content-Type", "application/json; charset=utf-8")
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def log_message(self, format, *args):
+                pass  # 요청마다 stderr에 찍지 않음
+
+        return Handler
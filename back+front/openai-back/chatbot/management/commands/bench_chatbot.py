@@ -0,0 +1,228 @@
+import os
+import sys
+import json
+import time
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from django.core.management.base import BaseCommand, CommandError
+
+from chatbot.fake_upstreams import DEFAULT_LATENCY_MS, FakeUpstreams
+
+# 챗봇 파이프라인 오프라인 벤치마크
+# 사용 예: python manage.py bench_chatbot --concurrency 8 --requests 200
+#          python manage.py bench_chatbot questions.jsonl --latency final=4000 --latency sql=800
+#          python manage.py bench_chatbot --serve-fakes            (가짜 업스트림만 띄우고 환경 변수 출력)
+#          python manage.py bench_chatbot --url http://127.0.0.1:8000  (위 환경 변수로 띄운 서버에 재생)
+# 1. 가짜 업스트림(fake_upstreams.py)을 띄우고 SDK/요청 환경 변수를 그쪽으로 바꾼 뒤
+# 2. 질문 목록을 목표 동시성으로 반복 재생하고 (기본: Django 테스트 클라이언트로 프로세스 안에서 호출)
+# 3. 엔드포인트별 처리량, 전체 지연 시간 백분위수, 단계별 p50/p95(tracing.py 집계)를 출력합니다.
+# 질문 파일은 한 줄에 질문 하나(.txt) 또는 {"question", "decomposed"(선택)} JSON(.jsonl)이며,
+# decomposed가 있으면 가짜 OpenAI가 그 분해 결과를 그대로 돌려줍니다.
+
+DEFAULT_QUESTIONS = os.path.normpath(os.path.join(os.path.dirname(__file__), "..", "..", "bench_questions.jsonl"))
+
+
+def load_questions(path):
+    """질문 목록과 질문별 분해 결과를 읽습니다."""
+    questions, decompositions = [], {}
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            line = line.strip()
+            if not line or line.startswith("#"):
+                continue
+            if line.startswith("{"):
+                row = json.loads(line)
+                questions.append(row["question"])
+                if row.get("decomposed"):
+                    decompositions[row["question"].strip()] = row["decomposed"]
+            else:
+                questions.append(line)
+    return questions, decompositions
+
+
+def percentiles(values):
+    values = sorted(values)
+    if not values:
+        return {}
+
+    def pick(percent):
+        return values[min(len(values) - 1, int(round((len(values) - 1) * percent / 100)))]
+
+    return {"p50_ms": round(pick(50), 1), "p95_ms": round(pick(95), 1),
+            "p99_ms": round(pick(99), 1), "max_ms": round(values[-1], 1)}
+
+
+class Command(BaseCommand):
+    help = "가짜 업스트림으로 챗봇 엔드포인트를 재생해 처리량과 단계별 지연 시간을 측정합니다."
+    # 시스템 체크가 URLconf(views.py)를 먼저 import하면 클라이언트가 실제 Azure 설정으로 만들어지므로 생략
+    requires_system_checks = []
+
+    def add_arguments(self, parser):
+        parser.add_argument("questions", nargs="?", default=DEFAULT_QUESTIONS, help="질문 파일 (.txt / .jsonl)")
+        parser.add_argument("--concurrency", type=int, default=4, help="동시에 보낼 요청 수")
+        parser.add_argument("--requests", type=int, default=None, help="엔드포인트별 요청 수 (기본: 질문 수, 질문을 반복 사용)")
+        parser.add_argument("--warmup", type=int, default=2, help="측정 전에 보낼 요청 수")
+        parser.add_argument("--endpoint", action="append", dest="endpoints",
+                            help="측정할 경로 (여러 번 지정 가능, 기본: /api/chat_smart/)")
+        parser.add_argument("--latency", action="append", default=[], metavar="KIND=MS",
+                            help=f"가짜 업스트림 평균 지연 시간 ({', '.join(DEFAULT_LATENCY_MS)})")
+        parser.add_argument("--url", help="실행 중인 서버에 HTTP로 재생 (서버는 --serve-fakes 환경 변수로 띄움)")
+        parser.add_argument("--serve-fakes", action="store_true", help="가짜 업스트림만 띄우고 대기")
+        parser.add_argument("--port", type=int, default=0, help="가짜 업스트림 포트 (기본: 빈 포트)")
+        parser.add_argument("--output", help="결과 JSON 저장 경로")
+
+    def handle(self, *args, **options):
+        questions, decompositions = load_questions(options["questions"])
+        if not questions:
+            raise CommandError("질문이 없습니다.")
+        latency = {}
+        for item in options["latency"]:
+            kind, _, value = item.partition("=")
+            if kind not in DEFAULT_LATENCY_MS or not value:
+                raise CommandError(f"--latency 형식 오류: {item} (종류: {', '.join(DEFAULT_LATENCY_MS)})")
+            latency[kind] = float(value)
+
+        fakes = FakeUpstreams(latency_ms=latency, decompositions=decompositions, port=options["port"]).start()
+        try:
+            if options["serve_fakes"]:
+                return self._serve(fakes)
+            endpoints = options["endpoints"] or ["/api/chat_smart/"]
+            total = options["requests"] or len(questions)
+            if options["url"]:
+                send, stage_snapshot = self._remote(options["url"])
+            else:
+                send, stage_snapshot = self._in_process(fakes)
+
+            results = {}
+            for endpoint in endpoints:
+                results[endpoint] = self._run(endpoint, questions, total, options, send, stage_snapshot)
+            results["_upstream_calls"] = dict(fakes.calls)
+            results["_latency_ms"] = fakes.latency_ms
+        finally:
+            fakes.stop()
+
+        if options["output"]:
+            with open(options["output"], "w", encoding="utf-8") as f:
+                json.dump(results, f, ensure_ascii=False, indent=2)
+            self.stdout.write(f"결과 저장: {options['output']}")
+
+    def _serve(self, fakes):
+        self.stdout.write(f"가짜 업스트림: {fakes.url} (Ctrl+C로 종료)")
+        self.stdout.write("서버를 다음 환경 변수로 실행한 뒤 --url로 재생하세요:")
+        for key, value in fakes.upstream_env().items():
+            self.stdout.write(f"  {key}={value}")
+        try:
+            while True:
+                time.sleep(3600)
+        except KeyboardInterrupt:
+            pass
+
+    def _in_process(self, fakes):
+        """환경 변수를 가짜 업스트림으로 바꾼 뒤 views.py를 import하고 Django 테스트 클라이언트로 호출"""
+        if "chatbot.views" in sys.modules:
+            raise CommandError("chatbot.views가 이미 로드되어 가짜 업스트림으로 바꿀 수 없습니다.")
+        os.environ.update(fakes.upstream_env())
+        # 벤치마크 중에는 요청별 추적 로그를 끄고(오류/느린 요청만), 대화 상태는 메모리 캐시에 저장
+        os.environ.setdefault("TRACE_SAMPLE_RATE", "0")
+        os.environ.setdefault("CHAT_SESSION_CACHE", "default")
+
+        from django.conf import settings
+        from django.test import Client
+        from chatbot import views  # noqa: F401  (환경 변수를 바꾼 뒤 클라이언트 초기화)
+        from chatbot.tracing import metrics
+
+        host = next((h for h in settings.ALLOWED_HOSTS if h != "*" and not h.startswith(".")), "localhost")
+        local = threading.local()
+
+        def send(endpoint, question):
+            if not hasattr(local, "client"):
+                local.client = Client(HTTP_HOST=host)
+            response = local.client.post(endpoint, {"question": question}, content_type="application/json")
+            return response.status_code
+
+        def stage_snapshot(reset=False):
+            if reset:
+                metrics.reset()
+                return None
+            return metrics.snapshot()
+
+        return send, stage_snapshot
+
+    def _remote(self, url):
+        """실행 중인 서버에 HTTP로 호출 (단계별 지연 시간은 /api/chat_metrics/에서 읽음)"""
+        import requests
+
+        url = url.rstrip("/")
+        session = requests.Session()
+
+        def send(endpoint, question):
+            return session.post(f"{url}{endpoint}", json={"question": question}, timeout=600).status_code
+
+        def stage_snapshot(reset=False):
+            if reset:
+                return None  # 서버 쪽 집계는 초기화할 수 없으므로 새로 띄운 서버에서 측정
+            try:
+                return session.get(f"{url}/api/chat_metrics/", timeout=10).json().get("stages")
+            except Exception as e:
+                self.stderr.write(f"단계별 지표를 읽지 못했습니다: {e}")
+                return None
+
+        return send, stage_snapshot
+
+    def _run(self, endpoint, questions, total, options, send, stage_snapshot):
+        concurrency = options["concurrency"]
+        for i in range(options["warmup"]):
+            send(endpoint, questions[i % len(questions)])
+        stage_snapshot(reset=True)
+
+        latencies, statuses = [], {}
+        lock = threading.Lock()
+
+        def one(i):
+            start = time.perf_counter()
+            try:
+                code = send(endpoint, questions[i % len(questions)])
+            except Exception as e:
+                code = type(e).__name__
+            elapsed = (time.perf_counter() - start) * 1000
+            with lock:
+                latencies.append(elapsed)
+                statuses[code] = statuses.get(code, 0) + 1
+
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=concurrency) as pool:
+            list(pool.map(one, range(total)))
+        wall = time.perf_counter() - start
+
+        errors = sum(count for code, count in statuses.items() if code != 200)
+        result = {
+            "requests": total,
+            "concurrency": concurrency,
+            "errors": errors,
+            "statuses": {str(code): count for code, count in statuses.items()},
+            "seconds": round(wall, 2),
+            "throughput_rps": round(total / wall, 2),
+            "latency": percentiles(latencies),
+            "stages": stage_snapshot() or {},
+        }
+        self._report(endpoint, result)
+        return result
+
+    def _report(self, endpoint, result):
+        latency = result["latency"]
+        self.stdout.write(
+            f"\n{endpoint}: {result['requests']} requests, concurrency {result['concurrency']}, "
+            f"{result['seconds']}s, {result['throughput_rps']} req/s, errors {result['errors']} {result['statuses']}"
+        )
+        self.stdout.write(
+            f"  end-to-end  p50 {latency['p50_ms']:>8} ms  p95 {latency['p95_ms']:>8} ms  "
+            f"p99 {latency['p99_ms']:>8} ms  max {latency['max_ms']:>8} ms"
+        )
+        # 단계별 지연 시간 (p95 큰 순)
+        stages = sorted(result["stages"].items(), key=lambda item: item[1]["p95_ms"], reverse=True)
+        for stage, values in stages:
+            self.stdout.write(
+                f"  {stage:<16} p50 {values['p50_ms']:>8} ms  p95 {values['p95_ms']:>8} ms  "
+                f"count {values['count']:>5}  errors {values['errors']}"
+            )
@@ -0,0 +1,159 @@
+import os
+
+try:
+    import tiktoken  # 채팅 모델과 같은 토크나이저
+except ImportError:  # tiktoken이 없으면 글자 수 기반 추정으로 동작
+    tiktoken = None
+
+# 최종 답변 프롬프트 토큰 예산
+# 질문 / SQL 결과 / 문서 검색 결과 / 추론 항목을 섹션별로 토큰 수를 세고, 우선순위에 따라 예산을 나눠
+# 넘치는 섹션은 행/문서 단위로 자른 뒤 생략된 양을 한 줄로 남깁니다.
+# 프롬프트 길이가 일정 범위 안에 머물러 최종 completion 지연 시간이 예측 가능해집니다.
+
+# 최종 프롬프트(user 메시지) 최대 토큰 수
+PROMPT_MAX_TOKENS = int(os.getenv("PROMPT_MAX_TOKENS", "6000"))
+PROMPT_TOKENIZER_ENCODING = os.getenv("PROMPT_TOKENIZER_ENCODING", "o200k_base")
+
+_encoder = None
+_encoder_failed = False
+
+
+def _get_encoder():
+    global _encoder, _encoder_failed
+    if _encoder is None and tiktoken is not None and not _encoder_failed:
+        try:
+            _encoder = tiktoken.get_encoding(PROMPT_TOKENIZER_ENCODING)
+        except Exception as e:
+            # 인코딩 파일을 받을 수 없는 환경(오프라인 등)이면 추정 방식으로 계속
+            _encoder_failed = True
+            print(f"WARNING: tiktoken encoding '{PROMPT_TOKENIZER_ENCODING}' unavailable, estimating tokens: {e}")
+    return _encoder
+
+
+def count_tokens(text):
+    """채팅 모델 기준 토큰 수 (tiktoken이 없으면 영문 약 4자, 그 외 1자 = 1토큰으로 추정)"""
+    if not text:
+        return 0
+    encoder = _get_encoder()
+    if encoder is not None:
+        return len(encoder.encode(text))
+    ascii_chars = sum(1 for ch in text if ord(ch) < 128)
+    return max(1, ascii_chars // 4 + (len(text) - ascii_chars))
+
+
+def truncate_tokens(text, max_tokens):
+    """앞에서부터 max_tokens까지 자릅니다."""
+    if max_tokens <= 0:
+        return ""
+    encoder = _get_encoder()
+    if encoder is not None:
+        tokens = encoder.encode(text)
+        return text if len(tokens) <= max_tokens else encoder.decode(tokens[:max_tokens])
+    # 추정 방식: 예산 안에 드는 가장 긴 앞부분을 이진 탐색
+    low, high = 0, len(text)
+    while low < high:
+        mid = (low + high + 1) // 2
+        if count_tokens(text[:mid]) <= max_tokens:
+            low = mid
+        else:
+            high = mid - 1
+    return text[:low]
+
+
+def fit_section(text, budget, separator="\n", unit="행"):
+    """separator 단위(행/문서)로 앞에서부터 예산만큼 남기고, 생략된 단위 수를 표시합니다.
+
+    첫 단위 하나도 들어가지 않으면 그 단위를 토큰 단위로 자릅니다.
+    """
+    if count_tokens(text) <= budget:
+        return text
+    parts = [p for p in text.split(separator) if p.strip()]
+    kept, used = [], 0
+    separator_tokens = count_tokens(separator)
+    for part in parts:
+        part_tokens = count_tokens(part) + separator_tokens
+        if used + part_tokens > budget:
+            break
+        kept.append(part)
+        used += part_tokens
+    if not kept and parts:
+        kept = [truncate_tokens(parts[0], max(0, budget - 16)) + " ...(생략)"]
+        omitted = len(parts) - 1
+    else:
+        omitted = len(parts) - len(kept)
+    if omitted:
+        kept.append(f"... (이하 {omitted}{unit} 생략)")
+    return separator.join(kept)
+
+
+def allocate(needs, priorities, minimums, total):
+    """섹션별 토큰 예산을 정합니다.
+
+    1. 우선순위(숫자가 작을수록 먼저) 순서로 min(필요량, 최소 보장량)을 배정하고 (예산이 모자라면 앞 순위만)
+    2. 남은 예산을 같은 순서로 필요한 만큼 채웁니다.
+    """
+    order = sorted(needs, key=lambda n: priorities.get(n, 99))
+    budgets = {name: 0 for name in needs}
+    remaining = max(0, total)
+    for name in order:
+        budgets[name] = min(remaining, needs[name], minimums.get(name, 0))
+        remaining -= budgets[name]
+    for name in order:
+        extra = min(remaining, needs[name] - budgets[name])
+        budgets[name] += extra
+        remaining -= extra
+    return budgets
+
+
+def assemble_prompt(sections, max_tokens=PROMPT_MAX_TOKENS):
+    """섹션 목록을 예산 안에서 하나의 프롬프트로 조립합니다.
+
+    고정 섹션만으로 예산을 넘으면 나머지 섹션은 모두 빼고, 가장 긴 고정 섹션을 넘친 만큼 자릅니다.
+    예산을 받지 못한 섹션(제목조차 들어가지 않는 섹션)은 프롬프트에서 뺍니다.
+
+    Args:
+        sections (list[dict]): 순서대로의 섹션
+            {"name", "title"(없으면 제목 없이), "text", "priority", "min_tokens",
+             "fixed"(True면 자르지 않음), "separator", "unit"}
+
+    Returns:
+        tuple: (프롬프트 문자열, {섹션 이름: {"tokens": 원래 토큰 수, "used": 사용 토큰 수}})
+    """
+    sections = [s for s in sections if s.get("text")]
+    headers = {s["name"]: (f"[{s['title']}]\n" if s.get("title") else "") for s in sections}
+    needs = {s["name"]: count_tokens(headers[s["name"]] + s["text"]) for s in sections}
+
+    available = max_tokens - 2 * len(sections)  # 섹션 사이 빈 줄
+    fixed_sections = [s for s in sections if s.get("fixed")]
+    fixed = sum(needs[s["name"]] for s in fixed_sections)
+    budgets = {s["name"]: needs[s["name"]] for s in fixed_sections}
+    if fixed > available and fixed_sections:
+        longest = max(fixed_sections, key=lambda s: needs[s["name"]])["name"]
+        budgets[longest] = max(0, needs[longest] - (fixed - available))
+    flexible = [s for s in sections if not s.get("fixed")]
+    budgets.update(allocate(
+        {s["name"]: needs[s["name"]] for s in flexible},
+        {s["name"]: s.get("priority", 99) for s in flexible},
+        {s["name"]: s.get("min_tokens", 0) for s in flexible},
+        available - fixed,
+    ))
+
+    parts, breakdown = [], {}
+    for s in sections:
+        name, header = s["name"], headers[s["name"]]
+        text = s["text"]
+        if needs[name] > budgets[name]:
+            text_budget = budgets[name] - count_tokens(header)
+            if text_budget <= 0:
+                breakdown[name] = {"tokens": needs[name], "used": 0}
+                continue
+            if s.get("fixed"):
+                text = truncate_tokens(text, max(0, text_budget - 8)) + " ...(생략)"
+            else:
+                text = fit_section(text, text_budget, separator=s.get("separator", "\n"), unit=s.get("unit", "행"))
+        part = header + text
+        parts.append(part)
+        breakdown[name] = {"tokens": needs[name], "used": count_tokens(part)}
+    prompt = "\n\n".join(parts)
+    breakdown["total"] = {"tokens": sum(needs.values()), "used": count_tokens(prompt)}
+    return prompt, breakdown
@@ -0,0 +1,156 @@
+import os
+import re
+import time
+import zlib
+
+import numpy as np
+
+try:
+    from sentence_transformers import CrossEncoder  # 선택: 로컬 cross-encoder 재순위
+except ImportError:  # 없으면 MMR까지만 수행
+    CrossEncoder = None
+
+# RAG 검색 결과 후처리 (재순위)
+# 1. 검색에서 후보를 넉넉히(RAG_CANDIDATES) 받아
+# 2. 같은 문단이 겹치는 중복/거의 같은 청크를 제거하고
+# 3. MMR(maximal marginal relevance)로 질문과 관련 있으면서 서로 다른 청크를 고르고
+# 4. cross-encoder 모델이 설정되어 있고 시간이 남으면 선택된 후보를 다시 점수화합니다.
+# 전체 처리 시간이 RAG_RERANK_BUDGET_MS를 넘으면 그 시점까지의 결과를 사용합니다.
+
+RAG_CANDIDATES = int(os.getenv("RAG_CANDIDATES", "20"))
+RAG_TOP_K = int(os.getenv("RAG_TOP_K", "3"))
+# MMR 관련성 가중치 (1이면 관련성만, 0이면 다양성만)
+RAG_MMR_LAMBDA = float(os.getenv("RAG_MMR_LAMBDA", "0.7"))
+# 이 코사인 유사도 이상이면 같은 내용으로 보고 제거
+RAG_DEDUP_THRESHOLD = float(os.getenv("RAG_DEDUP_THRESHOLD", "0.92"))
+RAG_RERANK_BUDGET_MS = float(os.getenv("RAG_RERANK_BUDGET_MS", "150"))
+# 예: cross-encoder/ms-marco-MiniLM-L-6-v2 (비워 두면 사용하지 않음)
+RAG_CROSS_ENCODER_MODEL = os.getenv("RAG_CROSS_ENCODER_MODEL", "")
+# cross-encoder는 남은 시간이 이보다 많을 때만 실행
+RAG_CROSS_ENCODER_MIN_MS = float(os.getenv("RAG_CROSS_ENCODER_MIN_MS", "50"))
+
+# 임베딩이 없을 때 쓰는 해시 단어 벡터 차원
+_HASH_DIM = 2048
+_WORD_RE = re.compile(r"\w+")
+
+_cross_encoder = None
+
+
+def _hashed_vectors(texts):
+    """단어/바이그램 해시 벡터 (임베딩이 없을 때 유사도 계산용)"""
+    vectors = np.zeros((len(texts), _HASH_DIM), dtype=np.float32)
+    for row, text in enumerate(texts):
+        words = _WORD_RE.findall(text.lower())
+        for gram in words + [f"{a} {b}" for a, b in zip(words, words[1:])]:
+            vectors[row, zlib.crc32(gram.encode("utf-8")) % _HASH_DIM] += 1.0
+    return vectors
+
+
+def _normalize(vectors):
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    return vectors / np.where(norms == 0, 1.0, norms)
+
+
+def _candidate_vectors(candidates, query_vector):
+    """후보 임베딩 행렬과 질문 벡터 (모든 후보에 임베딩이 있어야 사용, 아니면 해시 벡터)"""
+    embeddings = [c.get("embedding") for c in candidates]
+    if query_vector is not None and all(e is not None and len(e) == len(query_vector) for e in embeddings):
+        return _normalize(np.asarray(embeddings, dtype=np.float32)), np.asarray(query_vector, dtype=np.float32)
+    return _normalize(_hashed_vectors([c["text"] for c in candidates])), None
+
+
+def deduplicate(candidates, vectors, threshold=RAG_DEDUP_THRESHOLD):
+    """검색 순서대로 보면서 앞의 후보와 거의 같거나 포함되는 후보를 뺍니다. 남은 후보의 인덱스를 반환."""
+    kept = []
+    for i, candidate in enumerate(candidates):
+        text = " ".join(candidate["text"].split()).lower()
+        duplicate = False
+        for j in kept:
+            other = " ".join(candidates[j]["text"].split()).lower()
+            if text in other or other in text or float(vectors[i] @ vectors[j]) >= threshold:
+                duplicate = True
+                break
+        if not duplicate:
+            kept.append(i)
+    return kept
+
+
+def mmr(relevance, vectors, k, lambda_=RAG_MMR_LAMBDA):
+    """MMR 선택 순서 (인덱스 목록)
+
+    Args:
+        relevance (np.ndarray): 후보별 질문 관련성 (0~1)
+        vectors (np.ndarray): 정규화된 후보 벡터
+    """
+    similarity = vectors @ vectors.T
+    selected = []
+    remaining = list(range(len(relevance)))
+    while remaining and len(selected) < k:
+        if selected:
+            redundancy = similarity[np.ix_(remaining, selected)].max(axis=1)
+        else:
+            redundancy = np.zeros(len(remaining), dtype=np.float32)
+        scores = lambda_ * relevance[remaining] - (1 - lambda_) * redundancy
+        best = remaining[int(np.argmax(scores))]
+        selected.append(best)
+        remaining.remove(best)
+    return selected
+
+
+def _get_cross_encoder():
+    global _cross_encoder
+    if _cross_encoder is None and CrossEncoder is not None and RAG_CROSS_ENCODER_MODEL:
+        _cross_encoder = CrossEncoder(RAG_CROSS_ENCODER_MODEL)
+    return _cross_encoder
+
+
+def rerank(query, candidates, query_vector=None, k=RAG_TOP_K, budget_ms=RAG_RERANK_BUDGET_MS):
+    """검색 후보를 중복 제거 + MMR (+ cross-encoder) 순서로 k개 고릅니다.
+
+    Args:
+        query (str): 검색 질문
+        candidates (list[dict]): 검색 순서대로의 후보 {"text", "score"(선택), "embedding"(선택)}
+        query_vector (list[float] | None): 질문 임베딩 (후보 임베딩과 함께 있으면 관련성 계산에 사용)
+
+    Returns:
+        tuple: (선택된 후보 목록, 단계별 정보 dict)
+    """
+    start = time.perf_counter()
+    info = {"candidates": len(candidates), "stage": "search"}
+
+    def elapsed_ms():
+        return (time.perf_counter() - start) * 1000
+
+    candidates = [c for c in candidates if c.get("text")]
+    if len(candidates) <= 1:
+        return candidates[:k], info
+    fallback = candidates[:k]
+
+    vectors, query_vec = _candidate_vectors(candidates, query_vector)
+    kept = deduplicate(candidates, vectors)
+    info.update(deduplicated=len(candidates) - len(kept), stage="dedup")
+    if elapsed_ms() > budget_ms:
+        return [candidates[i] for i in kept[:k]] or fallback, info
+
+    kept_vectors = vectors[kept]
+    if query_vec is not None:
+        relevance = kept_vectors @ (query_vec / (np.linalg.norm(query_vec) or 1.0))
+    else:
+        # 검색 점수를 0~1로 맞추고, 점수가 없으면 검색 순서를 사용
+        scores = np.array([candidates[i].get("score") or 0.0 for i in kept], dtype=np.float32)
+        if scores.max() > scores.min():
+            relevance = (scores - scores.min()) / (scores.max() - scores.min())
+        else:
+            relevance = 1.0 - np.arange(len(kept), dtype=np.float32) / len(kept)
+    cross_encoder = _get_cross_encoder()
+    # cross-encoder를 쓸 때는 재점수화할 후보를 k의 2배까지 MMR로 고름
+    order = mmr(relevance, kept_vectors, k * 2 if cross_encoder else k)
+    selected = [candidates[kept[i]] for i in order]
+    info["stage"] = "mmr"
+
+    if cross_encoder is not None and budget_ms - elapsed_ms() >= RAG_CROSS_ENCODER_MIN_MS:
+        scores = cross_encoder.predict([(query, c["text"]) for c in selected])
+        selected = [c for _, c in sorted(zip(scores.tolist(), selected), key=lambda pair: pair[0], reverse=True)]
+        info["stage"] = "cross_encoder"
+    info["ms"] = round(elapsed_ms(), 1)
+    return selected[:k], info
@@ -1,9 +1,157 @@
-from embedding_utils import process_pdf_and_build_index
+import os
+import glob
+import time
+import argparse
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, as_completed
 
-pdf_files = [
-    "C:/Users/EL57/Desktop/논문/논문3_trimmed.pdf",
-    "C:/Users/EL57/Desktop/논문/논문4_trimmed.pdf"
-]
+import numpy as np
 
-for pdf_path in pdf_files:
-    process_pdf_and_build_index(pdf_path)
\ No newline at end of file
+from embedding_utils import (
+    batch_chunks, document_id, document_prefix, extract_document, get_embeddings, open_vector_store,
+    upload_chunks_to_blob
+)
+
+# PDF 일괄 임베딩 CLI
+# 사용 예: python run_embedding.py "C:/Users/EL57/Desktop/논문" --workers 4
+#          python run_embedding.py "papers/*_trimmed.pdf" --no-upload
+# 1. PDF 텍스트 추출/청크화(CPU 작업)는 프로세스 풀에서 문서별로 병렬 처리
+# 2. 끝난 문서의 청크를 모아 여러 문서를 섞어 임베딩 배치를 채우고, 배치 요청은 스레드에서 동시에 보냄
+# 3. 문서의 모든 청크 임베딩이 끝나면 FAISS 저장소에 추가하고, Blob에는 문서별 접두사로 업로드
+# 4. 마지막에 저장소를 한 번 저장하고 pages/sec, chunks/sec를 출력
+
+
+def pattern_root(pattern):
+    """glob 패턴에서 와일드카드가 나오기 전까지의 디렉터리 (문서 ID의 기준 경로)"""
+    parts = []
+    for part in os.path.normpath(pattern).split(os.sep):
+        if glob.has_magic(part):
+            break
+        parts.append(part)
+    else:
+        parts = parts[:-1]  # 와일드카드 없는 파일 경로면 그 파일의 디렉터리
+    return os.sep.join(parts) or "."
+
+
+def find_pdfs(patterns):
+    """디렉터리(하위 폴더 포함) 또는 glob 패턴에서 PDF를 찾습니다.
+
+    Returns:
+        list: (PDF 경로, 입력 루트) 목록. 입력 루트 기준 상대 경로가 문서 ID가 됩니다.
+    """
+    found = {}
+    for pattern in patterns:
+        if os.path.isdir(pattern):
+            for path in glob.glob(os.path.join(pattern, "**", "*.pdf"), recursive=True):
+                found.setdefault(path, pattern)
+        else:
+            root = pattern_root(pattern)
+            for path in glob.glob(pattern, recursive=True):
+                if path.lower().endswith(".pdf"):
+                    found.setdefault(path, root)
+    return sorted(found.items())
+
+
+def ingest(pdf_paths, workers=None, embed_concurrency=4, upload=True):
+    """pdf_paths: find_pdfs 결과 (PDF 경로, 입력 루트) 목록"""
+    roots = dict(pdf_paths)
+    store = open_vector_store()
+    start = time.perf_counter()
+    stats = {"documents": 0, "pages": 0, "chunks": 0, "failed": 0}
+
+    documents = {}  # PDF 경로 → {"chunks", "vectors", "remaining"}
+    pending = []    # 아직 임베딩 요청을 보내지 않은 ((PDF 경로, 청크 번호), 청크)
+    embed_futures = {}
+    upload_futures = []
+
+    with ProcessPoolExecutor(max_workers=workers) as process_pool, \
+         ThreadPoolExecutor(max_workers=embed_concurrency) as io_pool:
+
+        def submit_batches(final):
+            # 가득 찬 배치만 보내고 마지막(덜 찬) 배치는 다음 문서 청크와 합치도록 남김.
+            # 모든 문서 추출이 끝나면(final) 남은 청크를 모두 보냄
+            nonlocal pending
+            batches = list(batch_chunks(pending))
+            pending = batches.pop() if batches and not final else []
+            for batch in batches:
+                texts = [chunk["text"] for _, chunk in batch]
+                embed_futures[io_pool.submit(get_embeddings, texts)] = batch
+
+        def finish_document(pdf_path):
+            document = documents.pop(pdf_path)
+            store.add_document(document_id(pdf_path, roots[pdf_path]), document["chunks"], np.array(document["vectors"]))
+            if upload:
+                texts = [chunk["text"] for chunk in document["chunks"]]
+                upload_futures.append(io_pool.submit(upload_chunks_to_blob, texts, document_prefix(pdf_path, roots[pdf_path])))
+            stats["documents"] += 1
+            print(f"  완료: {document_id(pdf_path, roots[pdf_path])} ({len(document['chunks'])} chunks)")
+
+        # 1) 추출/청크화 (끝나는 문서부터 임베딩 배치에 넣음)
+        extract_futures = [process_pool.submit(extract_document, path) for path in roots]
+        for future in as_completed(extract_futures):
+            try:
+                pdf_path, page_count, chunks = future.result()
+            except Exception as e:
+                stats["failed"] += 1
+                print(f"  추출 실패: {e}")
+                continue
+            stats["pages"] += page_count
+            if not chunks:
+                print(f"  건너뜀 (청크 없음): {os.path.basename(pdf_path)}")
+                continue
+            stats["chunks"] += len(chunks)
+            documents[pdf_path] = {"chunks": chunks, "vectors": [None] * len(chunks), "remaining": len(chunks)}
+            pending.extend(((pdf_path, i), chunk) for i, chunk in enumerate(chunks))
+            submit_batches(final=False)
+        submit_batches(final=True)
+
+        # 2) 임베딩 결과를 문서별로 모음
+        for future in as_completed(embed_futures):
+            batch = embed_futures[future]
+            try:
+                vectors = future.result()
+            except Exception as e:
+                failed_paths = {pdf_path for (pdf_path, _), _ in batch if pdf_path in documents}
+                for pdf_path in failed_paths:
+                    documents.pop(pdf_path)
+                    stats["failed"] += 1
+                    print(f"  임베딩 실패: {os.path.basename(pdf_path)} ({e})")
+                continue
+            for ((pdf_path, i), _), vector in zip(batch, vectors):
+                document = documents.get(pdf_path)
+                if document is None:
+                    continue  # 다른 배치에서 이미 실패한 문서
+                document["vectors"][i] = vector
+                document["remaining"] -= 1
+                if document["remaining"] == 0:
+                    finish_document(pdf_path)
+
+        for future in as_completed(upload_futures):
+            try:
+                future.result()
+            except Exception as e:
+                print(f"  Blob 업로드 실패: {e}")
+
+    store.save()
+    elapsed = time.perf_counter() - start
+    print(
+        f"문서 {stats['documents']}개 완료, {stats['failed']}개 실패 / "
+        f"{stats['pages']} pages, {stats['chunks']} chunks, {elapsed:.1f}s "
+        f"({stats['pages'] / elapsed:.1f} pages/s, {stats['chunks'] / elapsed:.1f} chunks/s) / "
+        f"저장소 {len(store)} chunks"
+    )
+    return stats
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="PDF 일괄 청크화/임베딩 후 로컬 FAISS 저장소와 Blob에 저장")
+    parser.add_argument("paths", nargs="+", help="PDF 디렉터리 또는 glob 패턴")
+    parser.add_argument("--workers", type=int, default=None, help="추출/청크화 프로세스 수 (기본: CPU 수)")
+    parser.add_argument("--embed-concurrency", type=int, default=4, help="동시에 보낼 임베딩 요청 수")
+    parser.add_argument("--no-upload", action="store_true", help="Blob 업로드 생략")
+    args = parser.parse_args()
+
+    pdf_paths = find_pdfs(args.paths)
+    if not pdf_paths:
+        parser.error("PDF 파일을 찾지 못했습니다.")
+    print(f"PDF {len(pdf_paths)}개 처리 시작")
+    ingest(pdf_paths, workers=args.workers, embed_concurrency=args.embed_concurrency, upload=not args.no_upload)
@@ -0,0 +1,105 @@
+import os
+import json
+import time
+import threading
+from datetime import datetime, timezone
+
+from azure.core.credentials import AzureKeyCredential
+from azure.core.exceptions import ResourceNotFoundError
+from azure.search.documents import SearchClient
+from azure.storage.blob import BlobServiceClient
+
+# AI Search 활성 인덱스 포인터 (blue/green 재색인)
+# 챗봇이 질의할 인덱스 이름을 Blob에 JSON 하나로 저장합니다. 재색인은 새 버전 인덱스(예: paper-index-v20250101120000)를
+# 만들어 채우고 검증한 뒤 이 포인터만 바꿉니다. 챗봇은 SEARCH_INDEX_REFRESH_SECONDS마다 포인터를 다시 읽어
+# 새 인덱스로 넘어가고, 그동안의 질의는 이전 인덱스가 계속 처리하므로 중단이 없습니다.
+# 포인터가 아직 없으면(첫 재색인 전) AZURE_SEARCH_INDEX_NAME을 사용하고, 일시적인 읽기 오류면 마지막으로 알던 인덱스를 유지합니다.
+# Azure 설정은 .env를 먼저 읽는 스크립트/뷰에서도 맞는 값을 쓰도록 import 시점이 아니라 호출 시점에 읽습니다.
+
+ACTIVE_INDEX_BLOB = os.getenv("SEARCH_ACTIVE_INDEX_BLOB", "_search/active-index.json")
+SEARCH_INDEX_REFRESH_SECONDS = float(os.getenv("SEARCH_INDEX_REFRESH_SECONDS", "60"))
+
+_container_client = None
+
+
+def _container():
+    global _container_client
+    if _container_client is None:
+        connection_string = os.getenv("AZURE_STORAGE_CONNECTION_STRING")
+        container_name = os.getenv("BLOB_CONTAINER_NAME")
+        if not (connection_string and container_name):
+            return None
+        _container_client = BlobServiceClient.from_connection_string(connection_string).get_container_client(container_name)
+    return _container_client
+
+
+def base_index_name():
+    """버전이 붙지 않은 기본 인덱스 이름 (AZURE_SEARCH_INDEX_NAME)"""
+    return os.getenv("AZURE_SEARCH_INDEX_NAME")
+
+
+def read_active_index():
+    """포인터가 가리키는 인덱스 이름
+
+    포인터 Blob이 없거나 Blob 설정이 없으면 기본 인덱스 이름을, 그 밖의 오류로 읽지 못하면 None을 반환합니다
+    (전환 후 일시적인 오류로 오래된 기본 인덱스로 되돌아가지 않도록).
+    """
+    container = _container()
+    if container is None:
+        return base_index_name()
+    try:
+        pointer = json.loads(container.download_blob(ACTIVE_INDEX_BLOB).readall())
+    except ResourceNotFoundError:
+        return base_index_name()
+    except Exception as e:
+        print(f"WARNING: Failed to read active search index pointer: {e}")
+        return None
+    return pointer.get("index_name") or base_index_name()
+
+
+def write_active_index(index_name, previous=None):
+    """포인터를 새 인덱스로 바꿉니다 (Blob 덮어쓰기는 원자적이므로 읽는 쪽은 이전/새 값 중 하나만 봅니다)."""
+    container = _container()
+    if container is None:
+        raise RuntimeError("AZURE_STORAGE_CONNECTION_STRING / BLOB_CONTAINER_NAME이 없어 활성 인덱스를 바꿀 수 없습니다.")
+    pointer = {
+        "index_name": index_name,
+        "previous": previous,
+        "updated_at": datetime.now(timezone.utc).isoformat(),
+    }
+    container.upload_blob(name=ACTIVE_INDEX_BLOB, data=json.dumps(pointer).encode("utf-8"), overwrite=True)
+    return pointer
+
+
+class ActiveSearchClient:
+    """활성 인덱스를 따라가는 SearchClient 캐시
+
+    get()을 호출할 때 포인터를 읽은 지 SEARCH_INDEX_REFRESH_SECONDS가 지났으면 다시 읽고,
+    인덱스 이름이 바뀌었으면 새 SearchClient를 만듭니다.
+    """
+
+    def __init__(self, refresh_seconds=SEARCH_INDEX_REFRESH_SECONDS):
+        self.refresh_seconds = refresh_seconds
+        self.index_name = None
+        self._client = None
+        self._checked_at = 0.0
+        self._lock = threading.Lock()
+
+    def get(self):
+        if self._client is not None and time.monotonic() - self._checked_at < self.refresh_seconds:
+            return self._client
+        with self._lock:
+            if self._client is None or time.monotonic() - self._checked_at >= self.refresh_seconds:
+                # 포인터를 읽지 못하면 마지막 인덱스 유지 (처음이면 기본 인덱스)
+                index_name = read_active_index() or self.index_name or base_index_name()
+                if index_name != self.index_name or self._client is None:
+                    if self.index_name:
+                        print(f"DEBUG: Active search index changed: {self.index_name} -> {index_name}")
+                    self._client = SearchClient(
+                        endpoint=os.getenv("AZURE_SEARCH_ENDPOINT"),
+                        index_name=index_name,
+                        credential=AzureKeyCredential(os.getenv("AZURE_SEARCH_ADMIN_KEY"))
+                    )
+                    self.index_name = index_name
+                self._checked_at = time.monotonic()
+            return self._client
@@ -0,0 +1,115 @@
+import os
+import re
+import time
+import uuid
+
+from django.core.cache import caches
+
+from chatbot.prompt_budget import count_tokens, truncate_tokens
+
+# 대화 상태 저장소 (멀티턴)
+# 대화(session_id)마다 최근 턴의 질문 분해 결과, SQL 결과, 검색된 청크 ID/문서, 답변을 Django 캐시
+# (settings.CACHES["chat_sessions"], SQLite 테이블, TTL/최대 항목 수 제한)에 저장합니다.
+# - 후속 질문의 db_query / rag_query가 이전 턴과 같으면 SQL 호출과 문서 검색을 건너뛰고 이전 결과를 재사용
+# - 오래된 턴은 질문/답변 요약 한 줄로 접어 rolling summary에 넣고, summary도 토큰 상한을 넘으면 오래된 줄부터 버림
+# 캐시를 쓸 수 없으면(테이블 없음 등) 경고만 남기고 단발성 대화로 동작합니다.
+
+CHAT_SESSION_CACHE = os.getenv("CHAT_SESSION_CACHE", "chat_sessions")
+# 원문 그대로 남길 최근 턴 수
+CHAT_SESSION_MAX_TURNS = int(os.getenv("CHAT_SESSION_MAX_TURNS", "4"))
+# 턴마다 저장할 SQL 결과/문서/답변의 최대 토큰 수
+CHAT_SESSION_RESULT_TOKENS = int(os.getenv("CHAT_SESSION_RESULT_TOKENS", "1500"))
+# rolling summary 최대 토큰 수
+CHAT_SESSION_SUMMARY_TOKENS = int(os.getenv("CHAT_SESSION_SUMMARY_TOKENS", "600"))
+
+_SESSION_ID_RE = re.compile(r"^[0-9a-f]{32}$")
+
+
+def _normalize(text):
+    return " ".join((text or "").lower().split()).rstrip("?.!。 ")
+
+
+def _cache():
+    return caches[CHAT_SESSION_CACHE]
+
+
+def new_session_id():
+    return uuid.uuid4().hex
+
+
+def load_session(session_id):
+    """세션 상태를 읽습니다. session_id가 없거나 올바르지 않으면 새 세션을 만듭니다.
+
+    Returns:
+        tuple: (session_id, 상태 dict {"turns": [...], "summary": str})
+    """
+    if not session_id or not _SESSION_ID_RE.match(str(session_id)):
+        return new_session_id(), {"turns": [], "summary": ""}
+    try:
+        state = _cache().get(f"chat:{session_id}")
+    except Exception as e:
+        print(f"WARNING: Chat session cache unavailable, continuing without history: {e}")
+        state = None
+    return session_id, state or {"turns": [], "summary": ""}
+
+
+def save_session(session_id, state):
+    try:
+        _cache().set(f"chat:{session_id}", state)
+    except Exception as e:
+        print(f"WARNING: Failed to save chat session: {e}")
+
+
+def find_reusable(state, db_query="", rag_query=""):
+    """후속 질문이 이전 턴과 같은 데이터를 묻는지 찾습니다 (최근 턴부터).
+
+    Returns:
+        dict: {"sql_result": str | None, "documents": str | None, "chunk_ids": list}
+    """
+    reuse = {"sql_result": None, "documents": None, "chunk_ids": []}
+    db_key, rag_key = _normalize(db_query), _normalize(rag_query)
+    for turn in reversed(state["turns"]):
+        if db_key and reuse["sql_result"] is None and _normalize(turn.get("db_query")) == db_key and turn.get("sql_result"):
+            reuse["sql_result"] = turn["sql_result"]
+        if rag_key and reuse["documents"] is None and _normalize(turn.get("rag_query")) == rag_key and turn.get("documents"):
+            reuse["documents"] = turn["documents"]
+            reuse["chunk_ids"] = turn.get("chunk_ids", [])
+    return reuse
+
+
+def _summary_line(turn):
+    answer = " ".join(turn.get("answer", "").split())
+    return f"- Q: {turn['question']} / A: {truncate_tokens(answer, 80)}"
+
+
+def add_turn(state, question, decomposed, sql_result, documents, chunk_ids, answer):
+    """턴을 추가하고, 오래된 턴은 summary로 접습니다."""
+    state["turns"].append({
+        "question": question,
+        "db_query": decomposed.get("db_query", ""),
+        "rag_query": decomposed.get("rag_query", ""),
+        "reasoning": decomposed.get("reasoning", ""),
+        "sql_result": truncate_tokens(sql_result or "", CHAT_SESSION_RESULT_TOKENS),
+        "documents": truncate_tokens(documents or "", CHAT_SESSION_RESULT_TOKENS),
+        "chunk_ids": list(chunk_ids or []),
+        "answer": truncate_tokens(answer or "", CHAT_SESSION_RESULT_TOKENS),
+        "at": time.time(),
+    })
+    while len(state["turns"]) > CHAT_SESSION_MAX_TURNS:
+        old = state["turns"].pop(0)
+        lines = [line for line in state["summary"].split("\n") if line] + [_summary_line(old)]
+        while len(lines) > 1 and count_tokens("\n".join(lines)) > CHAT_SESSION_SUMMARY_TOKENS:
+            lines.pop(0)
+        state["summary"] = "\n".join(lines)
+    return state
+
+
+def history_text(state, recent_answer_tokens=200):
+    """프롬프트에 넣을 대화 기록 (summary + 최근 턴 질문/답변 앞부분)"""
+    parts = []
+    if state["summary"]:
+        parts.append(state["summary"])
+    for turn in state["turns"]:
+        answer = truncate_tokens(" ".join(turn.get("answer", "").split()), recent_answer_tokens)
+        parts.append(f"- Q: {turn['question']} / A: {answer}")
+    return "\n".join(parts)
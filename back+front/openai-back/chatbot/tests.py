@@ -1,3 +1,344 @@
-from django.test import TestCase
+import os
+import sys
+import unittest
 
-# Create your tests here.
+# 챗봇 모듈 단위 테스트 (Azure 호출 없이 순수 함수만 검사)
+# 실행: python -m unittest chatbot.tests  (openai-back 디렉터리에서)
+# embedding_utils.py는 스크립트용 모듈이라 chatbot 디렉터리를 import 경로에 추가하고,
+# 모듈 로드 시 읽는 환경 변수는 가짜 값으로 채웁니다 (실제 연결은 만들지 않음).
+CHATBOT_DIR = os.path.dirname(os.path.abspath(__file__))
+if CHATBOT_DIR not in sys.path:
+    sys.path.append(CHATBOT_DIR)
+
+for key, value in {
+    "AZURE_OPENAI_API_KEY": "test",
+    "AZURE_OPENAI_ENDPOINT": "https://example.openai.azure.com",
+    "AZURE_OPENAI_EMBEDDING_API_VERSION": "2024-10-21",
+    "EMBEDDING_DIMENSION": "8",
+    "AZURE_STORAGE_CONNECTION_STRING": (
+        "DefaultEndpointsProtocol=https;AccountName=test;AccountKey=dGVzdA==;EndpointSuffix=core.windows.net"
+    ),
+    "BLOB_CONTAINER_NAME": "test",
+}.items():
+    os.environ.setdefault(key, value)
+
+
+class DocumentPrefixTests(unittest.TestCase):
+    """document_id / document_prefix: 문서끼리 Blob 접두사와 FAISS 문서 ID가 겹치지 않는지"""
+
+    @classmethod
+    def setUpClass(cls):
+        import embedding_utils
+        cls.utils = embedding_utils
+
+    def test_non_ascii_names_are_valid_search_keys(self):
+        """한글 파일 이름도 AI Search 키 문자(영문/숫자/_/-/=)만으로 된 접두사가 되고 서로 다름"""
+        a = self.utils.document_prefix("papers/마케팅전략.pdf", "papers")
+        b = self.utils.document_prefix("papers/고객분석.pdf", "papers")
+        c = self.utils.document_prefix("papers/논문3_trimmed.pdf", "papers")
+        self.assertRegex(a, r"^paper-processed-[0-9a-f]{8}$")
+        self.assertRegex(c, r"^paper-processed-3-trimmed-[0-9a-f]{8}$")
+        self.assertNotEqual(a, b)
+        for prefix in (a, b, c):
+            self.assertRegex(f"{prefix}-001", r"^[A-Za-z0-9_\-=]+$")
+
+    def test_same_file_name_in_different_folders(self):
+        a = os.path.join("papers", "2023", "report.pdf")
+        b = os.path.join("papers", "2024", "report.pdf")
+        self.assertEqual(self.utils.document_id(a, "papers"), "2023/report.pdf")
+        self.assertNotEqual(self.utils.document_id(a, "papers"), self.utils.document_id(b, "papers"))
+        self.assertNotEqual(self.utils.document_prefix(a, "papers"), self.utils.document_prefix(b, "papers"))
+
+    def test_prefix_is_stable(self):
+        path = os.path.join("papers", "A B_c.pdf")
+        self.assertEqual(self.utils.document_prefix(path, "papers"), self.utils.document_prefix(path, "papers"))
+        self.assertRegex(self.utils.document_prefix(path, "papers"), r"^paper-processed-a-b-c-[0-9a-f]{8}$")
+
+    def test_symbols_only_name_falls_back(self):
+        self.assertRegex(self.utils.document_prefix("!!!.pdf"), r"^paper-processed-[0-9a-f]{8}$")
+
+
+class ActiveSearchClientTests(unittest.TestCase):
+    """활성 인덱스 포인터: 포인터가 없으면 기본 인덱스, 읽기 오류면 마지막 인덱스 유지"""
+
+    def setUp(self):
+        import json
+        from unittest import mock
+        from azure.core.exceptions import ResourceNotFoundError, ServiceRequestError
+        from chatbot import search_index
+
+        self.mode = "missing"
+
+        def download_blob(name):
+            if self.mode == "missing":
+                raise ResourceNotFoundError("not found")
+            if self.mode == "error":
+                raise ServiceRequestError("connection reset")
+            return mock.Mock(readall=lambda: json.dumps({"index_name": "paper-index-v2"}).encode())
+
+        patches = [
+            mock.patch.object(search_index, "_container", return_value=mock.Mock(download_blob=download_blob)),
+            mock.patch.dict(os.environ, {
+                "AZURE_SEARCH_INDEX_NAME": "paper-index",
+                "AZURE_SEARCH_ENDPOINT": "https://example.search.windows.net",
+                "AZURE_SEARCH_ADMIN_KEY": "test",
+            }),
+        ]
+        for patcher in patches:
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        self.search_index = search_index
+
+    def test_missing_pointer_uses_base_index(self):
+        self.assertEqual(self.search_index.read_active_index(), "paper-index")
+
+    def test_read_error_keeps_last_index(self):
+        client = self.search_index.ActiveSearchClient(refresh_seconds=0)
+        self.mode = "ok"
+        client.get()
+        self.assertEqual(client.index_name, "paper-index-v2")
+        self.mode = "error"
+        self.assertIsNone(self.search_index.read_active_index())
+        client.get()
+        self.assertEqual(client.index_name, "paper-index-v2")
+
+
+class ChunkerTests(unittest.TestCase):
+    """chunk_blocks: 섹션 경계, 문장 단위 겹침, 캡션/참고문헌 제외 (토큰 수는 단어 수로 고정)"""
+
+    def setUp(self):
+        from unittest import mock
+        from chatbot import chunker
+        patcher = mock.patch.object(chunker, "count_tokens", lambda text: len(text.split()))
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.chunker = chunker
+
+    def chunk(self, blocks, **kwargs):
+        kwargs = {"target_tokens": 9, "overlap_tokens": 4, "min_tokens": 3, **kwargs}
+        return list(self.chunker.chunk_blocks(blocks, **kwargs))
+
+    def test_sections_overlap_and_stop(self):
+        chunks = self.chunk([
+            (1, "1 Introduction", True),
+            (1, "One two three four. Five six seven eight. Nine ten eleven twelve.", False),
+            (2, "Figure 1: caption words here.", False),
+            (2, "Thirteen fourteen fifteen sixteen. Tail end.", False),
+            (2, "2 Method", True),
+            (3, "Alpha beta gamma delta. Epsilon zeta eta theta.", False),
+            (3, "References", True),
+            (4, "Ref one two three four five.", False),
+        ])
+        self.assertEqual([c["text"] for c in chunks], [
+            "One two three four. Five six seven eight.",
+            # 직전 청크의 마지막 문장이 겹쳐 들어감
+            "Five six seven eight. Nine ten eleven twelve.",
+            # 캡션은 빠지고, min_tokens보다 짧은 마지막 조각("Tail end.")은 직전 청크에 붙음
+            "Nine ten eleven twelve. Thirteen fourteen fifteen sixteen. Tail end.",
+            # 섹션이 바뀌면 겹침 없이 새로 시작, References 이후는 버림
+            "Alpha beta gamma delta. Epsilon zeta eta theta.",
+        ])
+        self.assertEqual([c["section"] for c in chunks], ["1 Introduction"] * 3 + ["2 Method"])
+        self.assertEqual((chunks[2]["page_start"], chunks[2]["page_end"]), (1, 2))
+        self.assertEqual(chunks[2]["tokens"], 10)
+
+    def test_long_sentence_is_split_by_words(self):
+        chunks = self.chunk([(1, " ".join(f"w{i}" for i in range(20)) + ".", False)], overlap_tokens=0)
+        self.assertEqual([c["tokens"] for c in chunks], [9, 11])
+        self.assertTrue(all(len(c["text"].split()) <= 11 for c in chunks))
+
+    def test_short_document_below_min_tokens(self):
+        self.assertEqual(self.chunk([(1, "Too short.", False)]), [])
+
+    def test_split_sentences_keeps_abbreviations(self):
+        self.assertEqual(
+            self.chunker.split_sentences("Models, e.g. RFM, help. See Fig. 2 for details! Done"),
+            ["Models, e.g. RFM, help.", "See Fig. 2 for details!", "Done"],
+        )
+
+
+class VectorStoreTests(unittest.TestCase):
+    """VectorStore: 추가/교체/삭제/압축과 저장 후 다시 열기 (인덱스 종류별)"""
+
+    def setUp(self):
+        import tempfile
+        import numpy as np
+        from chatbot.vector_store import VectorStore
+        self.np = np
+        self.VectorStore = VectorStore
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        rng = np.random.default_rng(0)
+        self.vectors = rng.normal(size=(40, 8)).astype(np.float32)
+
+    def make_store(self, index_type):
+        store = self.VectorStore(os.path.join(self.tmp.name, index_type), index_type=index_type)
+        store.add_document("a.pdf", [f"a{i}" for i in range(20)], self.vectors[:20])
+        store.add_document("b.pdf", [{"text": f"b{i}", "page_start": 1} for i in range(20)], self.vectors[20:])
+        return store
+
+    def top_text(self, store, row):
+        return store.search(self.vectors[row], k=1)[0][1]["text"]
+
+    def test_add_search_and_reload(self):
+        for index_type in ("flat", "hnsw", "ivf"):
+            with self.subTest(index_type=index_type):
+                store = self.make_store(index_type)
+                self.assertEqual(len(store), 40)
+                self.assertEqual(self.top_text(store, 3), "a3")
+                self.assertEqual(store.search(self.vectors[25], k=1)[0][1]["doc_id"], "b.pdf")
+                store.save()
+                loaded = self.VectorStore.load(store.path, mmap=True)
+                self.assertEqual(self.top_text(loaded, 25), "b5")
+                score, chunk, vector = loaded.search(self.vectors[25], k=1, with_vectors=True)[0]
+                expected = self.vectors[25] / self.np.linalg.norm(self.vectors[25])
+                self.assertTrue(self.np.allclose(vector, expected, atol=1e-5))
+                with self.assertRaises(RuntimeError):
+                    loaded.add_document("c.pdf", ["c0"], self.vectors[:1])
+
+    def test_replace_document(self):
+        store = self.make_store("flat")
+        store.add_document("a.pdf", ["new0", "new1"], self.vectors[:2])
+        self.assertEqual(len(store), 22)
+        self.assertEqual(len(store.documents["a.pdf"]), 2)
+        self.assertEqual(self.top_text(store, 1), "new1")
+        self.assertNotEqual(self.top_text(store, 5), "a5")
+
+    def test_delete_marks_hnsw_then_compacts(self):
+        from unittest import mock
+        from chatbot import vector_store
+        store = self.make_store("hnsw")
+        with mock.patch.object(vector_store, "VECTOR_COMPACT_RATIO", 0.9):
+            self.assertEqual(store.delete_document("a.pdf"), 20)
+        # HNSW는 바로 지울 수 없어 삭제 표시만 하고, 검색 결과에서는 빠짐
+        self.assertEqual(len(store.deleted), 20)
+        self.assertEqual(store.index.ntotal, 40)
+        self.assertEqual(store.search(self.vectors[3], k=1)[0][1]["doc_id"], "b.pdf")
+        store.compact()
+        self.assertEqual((store.index.ntotal, len(store.deleted)), (20, 0))
+        self.assertEqual(self.top_text(store, 30), "b10")
+        self.assertEqual(store.delete_document("missing.pdf"), 0)
+
+    def test_ivf_retrains_as_corpus_grows(self):
+        """IVF는 첫 문서로 작은 클러스터 수로 학습하고, 벡터 수가 늘면 전체 벡터로 다시 학습"""
+        store = self.VectorStore(os.path.join(self.tmp.name, "ivf-grow"), index_type="ivf")
+        vectors = self.np.random.default_rng(1).normal(size=(400, 8)).astype(self.np.float32)
+        store.add_document("first.pdf", [f"f{i}" for i in range(16)], vectors[:16])
+        self.assertEqual((store.index.nlist, store.trained_size), (4, 16))
+        store.add_document("second.pdf", [f"s{i}" for i in range(32)], vectors[16:48])
+        self.assertEqual(store.index.nlist, 4)  # 48 < 16 * 4
+        store.add_document("third.pdf", [f"t{i}" for i in range(352)], vectors[48:])
+        self.assertEqual((store.index.nlist, store.trained_size, store.index.ntotal), (20, 400, 400))
+        self.assertEqual(store.search(vectors[5], k=1)[0][1]["text"], "f5")
+        store.save()
+        self.assertEqual(self.VectorStore.load(store.path).trained_size, 400)
+
+    def test_delete_removes_from_flat(self):
+        store = self.make_store("flat")
+        store.delete_document("b.pdf")
+        self.assertEqual((store.index.ntotal, len(store.deleted), len(store)), (20, 0, 20))
+
+
+class RerankTests(unittest.TestCase):
+    """rerank: 중복 제거, MMR 다양성, 임베딩이 있는 후보(로컬 FAISS 포함)의 관련성 계산"""
+
+    def setUp(self):
+        import numpy as np
+        from chatbot import rerank
+        self.np = np
+        self.rerank = rerank
+
+    def test_deduplicate_drops_contained_and_near_identical(self):
+        np = self.np
+        candidates = [
+            {"text": "RFM analysis segments customers by recency."},
+            {"text": "  rfm ANALYSIS segments customers\nby recency."},
+            {"text": "RFM analysis segments customers by recency. It also uses frequency."},
+            {"text": "Cart abandonment emails recover revenue."},
+            {"text": "Mobile sessions grow faster than desktop."},
+        ]
+        vectors = np.array([[1, 0, 0], [1, 0, 0], [0.6, 0.8, 0], [0, 1, 0], [0.999, 0.04, 0]], dtype=np.float32)
+        vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+        # 1: 공백/대소문자만 다름, 2: 앞 후보를 포함, 4: 코사인 유사도가 임계값 이상
+        self.assertEqual(self.rerank.deduplicate(candidates, vectors, threshold=0.95), [0, 3])
+
+    def test_mmr_prefers_diverse_candidates(self):
+        np = self.np
+        vectors = np.array([[1, 0], [0.99, 0.14], [0, 1]], dtype=np.float32)
+        vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+        relevance = np.array([0.9, 0.88, 0.6], dtype=np.float32)
+        self.assertEqual(self.rerank.mmr(relevance, vectors, 2, lambda_=1.0), [0, 1])
+        self.assertEqual(self.rerank.mmr(relevance, vectors, 2, lambda_=0.5), [0, 2])
+
+    def test_rerank_uses_candidate_embeddings(self):
+        np = self.np
+        candidates = [
+            {"text": "first", "score": 0.9, "embedding": np.array([0.0, 1.0], dtype=np.float32)},
+            {"text": "second", "score": 0.5, "embedding": np.array([1.0, 0.0], dtype=np.float32)},
+        ]
+        selected, info = self.rerank.rerank("q", candidates, query_vector=[1.0, 0.0], k=1)
+        self.assertEqual([c["text"] for c in selected], ["second"])
+        self.assertEqual(info["stage"], "mmr")
+
+
+class PromptBudgetTests(unittest.TestCase):
+    """assemble_prompt: 예산 안 조립, 행/문서 단위 자르기, 고정 섹션만으로 예산을 넘는 경우 (tiktoken 없이 추정치 사용)"""
+
+    def setUp(self):
+        from unittest import mock
+        from chatbot import prompt_budget
+        patcher = mock.patch.object(prompt_budget, "_get_encoder", lambda: None)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.prompt_budget = prompt_budget
+
+    def sections(self, question="short question"):
+        return [
+            {"name": "question", "title": "Q", "text": question, "fixed": True},
+            {"name": "sql", "title": "SQL", "priority": 1, "min_tokens": 50,
+             "text": "\n".join("row %03d value xxxxxxxx" % i for i in range(200))},
+            {"name": "documents", "title": "Docs", "priority": 2, "min_tokens": 80,
+             "separator": "\n\n", "unit": "개 문서",
+             "text": "\n\n".join(f"doc {i} " + "lorem ipsum " * 20 for i in range(20))},
+            {"name": "instruction", "text": "Answer in Korean.", "fixed": True},
+        ]
+
+    def test_fits_unchanged(self):
+        sections = self.sections()
+        prompt, breakdown = self.prompt_budget.assemble_prompt(sections, max_tokens=5000)
+        self.assertTrue(prompt.startswith("[Q]\nshort question\n\n[SQL]\nrow 000"))
+        self.assertTrue(prompt.endswith("\n\nAnswer in Korean."))
+        self.assertNotIn("생략", prompt)
+        self.assertEqual(breakdown["total"]["used"], self.prompt_budget.count_tokens(prompt))
+
+    def test_truncates_by_priority(self):
+        prompt, breakdown = self.prompt_budget.assemble_prompt(self.sections(), max_tokens=300)
+        self.assertLessEqual(breakdown["total"]["used"], 300)
+        # 우선순위가 높은 SQL 결과가 문서보다 많이 남고, 잘린 섹션은 행/문서 단위로 생략 표시
+        self.assertGreater(breakdown["sql"]["used"], breakdown["documents"]["used"])
+        self.assertIn("행 생략)", prompt)
+        self.assertIn("... (이하 19개 문서 생략)", prompt)
+        self.assertIn("[Q]\nshort question", prompt)
+        self.assertTrue(prompt.endswith("Answer in Korean."))
+
+    def test_fixed_sections_over_budget(self):
+        """고정 섹션만으로 예산을 넘으면 나머지 섹션은 빠지고 긴 고정 섹션만 잘림"""
+        prompt, breakdown = self.prompt_budget.assemble_prompt(self.sections("질문" * 400), max_tokens=100)
+        self.assertLessEqual(breakdown["total"]["used"], 100)
+        self.assertEqual(breakdown["sql"]["used"], 0)
+        self.assertEqual(breakdown["documents"]["used"], 0)
+        self.assertNotIn("[SQL]", prompt)
+        self.assertNotIn("[Docs]", prompt)
+        self.assertIn(" ...(생략)", prompt)
+        self.assertTrue(prompt.endswith("\n\nAnswer in Korean."))
+
+    def test_allocate_minimums_within_total(self):
+        """최소 보장량도 전체 예산 안에서 우선순위 순서로만 배정"""
+        budgets = self.prompt_budget.allocate(
+            {"a": 500, "b": 500}, {"a": 2, "b": 1}, {"a": 100, "b": 100}, 150)
+        self.assertEqual(budgets, {"a": 50, "b": 100})
+        self.assertEqual(self.prompt_budget.allocate({"a": 500}, {}, {"a": 100}, -20), {"a": 0})
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,173 @@
+import os
+import json
+import time
+import uuid
+import random
+import logging
+import threading
+from collections import defaultdict, deque
+from contextlib import contextmanager
+
+# 요청 단위 추적 (SmartChatbotAPIView)
+# 요청마다 Trace를 만들고 단계(decompose, sql, translate, embed, search_*, rerank, final_completion ...)를
+# span으로 감싸 소요 시간, 토큰 수, 결과 크기 등의 속성을 기록합니다.
+# - 모든 요청의 단계별 소요 시간은 프로세스 안의 최근 TRACE_WINDOW개 구간에 모아 p50/p95를 계산 (/api/chat_metrics/)
+# - 로그는 TRACE_SAMPLE_RATE 비율로만 남기되, 오류가 난 요청과 TRACE_SLOW_MS보다 느린 요청은 항상 남김
+# - 로그 한 줄 = 요청 하나의 JSON (trace_id, 전체 시간, span 목록, 샘플링된 요청이면 디버그 메시지)
+
+TRACE_SAMPLE_RATE = float(os.getenv("TRACE_SAMPLE_RATE", "0.1"))
+TRACE_SLOW_MS = float(os.getenv("TRACE_SLOW_MS", "15000"))
+# 단계별로 보관할 최근 측정값 수
+TRACE_WINDOW = int(os.getenv("TRACE_WINDOW", "1000"))
+# 디버그 메시지 하나의 최대 길이 (문서/SQL 결과 전문이 로그에 남지 않도록)
+TRACE_MESSAGE_CHARS = int(os.getenv("TRACE_MESSAGE_CHARS", "300"))
+
+logger = logging.getLogger("chatbot.trace")
+
+
+class StageMetrics:
+    """단계별 최근 소요 시간(ms) 구간과 누적 횟수/오류 수"""
+
+    def __init__(self, window=TRACE_WINDOW):
+        self._durations = defaultdict(lambda: deque(maxlen=window))
+        self._counts = defaultdict(int)
+        self._errors = defaultdict(int)
+        self._lock = threading.Lock()
+
+    def record(self, stage, duration_ms, error=False):
+        with self._lock:
+            self._durations[stage].append(duration_ms)
+            self._counts[stage] += 1
+            if error:
+                self._errors[stage] += 1
+
+    def snapshot(self):
+        """{단계: {"count", "errors", "window", "p50_ms", "p95_ms", "max_ms"}}"""
+        with self._lock:
+            durations = {stage: sorted(values) for stage, values in self._durations.items()}
+            counts, errors = dict(self._counts), dict(self._errors)
+        result = {}
+        for stage, values in durations.items():
+            if not values:
+                continue
+            result[stage] = {
+                "count": counts[stage],
+                "errors": errors.get(stage, 0),
+                "window": len(values),
+                "p50_ms": round(_percentile(values, 50), 1),
+                "p95_ms": round(_percentile(values, 95), 1),
+                "max_ms": round(values[-1], 1),
+            }
+        return result
+
+    def reset(self):
+        with self._lock:
+            self._durations.clear()
+            self._counts.clear()
+            self._errors.clear()
+
+
+def _percentile(sorted_values, percent):
+    """정렬된 값의 선형 보간 백분위수"""
+    if len(sorted_values) == 1:
+        return sorted_values[0]
+    position = (len(sorted_values) - 1) * percent / 100
+    lower = int(position)
+    upper = min(lower + 1, len(sorted_values) - 1)
+    return sorted_values[lower] + (sorted_values[upper] - sorted_values[lower]) * (position - lower)
+
+
+metrics = StageMetrics()
+
+
+class Trace:
+    """요청 하나의 span 목록
+
+    사용 예:
+        trace = Trace("chat_smart")
+        with trace.span("sql") as span:
+            ...
+            span["rows"] = len(rows)
+        trace.finish()
+    """
+
+    def __init__(self, name, sample_rate=TRACE_SAMPLE_RATE):
+        self.name = name
+        self.trace_id = uuid.uuid4().hex[:16]
+        self.sampled = random.random() < sample_rate
+        self.attributes = {}
+        self.spans = []
+        self.messages = []
+        self.error = None
+        self._start = time.perf_counter()
+
+    @contextmanager
+    def span(self, stage, **attributes):
+        """단계 하나를 측정합니다. yield되는 dict에 속성을 추가할 수 있습니다.
+
+        예외는 span에 기록한 뒤 그대로 다시 발생시킵니다.
+        """
+        span = dict(attributes)
+        start = time.perf_counter()
+        try:
+            yield span
+        except Exception as e:
+            span["error"] = f"{type(e).__name__}: {e}"[:TRACE_MESSAGE_CHARS]
+            raise
+        finally:
+            span["stage"] = stage
+            span["start_ms"] = round((start - self._start) * 1000, 1)
+            span["ms"] = round((time.perf_counter() - start) * 1000, 1)
+            self.spans.append(span)
+
+    def set(self, **attributes):
+        """요청 단위 속성 (세션 ID, 질문 유형 등)"""
+        self.attributes.update(attributes)
+
+    def log(self, message):
+        """디버그 메시지. 샘플링된 요청에서만 모으며 길이를 잘라 저장합니다."""
+        if self.sampled:
+            message = str(message)
+            if len(message) > TRACE_MESSAGE_CHARS:
+                message = message[:TRACE_MESSAGE_CHARS] + f"...(+{len(message) - TRACE_MESSAGE_CHARS})"
+            self.messages.append(message)
+
+    def fail(self, error):
+        self.error = f"{type(error).__name__}: {error}"[:TRACE_MESSAGE_CHARS]
+
+    def finish(self, status_code=200):
+        """단계별 시간을 집계에 넣고, 샘플링/오류/느린 요청이면 로그를 한 줄 남깁니다."""
+        total_ms = round((time.perf_counter() - self._start) * 1000, 1)
+        error = self.error is not None or status_code >= 500 or any("error" in span for span in self.spans)
+        for span in self.spans:
+            metrics.record(span["stage"], span["ms"], error="error" in span)
+        metrics.record("total", total_ms, error=error)
+
+        if self.sampled or error or total_ms >= TRACE_SLOW_MS:
+            record = {
+                "trace_id": self.trace_id,
+                "name": self.name,
+                "status": status_code,
+                "ms": total_ms,
+                "sampled": self.sampled,
+                **self.attributes,
+                "spans": self.spans,
+            }
+            if self.error:
+                record["error"] = self.error
+            if self.messages:
+                record["messages"] = self.messages
+            log = logger.warning if error or total_ms >= TRACE_SLOW_MS else logger.info
+            log(json.dumps(record, ensure_ascii=False, default=str))
+        return total_ms
+
+
+def record_usage(span, response):
+    """OpenAI 응답의 토큰 사용량을 span에 기록합니다."""
+    usage = getattr(response, "usage", None)
+    if usage is None:
+        return
+    for field in ("prompt_tokens", "completion_tokens", "total_tokens"):
+        value = getattr(usage, field, None)
+        if value is not None:
+            span[field] = value
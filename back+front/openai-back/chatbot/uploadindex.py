@@ -1,4 +1,8 @@
 import os
+import time
+import argparse
+from datetime import datetime, timezone
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, as_completed, wait
 from dotenv import load_dotenv
 from azure.storage.blob import BlobServiceClient
 from azure.core.credentials import AzureKeyCredential
@@ -8,9 +12,11 @@ from azure.search.documents.indexes.models import (
     SearchIndex, SimpleField, SearchableField
 )
 
-# 환경변수 로드
+# 환경변수 로드 (search_index보다 먼저)
 load_dotenv()
 
+from search_index import read_active_index, write_active_index
+
 # 설정값 로드
 AZURE_SEARCH_ENDPOINT = os.getenv("AZURE_SEARCH_ENDPOINT")
 AZURE_SEARCH_ADMIN_KEY = os.getenv("AZURE_SEARCH_ADMIN_KEY")
@@ -30,8 +36,8 @@ search_client = SearchClient(endpoint=AZURE_SEARCH_ENDPOINT,
                              credential=search_credential)
 
 # 인덱스 생성 함수
-def create_index():
-    print("Creating index if not exists...")
+def create_index(index_name=AZURE_SEARCH_INDEX_NAME):
+    print(f"Creating index {index_name} if not exists...")
 
     fields = [
         SimpleField(name="id", type="Edm.String", key=True),
@@ -39,50 +45,167 @@ def create_index():
         SimpleField(name="chunk_id", type="Edm.Int32"),
     ]
 
-    index = SearchIndex(name=AZURE_SEARCH_INDEX_NAME, fields=fields)
+    index = SearchIndex(name=index_name, fields=fields)
 
     try:
-        search_index_client.get_index(AZURE_SEARCH_INDEX_NAME)
+        search_index_client.get_index(index_name)
         print("Index already exists.")
     except:
         search_index_client.create_index(index)
         print("Index created.")
 
-# Blob에서 chunk 읽기
-def load_chunks_from_blob():
+# Blob 다운로드 동시 요청 수 / AI Search 배치 크기 / 동시에 보낼 배치 수
+BLOB_DOWNLOAD_CONCURRENCY = int(os.getenv("BLOB_DOWNLOAD_CONCURRENCY", "16"))
+SEARCH_UPLOAD_BATCH_SIZE = int(os.getenv("SEARCH_UPLOAD_BATCH_SIZE", "100"))
+SEARCH_UPLOAD_CONCURRENCY = int(os.getenv("SEARCH_UPLOAD_CONCURRENCY", "4"))
+# 재색인 검증 시 문서 수가 맞을 때까지 기다릴 최대 시간(초)
+SEARCH_VALIDATE_TIMEOUT = float(os.getenv("SEARCH_VALIDATE_TIMEOUT", "120"))
+
+# Blob 하나를 문서로 변환
+def download_chunk(blob_name):
+    content = container_client.download_blob(blob_name).readall().decode("utf-8")
+    chunk_id = int(blob_name.split("-")[-1].replace(".txt", ""))
+    return {
+        "id": blob_name.replace(".txt", ""),
+        "content": content,
+        "chunk_id": chunk_id
+    }
+
+# Blob에서 chunk 읽기 (제너레이터)
+# 목록 조회 결과를 받는 대로 다운로드를 스레드 풀에 넣고, 끝난 문서부터 내보냅니다.
+# 동시에 진행 중인 다운로드는 BLOB_DOWNLOAD_CONCURRENCY의 2배까지만 두어 메모리 사용을 제한합니다.
+def iter_chunks_from_blob(concurrency=BLOB_DOWNLOAD_CONCURRENCY):
     print("Loading chunks from blob storage...")
-    documents = []
-    blobs = container_client.list_blobs(name_starts_with=BLOB_PREFIX)
-    for blob in blobs:
-        blob_client = container_client.get_blob_client(blob)
-        content = blob_client.download_blob().readall().decode("utf-8")
-        chunk_id = int(blob.name.split("-")[-1].replace(".txt", ""))
-        documents.append({
-            "id": blob.name.replace(".txt", ""),
-            "content": content,
-            "chunk_id": chunk_id
-        })
-    print(f"Loaded {len(documents)} documents.")
-    return documents
-
-# 인덱스에 업로드
-def upload_to_search(documents):
+    in_flight = set()
+    count = 0
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        for blob in container_client.list_blobs(name_starts_with=BLOB_PREFIX):
+            if not blob.name.endswith(".txt"):
+                continue
+            in_flight.add(pool.submit(download_chunk, blob.name))
+            if len(in_flight) >= concurrency * 2:
+                done, in_flight = wait(in_flight, return_when=FIRST_COMPLETED)
+                for future in done:
+                    count += 1
+                    yield future.result()
+        for future in as_completed(in_flight):
+            count += 1
+            yield future.result()
+    print(f"Loaded {count} documents.")
+
+# Blob에서 chunk 읽기 (목록으로 반환)
+def load_chunks_from_blob():
+    return list(iter_chunks_from_blob())
+
+# 인덱스에 업로드 (documents는 목록 또는 제너레이터 - 배치가 찰 때마다 바로 업로드 시작)
+def upload_to_search(documents, client=None):
+    client = client or search_client
     print("Uploading to Azure AI Search...")
-    batch_size = 100
-    for i in range(0, len(documents), batch_size):
-        batch = documents[i:i+batch_size]
-        result = search_client.upload_documents(documents=batch)
-        
-        # 결과 출력 추가
-        for r in result:
-            if not r.succeeded:
-                print(f"Failed to upload: {r.key}, Error: {r.error_message}")
-            else:
-                print(f"Uploaded: {r.key}")
+    start = time.perf_counter()
+    succeeded, failed = 0, 0
+
+    def upload_batch(batch):
+        return [(r.key, r.succeeded, r.error_message) for r in client.upload_documents(documents=batch)]
+
+    def collect(futures):
+        nonlocal succeeded, failed
+        for future in futures:
+            for key, ok, error_message in future.result():
+                if ok:
+                    succeeded += 1
+                else:
+                    failed += 1
+                    print(f"Failed to upload: {key}, Error: {error_message}")
+
+    in_flight = set()
+    batch = []
+    with ThreadPoolExecutor(max_workers=SEARCH_UPLOAD_CONCURRENCY) as pool:
+        for document in documents:
+            batch.append(document)
+            if len(batch) < SEARCH_UPLOAD_BATCH_SIZE:
+                continue
+            in_flight.add(pool.submit(upload_batch, batch))
+            batch = []
+            if len(in_flight) >= SEARCH_UPLOAD_CONCURRENCY * 2:
+                done, in_flight = wait(in_flight, return_when=FIRST_COMPLETED)
+                collect(done)
+        if batch:
+            in_flight.add(pool.submit(upload_batch, batch))
+        collect(as_completed(in_flight))
+
+    elapsed = time.perf_counter() - start
+    print(f"Uploaded {succeeded} documents, {failed} failed ({elapsed:.1f}s, {succeeded / elapsed if elapsed else 0:.0f} docs/s)")
+    return succeeded, failed
+
+# 새 버전 인덱스 검증: 문서 수가 업로드한 수에 도달하고, 샘플 질의마다 결과가 있어야 통과
+def validate_index(client, expected_count, sample_queries=()):
+    deadline = time.monotonic() + SEARCH_VALIDATE_TIMEOUT
+    count = client.get_document_count()
+    while count < expected_count and time.monotonic() < deadline:
+        time.sleep(5)  # 업로드 직후에는 색인이 끝나지 않아 문서 수가 적게 나옴
+        count = client.get_document_count()
+    if count < expected_count:
+        raise RuntimeError(f"문서 수 불일치: 업로드 {expected_count}개, 인덱스 {count}개")
+    for query in sample_queries:
+        if not list(client.search(search_text=query, top=1)):
+            raise RuntimeError(f"샘플 질의 결과 없음: {query}")
+    print(f"Validated: {count} documents, {len(sample_queries)} sample queries")
+
+# 활성 인덱스 이름 (포인터를 읽지 못하면 엉뚱한 인덱스에 쓰지 않도록 중단)
+def require_active_index():
+    active = read_active_index()
+    if not active:
+        raise RuntimeError("활성 인덱스 포인터를 읽지 못했거나 AZURE_SEARCH_INDEX_NAME이 없습니다.")
+    return active
+
+# 오래된 버전 인덱스 삭제 (최신 keep개와 활성/직전 인덱스는 남김)
+def cleanup_old_indexes(keep, protected):
+    versions = sorted(
+        (name for name in search_index_client.list_index_names() if name.startswith(f"{AZURE_SEARCH_INDEX_NAME}-v")),
+        reverse=True
+    )
+    for name in versions[keep:]:
+        if name not in protected:
+            search_index_client.delete_index(name)
+            print(f"Deleted old index: {name}")
+
+# Blue/green 재색인: 새 버전 인덱스를 만들어 채우고 검증한 뒤 활성 인덱스 포인터를 바꿈
+# 챗봇은 포인터가 바뀌기 전까지 기존 인덱스를 계속 사용하므로 질의 중단이 없습니다.
+def reindex(sample_queries=(), keep=2):
+    active = require_active_index()
+    new_name = f"{AZURE_SEARCH_INDEX_NAME}-v{datetime.now(timezone.utc):%Y%m%d%H%M%S}"
+    create_index(new_name)
+    client = SearchClient(endpoint=AZURE_SEARCH_ENDPOINT, index_name=new_name, credential=search_credential)
+    try:
+        succeeded, failed = upload_to_search(iter_chunks_from_blob(), client)
+        if failed or not succeeded:
+            raise RuntimeError(f"업로드 실패 {failed}개 / 성공 {succeeded}개")
+        validate_index(client, succeeded, sample_queries)
+    except Exception:
+        print(f"Reindex failed, keeping {active} active and deleting {new_name}")
+        search_index_client.delete_index(new_name)
+        raise
+    write_active_index(new_name, previous=active)
+    print(f"Active index switched: {active} -> {new_name}")
+    cleanup_old_indexes(keep, protected={new_name, active})
+    return new_name
 
 # 실행 흐름
+# python uploadindex.py                      : 현재 활성 인덱스에 업로드
+# python uploadindex.py --reindex -q "RFM"   : 새 버전 인덱스를 만들어 검증 후 전환
 if __name__ == "__main__":
-    create_index()
-    docs = load_chunks_from_blob()
-    upload_to_search(docs)
+    parser = argparse.ArgumentParser(description="Blob의 청크를 Azure AI Search에 업로드")
+    parser.add_argument("--reindex", action="store_true", help="새 버전 인덱스를 만들어 검증 후 활성 인덱스로 전환")
+    parser.add_argument("-q", "--sample-query", action="append", default=[], help="전환 전 확인할 샘플 질의 (여러 번 지정 가능)")
+    parser.add_argument("--keep", type=int, default=2, help="남겨 둘 버전 인덱스 수")
+    args = parser.parse_args()
+
+    if args.reindex:
+        reindex(args.sample_query, keep=args.keep)
+    else:
+        active = require_active_index()
+        create_index(active)
+        client = SearchClient(endpoint=AZURE_SEARCH_ENDPOINT, index_name=active, credential=search_credential)
+        # 다운로드와 업로드를 겹쳐서 진행
+        upload_to_search(iter_chunks_from_blob(), client)
     print("All documents uploaded to Azure AI Search")
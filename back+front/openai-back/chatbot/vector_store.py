@@ -0,0 +1,279 @@
+import os
+import json
+import math
+import threading
+
+import numpy as np
+import faiss
+
+# 디스크에 저장되는 FAISS 벡터 인덱스 관리자
+# 문서(PDF)마다 임베딩을 하나의 인덱스에 추가하고, 벡터 ID → 청크(텍스트/섹션/페이지) 매핑을 옆에 JSON으로 저장합니다.
+# 벡터는 L2 정규화 후 내적(= 코사인 유사도)으로 검색합니다.
+# 인덱스 종류: flat(정확, 작은 말뭉치), ivf(클러스터 일부만 탐색), hnsw(그래프 탐색, 기본값)
+# 챗봇은 인덱스 파일을 memory-map으로 열어 시작 시간과 메모리 사용을 줄입니다.
+
+VECTOR_STORE_DIR = os.getenv("VECTOR_STORE_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "vector_store"))
+VECTOR_INDEX_TYPE = os.getenv("VECTOR_INDEX_TYPE", "hnsw")
+# HNSW: 노드당 이웃 수 / 구축 시 탐색 폭 / 검색 시 탐색 폭
+VECTOR_HNSW_M = int(os.getenv("VECTOR_HNSW_M", "32"))
+VECTOR_HNSW_EF_CONSTRUCTION = int(os.getenv("VECTOR_HNSW_EF_CONSTRUCTION", "200"))
+VECTOR_HNSW_EF_SEARCH = int(os.getenv("VECTOR_HNSW_EF_SEARCH", "64"))
+# IVF: 최대 클러스터 수 (학습할 때 벡터 수의 제곱근으로 줄어듦) / 검색할 클러스터 수
+VECTOR_IVF_NLIST = int(os.getenv("VECTOR_IVF_NLIST", "1024"))
+VECTOR_IVF_NPROBE = int(os.getenv("VECTOR_IVF_NPROBE", "16"))
+# IVF: 벡터 수가 마지막 학습 때의 이 배수 이상이 되면 (클러스터 수가 최대보다 작을 때) 전체 벡터로 다시 학습
+# 첫 문서만으로 학습한 작은 클러스터 수가 말뭉치가 커진 뒤에도 그대로 남아 재현율/속도가 떨어지지 않도록 합니다
+VECTOR_IVF_RETRAIN_FACTOR = float(os.getenv("VECTOR_IVF_RETRAIN_FACTOR", "4"))
+# 삭제 표시(HNSW는 벡터를 바로 지울 수 없음)가 전체의 이 비율을 넘으면 인덱스를 다시 만듦
+VECTOR_COMPACT_RATIO = float(os.getenv("VECTOR_COMPACT_RATIO", "0.2"))
+
+INDEX_FILE = "index.faiss"
+MAPPING_FILE = "chunks.json"
+
+
+def _normalized(vectors):
+    vectors = np.ascontiguousarray(np.atleast_2d(np.asarray(vectors, dtype=np.float32))).copy()
+    faiss.normalize_L2(vectors)
+    return vectors
+
+
+class VectorStore:
+    """디스크에 저장되는 FAISS 인덱스 + ID → 청크 매핑
+
+    Args:
+        path (str): 인덱스/매핑 파일을 둘 디렉터리
+        dim (int): 임베딩 차원
+        index_type (str): "flat" | "ivf" | "hnsw"
+    """
+
+    def __init__(self, path=VECTOR_STORE_DIR, dim=None, index_type=VECTOR_INDEX_TYPE):
+        self.path = path
+        self.dim = dim
+        self.index_type = index_type
+        self.index = None
+        self.read_only = False
+        self.next_id = 0
+        self.chunks = {}      # 벡터 ID → 청크 dict (doc_id 포함)
+        self.documents = {}   # doc_id → 벡터 ID 목록
+        self.deleted = set()  # 삭제 표시된 벡터 ID (HNSW)
+        self.trained_size = 0  # IVF를 마지막으로 학습한 벡터 수
+        self._lock = threading.RLock()
+
+    # ---------- 생성/저장/불러오기 ----------
+
+    def _new_index(self, training_vectors=None):
+        if self.index_type == "flat":
+            return faiss.IndexIDMap2(faiss.IndexFlatIP(self.dim))
+        if self.index_type == "hnsw":
+            hnsw = faiss.IndexHNSWFlat(self.dim, VECTOR_HNSW_M, faiss.METRIC_INNER_PRODUCT)
+            hnsw.hnsw.efConstruction = VECTOR_HNSW_EF_CONSTRUCTION
+            hnsw.hnsw.efSearch = VECTOR_HNSW_EF_SEARCH
+            return faiss.IndexIDMap2(hnsw)
+        if self.index_type == "ivf":
+            # 클러스터 수는 학습할 벡터 수에 맞춰 정함 (클러스터당 벡터가 너무 적으면 학습이 불안정, 늘어나면 _rebuild로 다시 학습)
+            nlist = max(1, min(VECTOR_IVF_NLIST, int(math.sqrt(len(training_vectors)))))
+            quantizer = faiss.IndexFlatIP(self.dim)
+            index = faiss.IndexIVFFlat(quantizer, self.dim, nlist, faiss.METRIC_INNER_PRODUCT)
+            index.train(training_vectors)
+            index.nprobe = min(VECTOR_IVF_NPROBE, nlist)
+            self.trained_size = len(training_vectors)
+            return index
+        raise ValueError(f"지원하지 않는 인덱스 종류: {self.index_type}")
+
+    @classmethod
+    def load(cls, path=VECTOR_STORE_DIR, mmap=False):
+        """저장된 인덱스를 엽니다. 파일이 없으면 빈 저장소를 반환합니다.
+
+        Args:
+            mmap (bool): True면 인덱스를 memory-map으로 읽기 전용으로 엽니다 (검색 전용 프로세스용)
+        """
+        store = cls(path)
+        mapping_path = os.path.join(path, MAPPING_FILE)
+        index_path = os.path.join(path, INDEX_FILE)
+        if not (os.path.exists(mapping_path) and os.path.exists(index_path)):
+            return store
+
+        with open(mapping_path, encoding="utf-8") as f:
+            mapping = json.load(f)
+        store.dim = mapping["dim"]
+        store.index_type = mapping["index_type"]
+        store.next_id = mapping["next_id"]
+        store.chunks = {int(k): v for k, v in mapping["chunks"].items()}
+        store.documents = {doc_id: list(ids) for doc_id, ids in mapping["documents"].items()}
+        store.deleted = set(mapping.get("deleted", []))
+        store.trained_size = mapping.get("trained_size", 0)
+
+        if mmap:
+            try:
+                store.index = faiss.read_index(index_path, faiss.IO_FLAG_MMAP | faiss.IO_FLAG_READ_ONLY)
+                store.read_only = True
+            except RuntimeError as e:
+                # 인덱스 종류에 따라 memory-map을 지원하지 않으면 메모리로 읽음
+                print(f"memory-map 로드 실패, 메모리로 읽습니다: {e}")
+        if store.index is None:
+            store.index = faiss.read_index(index_path)
+        store._apply_search_params()
+        return store
+
+    def _apply_search_params(self):
+        base = faiss.downcast_index(self.index.index) if isinstance(self.index, faiss.IndexIDMap) else self.index
+        if isinstance(base, faiss.IndexHNSW):
+            base.hnsw.efSearch = VECTOR_HNSW_EF_SEARCH
+        elif isinstance(base, faiss.IndexIVF):
+            base.nprobe = min(VECTOR_IVF_NPROBE, base.nlist)
+
+    def save(self):
+        """인덱스와 매핑을 임시 파일에 쓴 뒤 교체합니다 (쓰는 도중 읽어도 깨진 파일을 보지 않음)."""
+        with self._lock:
+            if self.index is None:
+                return
+            if self.read_only:
+                raise RuntimeError("memory-map으로 연 인덱스는 저장할 수 없습니다.")
+            os.makedirs(self.path, exist_ok=True)
+            index_path = os.path.join(self.path, INDEX_FILE)
+            mapping_path = os.path.join(self.path, MAPPING_FILE)
+            faiss.write_index(self.index, f"{index_path}.tmp")
+            with open(f"{mapping_path}.tmp", "w", encoding="utf-8") as f:
+                json.dump({
+                    "dim": self.dim,
+                    "index_type": self.index_type,
+                    "next_id": self.next_id,
+                    "chunks": self.chunks,
+                    "documents": self.documents,
+                    "deleted": sorted(self.deleted),
+                    "trained_size": self.trained_size,
+                }, f, ensure_ascii=False)
+            os.replace(f"{index_path}.tmp", index_path)
+            os.replace(f"{mapping_path}.tmp", mapping_path)
+
+    # ---------- 추가/삭제 ----------
+
+    def __len__(self):
+        return len(self.chunks)
+
+    def add_document(self, doc_id, chunks, vectors):
+        """문서 하나의 청크와 임베딩을 추가합니다. 같은 doc_id가 이미 있으면 교체합니다.
+
+        Args:
+            doc_id (str): 문서 식별자 (예: PDF 파일 이름)
+            chunks (list[dict | str]): 청크 (chunker.chunk_document 결과 또는 텍스트)
+            vectors: (청크 수, 차원) 임베딩
+        """
+        vectors = _normalized(vectors)
+        if len(vectors) != len(chunks):
+            raise ValueError(f"청크 수({len(chunks)})와 임베딩 수({len(vectors)})가 다릅니다.")
+        with self._lock:
+            if self.read_only:
+                raise RuntimeError("memory-map으로 연 인덱스에는 추가할 수 없습니다.")
+            if self.dim is None:
+                self.dim = vectors.shape[1]
+            if doc_id in self.documents:
+                self.delete_document(doc_id)
+            if self.index is None:
+                self.index = self._new_index(vectors)
+
+            ids = np.arange(self.next_id, self.next_id + len(vectors), dtype=np.int64)
+            self.index.add_with_ids(vectors, ids)
+            self.next_id += len(vectors)
+            for vector_id, chunk in zip(ids.tolist(), chunks):
+                chunk = {"text": chunk} if isinstance(chunk, str) else dict(chunk)
+                chunk["doc_id"] = doc_id
+                self.chunks[vector_id] = chunk
+            self.documents[doc_id] = ids.tolist()
+            if self._needs_retrain():
+                self._rebuild()
+            return ids.tolist()
+
+    def delete_document(self, doc_id):
+        """문서의 모든 청크를 지웁니다. HNSW는 삭제 표시 후 일정 비율을 넘으면 다시 만듭니다."""
+        with self._lock:
+            ids = self.documents.pop(doc_id, [])
+            if not ids:
+                return 0
+            for vector_id in ids:
+                self.chunks.pop(vector_id, None)
+            try:
+                self.index.remove_ids(np.array(ids, dtype=np.int64))
+            except RuntimeError:
+                # HNSW 등 삭제를 지원하지 않는 인덱스
+                self.deleted.update(ids)
+                if len(self.deleted) > VECTOR_COMPACT_RATIO * max(1, self.index.ntotal):
+                    self.compact()
+            return len(ids)
+
+    def compact(self):
+        """삭제 표시된 벡터를 빼고 인덱스를 다시 만듭니다."""
+        with self._lock:
+            if self.index is None or not self.deleted:
+                return
+            self._rebuild()
+
+    def _needs_retrain(self):
+        """IVF 클러스터 수가 지금 벡터 수에 비해 작은지 (학습 때보다 VECTOR_IVF_RETRAIN_FACTOR배 이상 늘었는지)"""
+        if not isinstance(self.index, faiss.IndexIVF) or self.index.nlist >= VECTOR_IVF_NLIST:
+            return False
+        return len(self.chunks) >= VECTOR_IVF_RETRAIN_FACTOR * max(1, self.trained_size)
+
+    def _rebuild(self):
+        """살아 있는 벡터만으로 인덱스를 새로 만듭니다 (IVF는 이 벡터들로 다시 학습)."""
+        with self._lock:
+            live_ids = np.array(sorted(self.chunks), dtype=np.int64)
+            if len(live_ids) == 0:
+                self.index, self.deleted = None, set()
+                return
+            vectors = np.vstack([self.reconstruct(i) for i in live_ids]).astype(np.float32)
+            index = self._new_index(vectors)
+            index.add_with_ids(vectors, live_ids)
+            self.index, self.deleted = index, set()
+
+    # ---------- 검색 ----------
+
+    def reconstruct(self, vector_id):
+        """저장된 (정규화된) 벡터를 꺼냅니다. IVF는 처음 호출할 때 ID → 위치 맵을 만듭니다."""
+        try:
+            return self.index.reconstruct(int(vector_id))
+        except RuntimeError:
+            if not isinstance(self.index, faiss.IndexIVF):
+                raise
+            self.index.make_direct_map()
+            return self.index.reconstruct(int(vector_id))
+
+    def search(self, query_vector, k=5, with_vectors=False):
+        """코사인 유사도 상위 k개 청크를 반환합니다.
+
+        Args:
+            with_vectors (bool): True면 각 결과의 (정규화된) 임베딩도 함께 반환 (재순위화용)
+
+        Returns:
+            list[tuple]: (유사도, 청크) 목록, with_vectors면 (유사도, 청크, 임베딩) 목록
+        """
+        if self.index is None or not self.chunks:
+            return []
+        query = _normalized(query_vector)
+        with self._lock:
+            # 삭제 표시된 벡터가 결과에 섞일 수 있으므로 그만큼 더 가져옴
+            fetch = min(self.index.ntotal, k + len(self.deleted))
+            scores, ids = self.index.search(query, fetch)
+            results = []
+            for score, vector_id in zip(scores[0].tolist(), ids[0].tolist()):
+                chunk = self.chunks.get(vector_id)
+                if vector_id < 0 or chunk is None:
+                    continue
+                results.append((score, chunk, self.reconstruct(vector_id)) if with_vectors else (score, chunk))
+                if len(results) == k:
+                    break
+        return results
+
+
+_store = None
+_store_lock = threading.Lock()
+
+
+def get_vector_store(mmap=True):
+    """프로세스에서 공유하는 검색용 인덱스 (처음 호출할 때 memory-map으로 엶)"""
+    global _store
+    if _store is None:
+        with _store_lock:
+            if _store is None:
+                _store = VectorStore.load(VECTOR_STORE_DIR, mmap=mmap)
+    return _store
@@ -1,18 +1,24 @@
 import os
 import json
+import math
 import requests
 import re
 from rest_framework.views import APIView
 from rest_framework.response import Response
 from rest_framework import status
-from openai import AzureOpenAI
-from azure.search.documents import SearchClient
-from azure.core.credentials import AzureKeyCredential
+from openai import AzureOpenAI, RateLimitError
 from dotenv import load_dotenv
 import traceback
 
 # 수정된 import: SearchOptions 제거, VectorizableTextQuery 사용
 from azure.search.documents.models import VectorizableTextQuery
+from chatbot.vector_store import get_vector_store
+from chatbot.search_index import ActiveSearchClient
+from chatbot.rerank import RAG_CANDIDATES, rerank
+from chatbot.prompt_budget import assemble_prompt
+from chatbot.session_store import add_turn, find_reusable, history_text, load_session, save_session
+from chatbot.tracing import TRACE_SAMPLE_RATE, TRACE_WINDOW, Trace, metrics, record_usage
+from chatbot.admission import Saturated, coalesce_key, single_flight, upstreams
 
 load_dotenv()
 
@@ -36,240 +42,363 @@ except Exception as e:
     raise # 초기화 실패 시 애플리케이션 시작을 중단
 
 # Azure Search 클라이언트 초기화
+# 인덱스 이름은 활성 인덱스 포인터(search_index.py)에서 읽으며, 재색인 후 포인터가 바뀌면 자동으로 새 인덱스를 사용
 try:
-    search_client = SearchClient(
-        endpoint=os.getenv("AZURE_SEARCH_ENDPOINT"),
-        index_name=os.getenv("AZURE_SEARCH_INDEX_NAME"), # paper-index
-        credential=AzureKeyCredential(os.getenv("AZURE_SEARCH_ADMIN_KEY"))
-    )
-    print("DEBUG: Azure Search client initialized successfully at global scope.")
+    search_client = ActiveSearchClient()
+    search_client.get()
+    print(f"DEBUG: Azure Search client initialized successfully at global scope (index={search_client.index_name}).")
 except Exception as e:
     print(f"CRITICAL ERROR: Failed to initialize Azure AI Search client at global scope: {e}")
     traceback.print_exc()
     raise # 초기화 실패 시 애플리케이션 시작을 중단
 
+# 업스트림이 포화 상태이거나 rate limit에 걸렸을 때 응답 (Retry-After 초 뒤 재시도 권장)
+def busy_response(retry_after, status_code):
+    return Response(
+        {"error": "요청이 많아 지금은 답변할 수 없습니다. 잠시 후 다시 시도해주세요.", "retry_after": retry_after},
+        status=status_code,
+        headers={"Retry-After": str(retry_after)},
+    )
+
+# OpenAI 429 응답의 Retry-After (없으면 5초)
+def upstream_retry_after(error):
+    headers = getattr(getattr(error, "response", None), "headers", None) or {}
+    try:
+        if headers.get("retry-after-ms"):
+            return max(1, math.ceil(float(headers["retry-after-ms"]) / 1000))
+        return max(1, math.ceil(float(headers.get("retry-after", 5))))
+    except (TypeError, ValueError):
+        return 5
+
+# 검색 후보를 중복 제거 + MMR 재순위해 프롬프트에 넣을 후보만 반환
+def rerank_documents(trace, query, candidates, query_vector=None):
+    with trace.span("rerank", candidates=len(candidates)) as span:
+        selected, info = rerank(query, candidates, query_vector)
+        span.update(selected=len(selected), rerank_stage=info.get("stage"))
+    return selected
+
 class SmartChatbotAPIView(APIView):
     def post(self, request):
-        print("DEBUG: SmartChatbotAPIView.post method started.")
+        # 단계별 span을 기록하고 응답 직전에 집계/샘플링 로그로 넘김 (chatbot/tracing.py)
+        trace = Trace("chat_smart")
+        response = self._admit(request, trace)
+        trace.finish(response.status_code)
+        response["X-Trace-Id"] = trace.trace_id
+        return response
+
+    def _admit(self, request, trace):
         user_question_kr = request.data.get("question", "")
-        print(f"DEBUG: Received user_question_kr: '{user_question_kr}'")
+        trace.log(f"Received user_question_kr: '{user_question_kr}'")
 
         if not user_question_kr:
-            print("DEBUG: User question is empty. Returning 400.")
+            trace.log("User question is empty. Returning 400.")
             return Response({"error": "질문이 없습니다."}, status=status.HTTP_400_BAD_REQUEST)
 
+        # 대화 상태 (session_id가 없으면 새 대화)
+        with trace.span("session_load") as span:
+            session_id, session = load_session(request.data.get("session_id"))
+            history = history_text(session)
+            span.update(turns=len(session["turns"]), summary=bool(session["summary"]))
+        trace.set(session_id=session_id)
+
+        # 대화 기록이 있으면 같은 질문이라도 답이 달라지므로 기록 없는 질문만 합침 (chatbot/admission.py)
+        if history:
+            return self._post(trace, user_question_kr, session_id, session, history)
         try:
-            # Step 0: 질문 분해
-            print("DEBUG: Starting Step 0: Question decomposition.")
-            decompose_response = openai_client.chat.completions.create(
-                model=os.getenv("AZURE_DEPLOYMENT_NAME"),
-                messages=[
-                    {
-                    "role": "system",
-                    "content": (
-                        "사용자의 자연어 질문을 다음 세 가지 항목으로 나누세요:\n\n"
-                        "1. db_query: 숫자, 통계, 수치, 비교, 집계 등을 묻는 질문\n"
-                        "2. rag_query: 특정 정보를 문서에서 검색해야 답할 수 있는 질문\n"
-                        "3. reasoning: 전략, 창의적인 아이디어, 판단, 분석, 제안 등을 요하는 질문\n\n"
-                        "각 항목은 질문 속 해당 내용을 문장 단위로 발췌해서 넣고, 없으면 빈 문자열로 두세요.\n"
-                        "다음 JSON 형식으로만 응답하세요:\n"
-                        "{\n"
-                        " \"db_query\": \"...\",\n"
-                        " \"rag_query\": \"...\",\n"
-                        " \"reasoning\": \"...\"\n"
-                        "}"
-                    )
-                    }
-                    ,
-                    {"role": "user", "content": user_question_kr}
-                ]
+            response, coalesced = single_flight.do(
+                coalesce_key(user_question_kr),
+                lambda: self._post(trace, user_question_kr, session_id, session, history)
             )
+        except Saturated as e:
+            trace.fail(e)
+            return busy_response(e.retry_after, status.HTTP_503_SERVICE_UNAVAILABLE)
+        if not coalesced:
+            return response
+
+        # 같은 질문을 먼저 처리한 요청의 결과를 받은 경우: 대화 상태를 이 세션으로 복사
+        trace.set(coalesced=True)
+        data = dict(response.data)
+        if "session_id" in data:
+            save_session(session_id, load_session(data["session_id"])[1])
+            data["session_id"] = session_id
+        headers = {"Retry-After": response["Retry-After"]} if response.has_header("Retry-After") else None
+        return Response(data, status=response.status_code, headers=headers)
+
+    def _post(self, trace, user_question_kr, session_id, session, history):
+        try:
+            # Step 0: 질문 분해
+            with trace.span("decompose") as span, upstreams["openai"].slot(span):
+                decompose_response = openai_client.chat.completions.create(
+                    model=os.getenv("AZURE_DEPLOYMENT_NAME"),
+                    messages=[
+                        {
+                        "role": "system",
+                        "content": (
+                            "사용자의 자연어 질문을 다음 세 가지 항목으로 나누세요:\n\n"
+                            "1. db_query: 숫자, 통계, 수치, 비교, 집계 등을 묻는 질문\n"
+                            "2. rag_query: 특정 정보를 문서에서 검색해야 답할 수 있는 질문\n"
+                            "3. reasoning: 전략, 창의적인 아이디어, 판단, 분석, 제안 등을 요하는 질문\n\n"
+                            "각 항목은 질문 속 해당 내용을 문장 단위로 발췌해서 넣고, 없으면 빈 문자열로 두세요.\n"
+                            "다음 JSON 형식으로만 응답하세요:\n"
+                            "{\n"
+                            " \"db_query\": \"...\",\n"
+                            " \"rag_query\": \"...\",\n"
+                            " \"reasoning\": \"...\"\n"
+                            "}"
+                        )
+                        }
+                        ,
+                        *([{
+                            "role": "system",
+                            "content": (
+                                f"이전 대화:\n{history}\n\n"
+                                "질문이 이전 대화를 가리키면(예: '그거', '같은 기간', '그 논문') 각 항목을 이전 대화 내용으로 채워 "
+                                "혼자 읽어도 이해되는 문장으로 다시 쓰세요. 이전과 같은 데이터를 묻는다면 이전 항목과 같은 문장을 그대로 사용하세요."
+                            )
+                        }] if history else []),
+                        {"role": "user", "content": user_question_kr}
+                    ]
+                )
+                record_usage(span, decompose_response)
 
             raw_content = decompose_response.choices[0].message.content.strip()
-            print(f"DEBUG: Decomposed raw_content: {raw_content}")
+            trace.log(f"Decomposed raw_content: {raw_content}")
 
             try:
                 decomposed = json.loads(raw_content)
             except json.JSONDecodeError:
-                print("DEBUG: JSONDecodeError. Attempting YAML-style fallback parsing.")
+                trace.log("JSONDecodeError. Attempting YAML-style fallback parsing.")
                 decomposed = {}
                 for key in ["db_query", "rag_query", "reasoning"]:
                     match = re.search(rf"{key}\s*:\s*(.*)", raw_content)
                     decomposed[key] = match.group(1).strip() if match else ""
-                print(f"DEBUG: Decomposed (fallback): {decomposed}")
 
             db_query = decomposed.get("db_query", "").strip()
             rag_query = decomposed.get("rag_query", "").strip()
             reasoning = decomposed.get("reasoning", "").strip()
-            print(f"DEBUG: Extracted: db_query='{db_query}', rag_query='{rag_query}', reasoning='{reasoning}'")
+            trace.log(f"Extracted: db_query='{db_query}', rag_query='{rag_query}', reasoning='{reasoning}'")
+            trace.set(db_query=bool(db_query), rag_query=bool(rag_query), reasoning=bool(reasoning))
 
             sql_result_str = "DB 결과 없음"
             documents_str = "문서 없음"
+            chunk_ids = []
+            # 다음 턴에서 재사용할 수 있는 결과인지 (호출 실패 메시지는 저장하지 않음)
+            sql_ok = docs_ok = False
+            # 이전 턴과 같은 db_query / rag_query면 결과 재사용
+            reuse = find_reusable(session, db_query, rag_query)
 
             # Step 1: SQL 처리
-            if db_query:
-                print(f"DEBUG: Starting Step 1: SQL processing for db_query: '{db_query}'")
-                try:
-                    print(f"DEBUG: Calling Azure Function SQL API URL: {AZURE_FUNCTION_SQL_API_URL}")
-                    func_response = requests.post(
-                        AZURE_FUNCTION_SQL_API_URL,
-                        json={"question": db_query},
-                        timeout=360
-                    )
-                    func_response.raise_for_status()
-                    sql_json = func_response.json()
-                    sql_rows = sql_json.get("results", [])
-                    if isinstance(sql_rows, list) and sql_rows:
-                        sql_result_str = "\n".join(
-                            [json.dumps(row, ensure_ascii=False) for row in sql_rows]
+            if db_query and reuse["sql_result"]:
+                sql_result_str = reuse["sql_result"]
+                sql_ok = True
+                trace.set(sql_reused=True)
+            elif db_query:
+                with trace.span("sql") as span, upstreams["sql"].slot(span):
+                    try:
+                        func_response = requests.post(
+                            AZURE_FUNCTION_SQL_API_URL,
+                            json={"question": db_query},
+                            timeout=360
                         )
-                        print(f"DEBUG: SQL result received: {sql_result_str}")
-                    else:
-                        sql_result_str = "DB 결과 없음"
-                        print("DEBUG: No SQL results found from Azure Function.")
-                except Exception as e:
-                    print(f"ERROR: SQL API call failed: {e}")
-                    traceback.print_exc()
-                    sql_result_str = "데이터베이스 집계 결과를 불러오지 못했습니다."
+                        span["http_status"] = func_response.status_code
+                        func_response.raise_for_status()
+                        sql_json = func_response.json()
+                        sql_rows = sql_json.get("results", [])
+                        if isinstance(sql_rows, list) and sql_rows:
+                            sql_result_str = "\n".join(
+                                [json.dumps(row, ensure_ascii=False) for row in sql_rows]
+                            )
+                            sql_ok = True
+                            span["rows"] = len(sql_rows)
+                            trace.log(f"SQL result received: {sql_result_str}")
+                        else:
+                            sql_result_str = "DB 결과 없음"
+                            span["rows"] = 0
+                    except Exception as e:
+                        span["error"] = f"{type(e).__name__}: {e}"[:300]
+                        sql_result_str = "데이터베이스 집계 결과를 불러오지 못했습니다."
 
             # Step 2: RAG 처리 (벡터 검색 우선)
-            if rag_query:
-                print(f"DEBUG: Starting Step 2: RAG processing for rag_query: '{rag_query}'")
+            if rag_query and reuse["documents"]:
+                documents_str = reuse["documents"]
+                chunk_ids = reuse["chunk_ids"]
+                docs_ok = True
+                trace.set(documents_reused=True)
+            elif rag_query:
                 try:
                     # 1. 사용자 질문(rag_query_en)을 번역
-                    print("DEBUG: Translating RAG query from Korean to English.")
-                    translate_response = openai_client.chat.completions.create(
-                        model=os.getenv("AZURE_DEPLOYMENT_NAME"),
-                        messages=[
-                            {"role": "system", "content": "Translate the Korean question into English."},
-                            {"role": "user", "content": rag_query}
-                        ]
-                    )
+                    with trace.span("translate") as span, upstreams["openai"].slot(span):
+                        translate_response = openai_client.chat.completions.create(
+                            model=os.getenv("AZURE_DEPLOYMENT_NAME"),
+                            messages=[
+                                {"role": "system", "content": "Translate the Korean question into English."},
+                                {"role": "user", "content": rag_query}
+                            ]
+                        )
+                        record_usage(span, translate_response)
                     rag_query_en = translate_response.choices[0].message.content.strip()
-                    print(f"DEBUG: Translated RAG query (English): '{rag_query_en}'")
+                    trace.log(f"Translated RAG query (English): '{rag_query_en}'")
 
                     # 2. 벡터 검색 먼저 시도
-                    print("DEBUG: Trying vector search first for testing")
                     search_success = False
+                    query_vector = None
 
                     try:
-                        print("DEBUG: Trying vector field: embedding")
-                        
                         # 임베딩 생성
-                        embedding_response = openai_client.embeddings.create(
-                            model=os.getenv("AZURE_OPENAI_EMBEDDING_DEPLOYMENT"),
-                            input=rag_query_en,
-                        )
+                        with trace.span("embed") as span, upstreams["openai"].slot(span):
+                            embedding_response = openai_client.embeddings.create(
+                                model=os.getenv("AZURE_OPENAI_EMBEDDING_DEPLOYMENT"),
+                                input=rag_query_en,
+                            )
+                            record_usage(span, embedding_response)
                         query_vector = embedding_response.data[0].embedding
-                        print(f"DEBUG: Embedding created. Vector length: {len(query_vector)}")
-                        
+
                         # VectorizableTextQuery 사용
                         vector_query = VectorizableTextQuery(
                             text=rag_query_en,
-                            k_nearest_neighbors=3,
+                            k_nearest_neighbors=RAG_CANDIDATES,
                             fields="embedding"
                         )
-                        
-                        # 벡터 검색 실행
-                        search_results = search_client.search(
-                            search_text=rag_query_en,
-                            vector_queries=[vector_query],
-                            top=3
-                        )
-                        
-                        docs = []
-                        for doc in search_results:
-                            print(f"DEBUG: Found document fields: {list(doc.keys())}")
-                            # chunk 필드에서 텍스트 가져오기
-                            if "chunk" in doc and doc["chunk"]:
-                                docs.append(doc["chunk"])
-                                print(f"DEBUG: Using text field: chunk")
-                        
+
+                        # 벡터 검색 실행 (재순위를 위해 후보를 넉넉히 받음, 결과 순회까지가 검색 시간)
+                        with trace.span("search_vector") as span, upstreams["search"].slot(span):
+                            search_results = search_client.get().search(
+                                search_text=rag_query_en,
+                                vector_queries=[vector_query],
+                                top=RAG_CANDIDATES
+                            )
+
+                            candidates = []
+                            for doc in search_results:
+                                # chunk 필드에서 텍스트 가져오기 (임베딩 필드가 반환되면 MMR에 사용)
+                                if "chunk" in doc and doc["chunk"]:
+                                    candidates.append({
+                                        "id": doc.get("id"),
+                                        "text": doc["chunk"],
+                                        "score": doc.get("@search.score"),
+                                        "embedding": doc.get("embedding"),
+                                    })
+                            span["results"] = len(candidates)
+                        selected = rerank_documents(trace, rag_query_en, candidates, query_vector)
+                        docs = [c["text"] for c in selected]
+
                         if docs:
+                            chunk_ids = [c["id"] for c in selected if c.get("id")]
                             documents_str = "\n\n".join(docs)
-                            print(f"DEBUG: Vector search successful, found {len(docs)} documents")
-                            print(f"DEBUG: Documents (first 200 chars): {documents_str[:200]}...")
+                            trace.log(f"Vector search successful, found {len(docs)} documents")
                             search_success = True
-                        else:
-                            print("DEBUG: Vector search returned results but no text content found")
-                            
+
                     except Exception as vector_error:
-                        print(f"DEBUG: Vector search failed: {vector_error}")
+                        trace.log(f"Vector search failed: {vector_error}")
 
-                    # 3. 벡터 검색이 실패했으면 기본 텍스트 검색 시도
+                    # 3. AI Search 벡터 검색이 실패했으면 로컬 FAISS 인덱스 시도
+                    if not search_success and query_vector is not None:
+                        try:
+                            with trace.span("search_local") as span:
+                                local_results = get_vector_store().search(query_vector, k=RAG_CANDIDATES, with_vectors=True)
+                                span["results"] = len(local_results)
+                            candidates = [
+                                {"text": chunk.get("text"), "score": score, "embedding": vector}
+                                for score, chunk, vector in local_results
+                            ]
+                            docs = [c["text"] for c in rerank_documents(trace, rag_query_en, candidates, query_vector)]
+                            if docs:
+                                documents_str = "\n\n".join(docs)
+                                trace.log(f"Local vector search successful, found {len(docs)} documents")
+                                search_success = True
+                        except Exception as local_error:
+                            trace.log(f"Local vector search failed: {local_error}")
+
+                    # 4. 벡터 검색이 실패했으면 기본 텍스트 검색 시도
                     if not search_success:
-                        print("DEBUG: Vector search failed, trying basic text search")
                         try:
                             # 가장 기본적인 검색 (select 없이)
-                            search_results = search_client.search(
-                                search_text=rag_query_en,
-                                top=3
-                            )
-                            
-                            docs = []
-                            for doc in search_results:
-                                print(f"DEBUG: Found document fields: {list(doc.keys())}")
-                                # 여러 가능한 텍스트 필드명 시도
-                                text_content = None
-                                for field_name in ["chunk", "content", "text", "body", "description"]:
-                                    if field_name in doc and doc[field_name]:
-                                        text_content = doc[field_name]
-                                        print(f"DEBUG: Using text field: {field_name}")
-                                        break
-                                
-                                if text_content:
-                                    docs.append(text_content)
-                            
+                            with trace.span("search_text") as span, upstreams["search"].slot(span):
+                                search_results = search_client.get().search(
+                                    search_text=rag_query_en,
+                                    top=RAG_CANDIDATES
+                                )
+
+                                candidates = []
+                                for doc in search_results:
+                                    # 여러 가능한 텍스트 필드명 시도
+                                    text_content = None
+                                    for field_name in ["chunk", "content", "text", "body", "description"]:
+                                        if field_name in doc and doc[field_name]:
+                                            text_content = doc[field_name]
+                                            break
+
+                                    if text_content:
+                                        candidates.append({"id": doc.get("id"), "text": text_content, "score": doc.get("@search.score")})
+                                span["results"] = len(candidates)
+                            selected = rerank_documents(trace, rag_query_en, candidates, query_vector)
+                            docs = [c["text"] for c in selected]
+                            chunk_ids = [c["id"] for c in selected if c.get("id")]
+
                             if docs:
                                 documents_str = "\n\n".join(docs)
-                                print(f"DEBUG: Basic search successful, found {len(docs)} documents")
-                                print(f"DEBUG: Documents (first 200 chars): {documents_str[:200]}...")
+                                trace.log(f"Basic search successful, found {len(docs)} documents")
                                 search_success = True
-                            else:
-                                print("DEBUG: Basic search returned results but no text content found")
-                                
+
                         except Exception as basic_search_error:
-                            print(f"DEBUG: Basic search failed: {basic_search_error}")
+                            trace.log(f"Basic search failed: {basic_search_error}")
+
+                    docs_ok = search_success
 
-                    # 4. 모든 검색이 실패했을 때
+                    # 5. 모든 검색이 실패했을 때
                     if not search_success:
-                        print("DEBUG: All search methods failed")
+                        trace.set(search_failed=True)
                         documents_str = "관련 문서를 찾을 수 없었습니다."
 
                 except Exception as e:
-                    print(f"ERROR: Document search failed: {e}")
-                    traceback.print_exc()
+                    trace.fail(e)
                     documents_str = "문서 검색에 실패했습니다. 오류: " + str(e)
 
             # Step 3: 프롬프트 구성
-            print("DEBUG: Constructing final prompt for LLM.")
-            prompt_parts = [f"[사용자 질문]\n{user_question_kr}"]
-            prompt_parts.append(f"[SQL 결과]\n{sql_result_str}")
-            prompt_parts.append(f"[문서 검색 결과]\n{documents_str}")
-            if reasoning:
-                prompt_parts.append(f"[추론해야 할 내용]\n{reasoning}")
-            prompt_parts.append(
-                "위 내용을 바탕으로 사용자의 질문에 대해 창의적이고 구체적인 한국어 답변을 작성하세요. "
-                "이모티콘은 금지. 질문 유도는 금지."
-            )
+            # 섹션별 토큰 수를 세어 PROMPT_MAX_TOKENS 안에서 우선순위대로 배분 (질문/지시문은 자르지 않음)
+            with trace.span("prompt") as span:
+                final_prompt, token_breakdown = assemble_prompt([
+                    {"name": "question", "title": "사용자 질문", "text": user_question_kr, "fixed": True},
+                    {"name": "sql", "title": "SQL 결과", "text": sql_result_str,
+                     "priority": 1, "min_tokens": 500, "separator": "\n", "unit": "행"},
+                    {"name": "documents", "title": "문서 검색 결과", "text": documents_str,
+                     "priority": 2, "min_tokens": 800, "separator": "\n\n", "unit": "개 문서"},
+                    {"name": "reasoning", "title": "추론해야 할 내용", "text": reasoning,
+                     "priority": 0, "min_tokens": 200},
+                    {"name": "history", "title": "이전 대화", "text": history,
+                     "priority": 3, "min_tokens": 100},
+                    {"name": "instruction", "fixed": True, "text": (
+                        "위 내용을 바탕으로 사용자의 질문에 대해 창의적이고 구체적인 한국어 답변을 작성하세요. "
+                        "이모티콘은 금지. 질문 유도는 금지."
+                    )},
+                ])
+                span["tokens"] = {name: value["used"] for name, value in token_breakdown.items()}
+            trace.log(f"Final prompt for LLM (first 500 chars):\n{final_prompt[:500]}...")
 
-            final_prompt = "\n\n".join(prompt_parts)
-            print(f"DEBUG: Final prompt for LLM (first 500 chars):\n{final_prompt[:500]}...")
-
-            print(f"DEBUG: Calling final OpenAI completion with model: '{os.getenv('AZURE_DEPLOYMENT_NAME')}'")
-            final_completion = openai_client.chat.completions.create(
-                model=os.getenv("AZURE_DEPLOYMENT_NAME"),
-                messages=[
-                    {"role": "system", "content": "너는 데이터 분석과 마케팅 전략에 정통한 한국어 전문가야."},
-                    {"role": "user", "content": final_prompt}
-                ]
-            )
+            with trace.span("final_completion") as span, upstreams["openai"].slot(span):
+                final_completion = openai_client.chat.completions.create(
+                    model=os.getenv("AZURE_DEPLOYMENT_NAME"),
+                    messages=[
+                        {"role": "system", "content": "너는 데이터 분석과 마케팅 전략에 정통한 한국어 전문가야."},
+                        {"role": "user", "content": final_prompt}
+                    ]
+                )
+                record_usage(span, final_completion)
             final_answer = final_completion.choices[0].message.content
-            print(f"DEBUG: Final answer received (first 200 chars): {final_answer[:200]}...")
+            trace.log(f"Final answer received (first 200 chars): {final_answer[:200]}...")
+
+            # 대화 상태 저장 (오래된 턴은 요약으로 접힘)
+            with trace.span("session_save"):
+                add_turn(
+                    session, user_question_kr, decomposed,
+                    sql_result_str if sql_ok else "", documents_str if docs_ok else "", chunk_ids, final_answer
+                )
+                save_session(session_id, session)
 
-            print("DEBUG: Returning final API response (200 OK).")
             return Response({
                 "answer": final_answer,
+                "session_id": session_id,
+                "reused": {"sql": bool(db_query and reuse["sql_result"]), "documents": bool(rag_query and reuse["documents"])},
                 "question_type": {
                     "db_query": bool(db_query),
                     "rag_query": bool(rag_query),
@@ -277,7 +406,27 @@ class SmartChatbotAPIView(APIView):
                 }
             }, status=status.HTTP_200_OK)
 
+        # 질문 분해 / SQL / 최종 답변 단계에서 업스트림 자리를 얻지 못함 (문서 검색은 위에서 대체 경로로 넘어감)
+        except Saturated as e:
+            trace.fail(e)
+            return busy_response(e.retry_after, status.HTTP_503_SERVICE_UNAVAILABLE)
+        except RateLimitError as e:
+            trace.fail(e)
+            return busy_response(upstream_retry_after(e), status.HTTP_429_TOO_MANY_REQUESTS)
         except Exception as e:
-            print(f"CRITICAL ERROR: An unexpected error occurred in post method: {e}")
+            trace.fail(e)
             traceback.print_exc()
             return Response({"error": f"처리 실패: {str(e)}"}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+
+class ChatMetricsAPIView(APIView):
+    """이 프로세스에서 처리한 요청의 단계별 p50/p95 (워커 프로세스마다 따로 집계됨)"""
+
+    def get(self, request):
+        return Response({
+            "window": TRACE_WINDOW,
+            "sample_rate": TRACE_SAMPLE_RATE,
+            "stages": metrics.snapshot(),
+            "upstreams": {name: limiter.stats() for name, limiter in upstreams.items()},
+            "single_flight": single_flight.stats(),
+        }, status=status.HTTP_200_OK)
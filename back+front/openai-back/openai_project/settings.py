@@ -87,6 +87,47 @@ DATABASES = {
 }
 
 
+# Cache
+# chat_sessions: 대화 상태 저장소 (chatbot/session_store.py). SQLite DB 테이블에 저장되므로
+# 처음 한 번 `python manage.py createcachetable`로 테이블을 만들어야 합니다.
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+    'chat_sessions': {
+        'BACKEND': 'django.core.cache.backends.db.DatabaseCache',
+        'LOCATION': 'chatbot_session_cache',
+        'TIMEOUT': int(os.getenv('CHAT_SESSION_TTL', '3600')),
+        'OPTIONS': {
+            'MAX_ENTRIES': int(os.getenv('CHAT_SESSION_MAX_ENTRIES', '5000')),
+        },
+    },
+}
+
+
+# Logging
+# chatbot.trace: 요청별 단계 추적 로그 (chatbot/tracing.py, 한 줄에 요청 하나의 JSON)
+
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'formatters': {
+        'trace': {'format': '%(asctime)s %(levelname)s %(name)s %(message)s'},
+    },
+    'handlers': {
+        'trace_console': {'class': 'logging.StreamHandler', 'formatter': 'trace'},
+    },
+    'loggers': {
+        'chatbot.trace': {
+            'handlers': ['trace_console'],
+            'level': os.getenv('TRACE_LOG_LEVEL', 'INFO'),
+            'propagate': False,
+        },
+    },
+}
+
+
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
 
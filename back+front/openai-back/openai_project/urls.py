@@ -16,8 +16,9 @@ Including another URLconf
 """
 from django.contrib import admin
 from django.urls import path
-from chatbot.views import SmartChatbotAPIView
+from chatbot.views import ChatMetricsAPIView, SmartChatbotAPIView
 
 urlpatterns = [
     path("api/chat_smart/", SmartChatbotAPIView.as_view(), name="chat_smart"),
+    path("api/chat_metrics/", ChatMetricsAPIView.as_view(), name="chat_metrics"),
 ]
\ No newline at end of file
@@ -1,13 +1,20 @@
 import os
+import hashlib
 import fitz  # PyMuPDF
 import numpy as np
 import json
 import requests
-import re
+import logging
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from contextlib import contextmanager
+from tempfile import NamedTemporaryFile
 from openai import AzureOpenAI
 from azure.storage.blob import BlobServiceClient
 from dotenv import load_dotenv
-from upload_to_ai_search import upload_documents_to_ai_search  # AI Search 업로드 함수
+from upload_to_ai_search import upload_documents_to_ai_search, delete_documents_from_ai_search  # AI Search 업로드/삭제 함수
+from chunker import chunk_document  # 구조 보존 토큰 기반 청커
+from manifest import diff_chunks, document_key, load_manifest, orphaned_chunks, save_manifest  # 증분 재색인 매니페스트
+from vector_shard import load_shard, save_shard, shard_blob_names, vectors_by_hash  # 논문별 임베딩 샤드 (.npy)
 
 load_dotenv()
 
@@ -24,34 +31,19 @@ EMBEDDING_DIM = int(os.getenv("EMBEDDING_DIMENSION"))
 blob_service_client = BlobServiceClient.from_connection_string(os.getenv("AZURE_STORAGE_CONNECTION_STRING"))
 container_client = blob_service_client.get_container_client(os.getenv("BLOB_CONTAINER_NAME"))
 
-# 텍스트 전처리
-def clean_text(text):
-    text = text.replace('\n', ' ').replace('\xa0', ' ')
-    text = ' '.join(text.split())
+# 임베딩 요청 한 번에 보낼 최대 청크 수 / 토큰 수 (Azure OpenAI 요청당 입력 개수·토큰 제한보다 작게)
+EMBEDDING_BATCH_SIZE = int(os.getenv("EMBEDDING_BATCH_SIZE", "64"))
+EMBEDDING_BATCH_MAX_TOKENS = int(os.getenv("EMBEDDING_BATCH_MAX_TOKENS", "8000"))
+# 동시에 보낼 임베딩 요청 수 / Blob·AI Search 업로드 수
+EMBEDDING_CONCURRENCY = int(os.getenv("EMBEDDING_CONCURRENCY", "4"))
+UPLOAD_CONCURRENCY = int(os.getenv("UPLOAD_CONCURRENCY", "8"))
+# PDF를 내려받거나 읽을 때 한 번에 처리할 바이트 수 / 다운로드 타임아웃(초)
+PDF_READ_CHUNK_BYTES = int(os.getenv("PDF_READ_CHUNK_BYTES", str(1024 * 1024)))
+PDF_DOWNLOAD_TIMEOUT = int(os.getenv("PDF_DOWNLOAD_TIMEOUT", "60"))
 
-    # 유니코드 특수문자 제거 또는 대체
-    ligature_map = {
-        '\ufb01': 'fi',
-        '\ufb02': 'fl',
-        '©': '', '®': '', '™': '', '–': '-', '—': '-', '…': '...',
-        '“': '"', '”': '"', '‘': "'", '’': "'",
-    }
-    for bad_char, replacement in ligature_map.items():
-        text = text.replace(bad_char, replacement)
-
-    # 제어 문자 제거
-    text = re.sub(r'[\x00-\x1F\x7F]', '', text)
-
-    return text
-
-# 유효한 청크인지 판단
-def is_valid_chunk(chunk):
-    chunk = chunk.strip().lower()
-    return len(chunk) >= 20 and not chunk.startswith(("figure", "table", "references", "doi", "copyright"))
-
-# 텍스트 청크 분할
-def split_text(text, chunk_size=500):
-    return [c for c in [text[i:i+chunk_size] for i in range(0, len(text), chunk_size)] if is_valid_chunk(c)]
+# 배치(현재 tokens 토큰)에 item_tokens 토큰짜리 청크를 더하면 요청당 개수/토큰 제한을 넘는지 확인하는 함수
+def batch_is_full(batch, tokens, item_tokens, max_items=EMBEDDING_BATCH_SIZE, max_tokens=EMBEDDING_BATCH_MAX_TOKENS):
+    return bool(batch) and (len(batch) >= max_items or tokens + item_tokens > max_tokens)
 
 # Azure OpenAI로 임베딩 생성
 def get_embeddings(texts):
@@ -61,77 +53,229 @@ def get_embeddings(texts):
     )
     return [np.array(e.embedding, dtype=np.float32) for e in response.data]
 
-# PDF → 텍스트 청크화 + 임베딩 → Blob 저장 + AI Search 업로드
-def process_pdf_and_build_index(pdf_url: str, paper_prefix: str):
-    from tempfile import NamedTemporaryFile
+# 본문(Introduction ~ References) 페이지 번호 범위를 찾는 함수
+# 페이지 텍스트를 한 장씩 읽고 버려, 큰 PDF도 전체 텍스트를 메모리에 올리지 않습니다
+def body_page_range(doc):
+    intro_idx, ref_idx = None, None
+    for i, text in enumerate(iter_page_texts(doc)):
+        lowered = text.lower()
+        if intro_idx is None and "introduction" in lowered:
+            intro_idx = i
+        if "references" in lowered:
+            ref_idx = i
+    page_count = len(doc)
+    intro_idx = intro_idx or 0
+    ref_idx = page_count if ref_idx is None else ref_idx
 
-    # PDF 다운로드
-    r = requests.get(pdf_url)
+    print(f"제외된 페이지 (Introduction 이전): {list(range(0, intro_idx))}")
+    print(f"제외된 페이지 (References 이후): {list(range(ref_idx + 1, page_count))}")
+    # References 제목이 있는 페이지에도 본문 끝부분이 있으므로 포함하고, 청커가 References 제목에서 멈춥니다
+    return range(intro_idx, min(ref_idx + 1, page_count))
+
+# 페이지 텍스트를 한 장씩 내보내는 제너레이터
+def iter_page_texts(doc):
+    for page in doc:
+        yield page.get_text()
+
+# PDF를 임시 파일로 조금씩 내려받으며 sha256을 계산하는 컨텍스트 매니저
+# source: URL(str) 또는 read(size)를 지원하는 파일 객체 (Blob 트리거의 func.InputStream 등)
+# with 블록이 끝나면 예외가 나도 임시 파일을 지웁니다
+@contextmanager
+def download_pdf(source):
+    digest = hashlib.sha256()
     with NamedTemporaryFile(suffix=".pdf", delete=False) as tmp_file:
-        tmp_file.write(r.content)
         tmp_path = tmp_file.name
+    try:
+        with open(tmp_path, "wb") as out:
+            if isinstance(source, str):
+                with requests.get(source, stream=True, timeout=PDF_DOWNLOAD_TIMEOUT) as r:
+                    r.raise_for_status()
+                    for block in r.iter_content(chunk_size=PDF_READ_CHUNK_BYTES):
+                        digest.update(block)
+                        out.write(block)
+            else:
+                for block in iter(lambda: source.read(PDF_READ_CHUNK_BYTES), b""):
+                    digest.update(block)
+                    out.write(block)
+        yield tmp_path, digest.hexdigest()
+    finally:
+        try:
+            os.remove(tmp_path)
+        except OSError as e:
+            logging.warning(f"[PIPELINE] 임시 파일 삭제 실패 ({tmp_path}): {e}")
+
+# 청크 JSON을 Blob에 저장
+def upload_chunk_blob(json_doc):
+    container_client.upload_blob(
+        name=f"{json_doc['id']}.json",
+        data=json.dumps(json_doc, ensure_ascii=False).encode("utf-8"),
+        overwrite=True
+    )
 
-    doc = fitz.open(tmp_path)
-    pages = [page.get_text() for page in doc]
+# AI Search 업로드 (실패 시 예외 - 매니페스트가 저장되지 않아 다음 업로드 때 다시 처리됨)
+def upload_search_batch(search_docs):
+    if not upload_documents_to_ai_search(search_docs):
+        raise RuntimeError(f"AI Search 업로드 실패 ({len(search_docs)}개 문서)")
 
-    # Introduction ~ References 구간 추출
-    intro_idx = 0
-    for i, text in enumerate(pages):
-        if "introduction" in text.lower():
-            intro_idx = i
-            break
+# 재색인 후 더 이상 없는 청크를 AI Search와 Blob에서 삭제
+def delete_orphaned_chunks(chunk_ids):
+    if not chunk_ids:
+        return
+    if not delete_documents_from_ai_search(chunk_ids):
+        raise RuntimeError(f"AI Search 문서 삭제 실패 ({len(chunk_ids)}개)")
+    for orphan_id in chunk_ids:
+        try:
+            container_client.delete_blob(f"{orphan_id}.json")
+        except Exception as e:
+            logging.warning(f"[PIPELINE] 청크 Blob 삭제 실패 ({orphan_id}): {e}")
 
-    ref_idx = len(pages)
-    for i in reversed(range(len(pages))):
-        if "references" in pages[i].lower():
-            ref_idx = i
-            break
-
-    excluded_before = list(range(0, intro_idx))
-    excluded_after = list(range(ref_idx, len(pages)))
-    print(f"제외된 페이지 (Introduction 이전): {excluded_before}")
-    print(f"제외된 페이지 (References 이후): {excluded_after}")
-
-    # 텍스트 청크화
-    trimmed_pages = pages[intro_idx:ref_idx]
-    full_text = "".join(trimmed_pages)
-    chunks = split_text(clean_text(full_text))
-    if not chunks:
+# PDF → 텍스트 청크화 + 임베딩 → Blob 저장 + AI Search 업로드
+# source는 PDF URL(SAS 등) 또는 파일 객체(Blob 트리거 입력 스트림)입니다.
+# 매니페스트(manifest.py)와 비교해 바뀐 청크만 업로드합니다. 같은 PDF가 다시 올라오면 다운로드 후 바로 끝나고,
+# 이전 임베딩 샤드(vector_shard.py)에 같은 내용의 청크가 있으면 그 임베딩을 재사용합니다
+# (페이지가 끼어들어 위치만 바뀐 청크는 임베딩 없이 메타데이터만 다시 업로드).
+# 청커가 페이지를 한 장씩 읽어 청크를 내보내는 대로 매니페스트와 비교하고, 새로 임베딩할 청크는 배치가 차는 대로
+# 최대 EMBEDDING_CONCURRENCY개 요청을 동시에 보내며, 배치가 끝나는 대로 Blob 저장과 AI Search 업로드를
+# UPLOAD_CONCURRENCY개 스레드에서 바로 시작합니다. 문서 전체 청크를 메모리에 모으지 않고,
+# 끝까지 남는 것은 청크 해시와 샤드에 쓸 임베딩뿐입니다.
+# 임베딩은 청크 JSON에 넣지 않고 논문별 샤드(.npy) 하나로 저장합니다.
+def process_pdf_and_build_index(source, paper_prefix: str):
+    # PDF를 임시 파일로 받아 청크화 (다운로드/읽기는 PDF_READ_CHUNK_BYTES 단위, 끝나면 임시 파일 삭제)
+    with download_pdf(source) as (pdf_path, pdf_sha256):
+        # 같은 PDF + 같은 청커 설정이면 건너뜀
+        doc_key = document_key(pdf_sha256)
+        manifest = load_manifest(container_client, paper_prefix)
+        if manifest and manifest.get("document_key") == doc_key:
+            logging.info(f"[PIPELINE] {paper_prefix}: 변경 없음 (같은 PDF), 재색인 생략")
+            return
+
+        # 이전 샤드에서 같은 내용(해시)의 임베딩을 찾음 (위치만 밀린 청크 포함)
+        lookup = vectors_by_hash(load_shard(container_client, paper_prefix))
+
+        # 섹션/문장 단위 청크화 (페이지는 청커가 한 장씩 읽음) → 매니페스트와 하나씩 비교하며 임베딩/업로드
+        with fitz.open(pdf_path) as doc:
+            changes = diff_chunks(manifest, chunk_document(doc, body_page_range(doc)), paper_prefix)
+            chunk_entries, vectors, counts = embed_and_upload_changes(paper_prefix, changes, lookup)
+    if not chunk_entries:
         raise ValueError("유효한 청크 없음")
+    orphaned = orphaned_chunks(manifest, chunk_entries)
+    logging.info(
+        f"[PIPELINE] {paper_prefix}: 청크 {len(chunk_entries)}개 중 변경 {counts['changed']}개, "
+        f"새 임베딩 {counts['embedded']}개, 삭제 {len(orphaned)}개"
+    )
 
-    # 임베딩 생성
-    embeddings = get_embeddings(chunks)
+    # 논문 전체 임베딩 샤드 저장
+    rows = [
+        {"id": current_id, "hash": entry["hash"], "chunk_index": entry["index"]}
+        for current_id, entry in chunk_entries.items()
+    ]
+    save_shard(container_client, paper_prefix, rows, np.stack(vectors))
 
-    # 저장 및 업로드
-    json_docs_for_search = []
-    for i, (chunk, embedding) in enumerate(zip(chunks, embeddings)):
-        doc_id = f"{paper_prefix}-{i+1:03}"
-        json_doc = {
+    # 없어진 청크 삭제 후 매니페스트 저장 (여기까지 성공해야 다음 업로드에서 변경분만 처리)
+    delete_orphaned_chunks(orphaned)
+    save_manifest(container_client, paper_prefix, doc_key, chunk_entries)
+    logging.info(f"[PIPELINE] {paper_prefix}: 변경 청크 {counts['changed']}개 업로드, {len(orphaned)}개 삭제 완료")
+
+# 청크 JSON(Blob)과 AI Search 문서를 만드는 함수 (batch: [(청크 번호, 청크 ID, 청크)])
+def build_docs(paper_prefix, batch, vectors):
+    json_docs, search_docs = [], []
+    for i, doc_id, chunk in batch:
+        json_docs.append({
             "id": doc_id,
-            "chunk": chunk,
-            "embedding": embedding.tolist(),
+            "chunk": chunk["text"],
             "metadata": {
                 "source": f"{paper_prefix}.pdf",
-                "chunk_index": i + 1
+                "chunk_index": i + 1,
+                "section": chunk["section"],
+                "page_start": chunk["page_start"],
+                "page_end": chunk["page_end"],
+                "tokens": chunk["tokens"],
+                "vector_shard": shard_blob_names(paper_prefix)[0],
+                "vector_row": i
             }
-        }
-
-        # 1) Blob 저장
-        blob_name = f"{doc_id}.json"
-        container_client.upload_blob(
-            name=blob_name,
-            data=json.dumps(json_doc, ensure_ascii=False).encode("utf-8"),
-            overwrite=True
-        )
-
-        # 2) AI Search 업로드용 리스트 구성
-        json_docs_for_search.append({
+        })
+        search_docs.append({
             "id": doc_id,
-            "chunk": chunk,
-            "embedding": embedding.tolist(),
+            "chunk": chunk["text"],
+            "embedding": vectors[i].tolist(),
             "metadata_source": f"{paper_prefix}.pdf",
             "metadata_chunk_index": i + 1
         })
+    return json_docs, search_docs
+
+# diff_chunks가 내보내는 청크를 받는 대로 임베딩하고 변경 청크를 업로드하는 함수
+# 반환값: (청크 ID → 매니페스트 항목, 청크 순서대로의 임베딩 목록, {"changed", "embedded"} 개수)
+def embed_and_upload_changes(paper_prefix, changes, lookup):
+    chunk_entries, vectors = {}, []
+    counts = {"changed": 0, "embedded": 0}
+    embed_batch, embed_tokens = [], 0   # 새로 임베딩할 (청크 번호, 청크 ID, 청크, 변경 여부)
+    reused_batch = []                   # 이전 임베딩을 재사용하는 변경 청크 (청크 번호, 청크 ID, 청크)
+    embed_futures, upload_futures = {}, set()
+
+    with ThreadPoolExecutor(max_workers=EMBEDDING_CONCURRENCY) as embed_pool, \
+         ThreadPoolExecutor(max_workers=UPLOAD_CONCURRENCY) as upload_pool:
+
+        def finish_uploads(block):
+            # 끝난 업로드의 오류를 바로 전달하고 목록에서 뺌 (block이면 하나 이상 끝날 때까지 기다림)
+            done = wait(upload_futures, return_when=FIRST_COMPLETED)[0] if block else \
+                [future for future in upload_futures if future.done()]
+            for future in done:
+                upload_futures.discard(future)
+                future.result()
+
+        def submit_uploads(batch):
+            if not batch:
+                return
+            # 밀려 있는 업로드가 많으면 자리가 날 때까지 기다림 (업로드할 문서가 메모리에 쌓이지 않도록)
+            while len(upload_futures) >= UPLOAD_CONCURRENCY * 4:
+                finish_uploads(block=True)
+            json_docs, search_docs = build_docs(paper_prefix, batch, vectors)
+            upload_futures.update(upload_pool.submit(upload_chunk_blob, json_doc) for json_doc in json_docs)
+            upload_futures.add(upload_pool.submit(upload_search_batch, search_docs))
+
+        def finish_embeddings(block):
+            # 끝난 임베딩 배치의 벡터를 채우고 그 배치의 변경 청크 업로드를 시작
+            done = wait(embed_futures, return_when=FIRST_COMPLETED)[0] if block else \
+                [future for future in embed_futures if future.done()]
+            for future in done:
+                batch = embed_futures.pop(future)
+                for (i, _, _, _), embedding in zip(batch, future.result()):
+                    vectors[i] = embedding
+                submit_uploads([(i, doc_id, chunk) for i, doc_id, chunk, changed in batch if changed])
+
+        def submit_embeddings():
+            nonlocal embed_batch, embed_tokens
+            # 진행 중인 임베딩 요청이 많으면 하나가 끝날 때까지 기다림 (청커가 앞서 나가며 청크를 쌓지 않도록)
+            while len(embed_futures) >= EMBEDDING_CONCURRENCY * 2:
+                finish_embeddings(block=True)
+            future = embed_pool.submit(get_embeddings, [chunk["text"] for _, _, chunk, _ in embed_batch])
+            embed_futures[future] = embed_batch
+            embed_batch, embed_tokens = [], 0
+
+        for i, current_id, chunk, entry, changed in changes:
+            chunk_entries[current_id] = entry
+            vector = lookup(entry["hash"])
+            vectors.append(vector)
+            counts["changed"] += changed
+            if vector is None:
+                counts["embedded"] += 1
+                if batch_is_full(embed_batch, embed_tokens, chunk["tokens"]):
+                    submit_embeddings()
+                embed_batch.append((i, current_id, chunk, changed))
+                embed_tokens += chunk["tokens"]
+            elif changed:
+                reused_batch.append((i, current_id, chunk))
+                if len(reused_batch) >= EMBEDDING_BATCH_SIZE:
+                    submit_uploads(reused_batch)
+                    reused_batch = []
+            finish_embeddings(block=False)
 
-    # AI Search 업로드
-    upload_documents_to_ai_search(json_docs_for_search)
+        if embed_batch:
+            submit_embeddings()
+        submit_uploads(reused_batch)
+        while embed_futures:
+            finish_embeddings(block=True)
+        # 업로드 오류가 있으면 여기서 예외로 전달
+        while upload_futures:
+            finish_uploads(block=True)
+    return chunk_entries, vectors, counts
@@ -0,0 +1,96 @@
+import os
+import json
+import hashlib
+from datetime import datetime, timezone
+
+from chunker import CHUNK_MIN_TOKENS, CHUNK_OVERLAP_TOKENS, CHUNK_TARGET_TOKENS, TOKENIZER_ENCODING
+
+# 증분 재색인 매니페스트
+# 논문(paper_prefix)마다 원본 PDF 해시와 청크 ID → {내용 해시, 페이지 범위, 청크 번호}를 Blob에 JSON으로 저장합니다.
+# 같은 파일이 다시 업로드되면 전체를 건너뛰고, 내용이 바뀐 경우에도 바뀐 청크만 임베딩/업로드하며
+# 더 이상 없는 청크 ID는 AI Search와 Blob에서 삭제합니다.
+# 청크 ID와 임베딩 재사용 키는 본문/섹션에서만 만들므로, 앞쪽에 페이지나 문단이 끼어들어도 뒤쪽 청크는
+# 같은 ID와 임베딩을 유지하고 바뀐 페이지 범위/번호만 (임베딩 없이) 다시 업로드합니다.
+
+MANIFEST_PREFIX = os.getenv("MANIFEST_PREFIX", "_manifests")
+# 청커 동작이 바뀌면 (같은 PDF라도) 다시 청크화해야 하므로 문서 키에 포함합니다
+CHUNKER_VERSION = 1
+
+
+def manifest_blob_name(paper_prefix):
+    return f"{MANIFEST_PREFIX}/{paper_prefix}.json"
+
+
+def document_key(pdf_sha256):
+    """PDF 내용 해시(sha256 hex) + 청커 설정 해시 (둘 다 같으면 결과 청크도 같음)"""
+    config = f"v{CHUNKER_VERSION}:{CHUNK_TARGET_TOKENS}:{CHUNK_OVERLAP_TOKENS}:{CHUNK_MIN_TOKENS}:{TOKENIZER_ENCODING}"
+    return hashlib.sha256(f"{pdf_sha256}:{config}".encode("utf-8")).hexdigest()
+
+
+def chunk_hash(chunk):
+    """청크 내용 해시 = 임베딩 재사용 키 (본문과 섹션만 사용, 페이지 번호가 밀려도 같은 값)"""
+    raw = json.dumps([chunk["text"], chunk["section"]], ensure_ascii=False)
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+def load_manifest(container_client, paper_prefix):
+    """저장된 매니페스트를 읽습니다. 없거나 읽을 수 없으면 None (전체 처리)."""
+    try:
+        data = container_client.download_blob(manifest_blob_name(paper_prefix)).readall()
+        return json.loads(data)
+    except Exception:
+        return None
+
+
+def save_manifest(container_client, paper_prefix, doc_key, chunk_entries):
+    manifest = {
+        "paper_prefix": paper_prefix,
+        "document_key": doc_key,
+        "chunks": chunk_entries,
+        "updated_at": datetime.now(timezone.utc).isoformat(),
+    }
+    container_client.upload_blob(
+        name=manifest_blob_name(paper_prefix),
+        data=json.dumps(manifest, ensure_ascii=False).encode("utf-8"),
+        overwrite=True
+    )
+    return manifest
+
+
+def chunk_id(paper_prefix, value, occurrence=0):
+    """내용 해시로 만든 청크 ID ({paper_prefix}-{해시 앞 16자}, 같은 내용이 여러 번 나오면 -2, -3 ...)"""
+    base = f"{paper_prefix}-{value[:16]}"
+    return base if occurrence == 0 else f"{base}-{occurrence + 1}"
+
+
+def chunk_entry(chunk, index):
+    """매니페스트에 저장하는 청크 정보 (내용 해시 + 위치 메타데이터)"""
+    return {"hash": chunk_hash(chunk), "pages": [chunk["page_start"], chunk["page_end"]], "index": index + 1}
+
+
+def diff_chunks(manifest, chunks, paper_prefix):
+    """청크를 하나씩 받아 이전 매니페스트와 비교하는 제너레이터 (문서 전체를 메모리에 올리지 않음)
+
+    Args:
+        manifest (dict | None): 이전 매니페스트
+        chunks (Iterable[dict]): 청커가 내보내는 청크
+        paper_prefix (str): 청크 ID 접두사
+
+    Yields:
+        tuple: (청크 번호, 청크 ID, 청크, 매니페스트 항목, 변경/신규 여부)
+        - 내용이 같은 청크는 위치가 밀려도 ID와 해시가 같으므로 임베딩은 샤드에서 재사용되고(vector_shard.vectors_by_hash),
+          페이지 범위나 번호가 바뀐 경우에만 변경으로 표시되어 메타데이터가 다시 업로드됩니다.
+    """
+    old = (manifest or {}).get("chunks", {})
+    seen = {}
+    for index, chunk in enumerate(chunks):
+        entry = chunk_entry(chunk, index)
+        occurrence = seen.get(entry["hash"], 0)
+        seen[entry["hash"]] = occurrence + 1
+        current_id = chunk_id(paper_prefix, entry["hash"], occurrence)
+        yield index, current_id, chunk, entry, old.get(current_id) != entry
+
+
+def orphaned_chunks(manifest, chunk_entries):
+    """새 청크 목록에 없는 이전 청크 ID 목록 (diff_chunks를 끝까지 읽은 뒤 호출)"""
+    return [old_id for old_id in (manifest or {}).get("chunks", {}) if old_id not in chunk_entries]
@@ -1,4 +1,5 @@
 import os
+import sys
 import json
 from azure.core.credentials import AzureKeyCredential
 from azure.search.documents import SearchClient
@@ -35,7 +36,26 @@ def search(query: str, top_k: int = 5):
         print(f"Content:\n{result['content'][:300]}...")
         print("-" * 50)
 
+# ─────────────── 🔹 로컬 샤드 검색 (AI Search 없이) ───────────────
+# 질문을 임베딩한 뒤 Blob의 임베딩 샤드(.npy)를 memory-map으로 읽어 코사인 유사도로 검색합니다.
+def search_local(query: str, top_k: int = 5):
+    from embedding_utils import container_client, get_embeddings
+    from vector_shard import search_shards
+
+    print(f"\n🔍 Query (local shards): {query}\n")
+    query_vector = get_embeddings([query])[0]
+    for i, hit in enumerate(search_shards(container_client, query_vector, top_k=top_k)):
+        chunk = json.loads(container_client.download_blob(f"{hit['id']}.json").readall())
+        print(f"[{i+1}] ID: {hit['id']} (score={hit['score']:.4f})")
+        print(f"Content:\n{chunk['chunk'][:300]}...")
+        print("-" * 50)
+
 # ─────────────── 🔹 테스트 실행 ───────────────
+# python search_test.py          → AI Search 검색
+# python search_test.py --local  → 임베딩 샤드 로컬 검색
 if __name__ == "__main__":
     user_query = input("검색할 내용을 입력하세요: ")
-    search(user_query)
+    if "--local" in sys.argv[1:]:
+        search_local(user_query)
+    else:
+        search(user_query)
@@ -0,0 +1,93 @@
+import unittest
+from unittest.mock import patch
+import sys
+import os
+
+import numpy as np
+
+# 상위 디렉토리를 import 경로에 추가
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# 모듈 로드 시 만드는 클라이언트용 환경 변수 (실제 연결은 만들지 않음)
+for key, value in {
+    "AZURE_OPENAI_API_KEY": "test",
+    "AZURE_OPENAI_ENDPOINT": "https://example.openai.azure.com",
+    "AZURE_OPENAI_EMBEDDING_API_VERSION": "2024-10-21",
+    "EMBEDDING_DIMENSION": "4",
+    "AZURE_STORAGE_CONNECTION_STRING": (
+        "DefaultEndpointsProtocol=https;AccountName=test;AccountKey=dGVzdA==;EndpointSuffix=core.windows.net"
+    ),
+    "BLOB_CONTAINER_NAME": "test",
+}.items():
+    os.environ.setdefault(key, value)
+
+import embedding_utils
+from manifest import chunk_hash, diff_chunks, orphaned_chunks
+
+
+def make_chunk(text, page, section="1 Introduction"):
+    return {"text": text, "section": section, "page_start": page, "page_end": page, "tokens": len(text.split())}
+
+
+class TestIncrementalIndex(unittest.TestCase):
+    """diff_chunks + embed_and_upload_changes: 페이지가 끼어들어도 바뀌지 않은 청크는 다시 임베딩하지 않음"""
+
+    def setUp(self):
+        self.embedded = []   # get_embeddings에 넘어간 텍스트 목록 (요청마다)
+        self.uploaded = []   # AI Search에 올린 문서 ID
+
+        def fake_embeddings(texts):
+            self.embedded.append(list(texts))
+            return [np.full(4, len(text), dtype=np.float32) for text in texts]
+
+        for target, replacement in [
+            ("get_embeddings", fake_embeddings),
+            ("upload_chunk_blob", lambda json_doc: None),
+            ("upload_search_batch", lambda docs: self.uploaded.extend(doc["id"] for doc in docs)),
+        ]:
+            patcher = patch.object(embedding_utils, target, side_effect=replacement)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def run_index(self, manifest, chunks, lookup=lambda value: None):
+        self.embedded, self.uploaded = [], []
+        return embedding_utils.embed_and_upload_changes("paper", diff_chunks(manifest, chunks, "paper"), lookup)
+
+    def test_inserted_page_reuses_embeddings(self):
+        chunks = [make_chunk(f"paragraph {n} body text", page) for n, page in enumerate([1, 1, 2, 3])]
+        entries, vectors, counts = self.run_index(None, chunks)
+        self.assertEqual(counts, {"changed": 4, "embedded": 4})
+        shard = {entry["hash"]: vector for entry, vector in zip(entries.values(), vectors)}
+
+        # 2쪽 앞에 새 페이지가 들어와 뒤쪽 청크의 페이지/번호가 하나씩 밀림
+        edited = chunks[:2] + [make_chunk("a new inserted page", 2)] + [
+            make_chunk(chunk["text"], chunk["page_start"] + 1) for chunk in chunks[2:]]
+        new_entries, new_vectors, counts = self.run_index({"chunks": entries}, edited, shard.get)
+
+        self.assertEqual(self.embedded, [["a new inserted page"]])
+        self.assertEqual(counts, {"changed": 3, "embedded": 1})
+        # 내용이 같은 청크는 ID가 그대로이고, 앞쪽 두 청크는 다시 업로드하지 않음
+        self.assertEqual(orphaned_chunks({"chunks": entries}, new_entries), [])
+        self.assertEqual(set(entries) - set(new_entries), set())
+        self.assertEqual(len(self.uploaded), 3)
+        self.assertFalse(set(list(entries)[:2]) & set(self.uploaded))
+        np.testing.assert_array_equal(new_vectors[3], vectors[2])
+
+    def test_unchanged_document_uploads_nothing(self):
+        chunks = [make_chunk(f"paragraph {n}", 1) for n in range(3)]
+        entries, vectors, _ = self.run_index(None, chunks)
+        shard = {entry["hash"]: vector for entry, vector in zip(entries.values(), vectors)}
+        _, _, counts = self.run_index({"chunks": entries}, chunks, shard.get)
+        self.assertEqual(counts, {"changed": 0, "embedded": 0})
+        self.assertEqual((self.embedded, self.uploaded), ([], []))
+
+    def test_duplicate_text_gets_distinct_ids(self):
+        chunks = [make_chunk("same text", 1), make_chunk("same text", 2)]
+        ids = [current_id for _, current_id, _, _, _ in diff_chunks(None, chunks, "paper")]
+        self.assertEqual(len(set(ids)), 2)
+        self.assertEqual(chunk_hash(chunks[0]), chunk_hash(chunks[1]))
+        self.assertTrue(all(current_id.startswith("paper-") for current_id in ids))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -1,6 +1,10 @@
 import os
+import time
+import random
 import requests
 import json
+from concurrent.futures import ThreadPoolExecutor
+from requests.adapters import HTTPAdapter
 from dotenv import load_dotenv
 
 load_dotenv()
@@ -10,34 +14,159 @@ SEARCH_SERVICE_ENDPOINT = os.getenv("AZURE_SEARCH_ENDPOINT")
 SEARCH_INDEX_NAME = os.getenv("AZURE_SEARCH_INDEX_NAME")      
 SEARCH_API_KEY = os.getenv("AZURE_SEARCH_ADMIN_KEY")
 
-def upload_documents_to_ai_search(documents):
-    """
-    AI Search에 문서 리스트 업로드
-    :param documents: JSON 형식의 문서 리스트 (각 문서는 'id', 'chunk', 'embedding', 'metadata' 포함)
+# 요청 하나에 담을 최대 문서 수 / 본문 바이트 수 (AI Search 제한: 1000개, 16MB)
+SEARCH_BATCH_MAX_DOCS = int(os.getenv("SEARCH_BATCH_MAX_DOCS", "500"))
+SEARCH_BATCH_MAX_BYTES = int(os.getenv("SEARCH_BATCH_MAX_BYTES", str(12 * 1024 * 1024)))
+# 동시에 보낼 배치 수 / 재시도 횟수 / 재시도 대기 기본값(초, 지수 증가)
+SEARCH_UPLOAD_CONCURRENCY = int(os.getenv("SEARCH_UPLOAD_CONCURRENCY", "4"))
+SEARCH_MAX_RETRIES = int(os.getenv("SEARCH_MAX_RETRIES", "5"))
+SEARCH_RETRY_BACKOFF = float(os.getenv("SEARCH_RETRY_BACKOFF", "1.0"))
+SEARCH_REQUEST_TIMEOUT = int(os.getenv("SEARCH_REQUEST_TIMEOUT", "60"))
+
+# 요청 전체를 다시 보낼 상태 코드 (제한/일시 장애) / 문서 단위로 다시 보낼 상태 코드
+RETRY_STATUS_CODES = {429, 502, 503, 504}
+RETRY_DOCUMENT_STATUS_CODES = {409, 422, 429, 503}
+
+# 연결을 재사용하는 세션 (동시 배치 수만큼 연결 유지)
+_session = requests.Session()
+_session.mount("https://", HTTPAdapter(pool_connections=1, pool_maxsize=SEARCH_UPLOAD_CONCURRENCY))
+
+
+def _index_endpoint():
+    return f"{SEARCH_SERVICE_ENDPOINT}/indexes/{SEARCH_INDEX_NAME}/docs/index?api-version=2023-11-01"
+
+
+def _backoff(attempt, retry_after=None):
+    """재시도 대기 시간: Retry-After 헤더가 있으면 그 값, 없으면 지수 증가 + 지터"""
+    if retry_after:
+        try:
+            return float(retry_after)
+        except ValueError:
+            pass
+    return SEARCH_RETRY_BACKOFF * (2 ** attempt) * (0.5 + random.random())
+
+
+def split_batches(actions, max_docs=SEARCH_BATCH_MAX_DOCS, max_bytes=SEARCH_BATCH_MAX_BYTES):
+    """문서 수와 JSON 본문 크기 제한에 맞게 나눕니다. (배치 목록, 배치별 바이트 수)를 내보냅니다."""
+    batch, size = [], 0
+    for action in actions:
+        action_size = len(json.dumps(action, ensure_ascii=False).encode("utf-8")) + 1
+        if batch and (len(batch) >= max_docs or size + action_size > max_bytes):
+            yield batch, size
+            batch, size = [], 0
+        batch.append(action)
+        size += action_size
+    if batch:
+        yield batch, size
+
+
+def _post_batch(actions):
+    """배치 하나를 보냅니다. 제한/일시 오류는 요청 전체를, 실패한 문서는 해당 문서만 다시 보냅니다.
+
+    Returns:
+        tuple: (성공 문서 수, [(문서 id, 오류 메시지), ...])
     """
     headers = {
         "Content-Type": "application/json",
         "api-key": SEARCH_API_KEY
     }
+    pending = actions
+    succeeded = 0
+    failed = []
+    for attempt in range(SEARCH_MAX_RETRIES + 1):
+        last_try = attempt == SEARCH_MAX_RETRIES
+        try:
+            response = _session.post(
+                _index_endpoint(),
+                headers=headers,
+                data=json.dumps({"value": pending}, ensure_ascii=False).encode("utf-8"),
+                timeout=SEARCH_REQUEST_TIMEOUT
+            )
+        except requests.RequestException as e:
+            if last_try:
+                return succeeded, failed + [(a["id"], str(e)) for a in pending]
+            time.sleep(_backoff(attempt))
+            continue
 
-    upload_body = {
-        "value": [
-            {
-                "@search.action": "upload",
-                "id": doc["id"],
-                "chunk": doc["chunk"],
-                "embedding": doc["embedding"],
-                "metadata_source": doc["metadata_source"],
-                "metadata_chunk_index": doc["metadata_chunk_index"]
-            }
-            for doc in documents
-        ]
-    }
+        if response.status_code in RETRY_STATUS_CODES and not last_try:
+            print(f"AI Search 제한/일시 오류 {response.status_code}, 재시도 {attempt + 1}/{SEARCH_MAX_RETRIES}")
+            time.sleep(_backoff(attempt, response.headers.get("Retry-After")))
+            continue
+        if response.status_code not in (200, 207):
+            message = f"{response.status_code} - {response.text[:300]}"
+            return succeeded, failed + [(a["id"], message) for a in pending]
+
+        # 200/207: 문서별 결과 확인
+        by_id = {a["id"]: a for a in pending}
+        retry = []
+        for result in response.json().get("value", []):
+            if result.get("status"):
+                succeeded += 1
+            elif result.get("statusCode") in RETRY_DOCUMENT_STATUS_CODES and not last_try:
+                retry.append(by_id[result["key"]])
+            else:
+                failed.append((result.get("key"), f"{result.get('statusCode')} - {result.get('errorMessage')}"))
+        if not retry:
+            return succeeded, failed
+        print(f"AI Search 문서 {len(retry)}개 실패, 재시도 {attempt + 1}/{SEARCH_MAX_RETRIES}")
+        pending = retry
+        time.sleep(_backoff(attempt))
+    return succeeded, failed
 
-    endpoint = f"{SEARCH_SERVICE_ENDPOINT}/indexes/{SEARCH_INDEX_NAME}/docs/index?api-version=2023-11-01"
-    response = requests.post(endpoint, headers=headers, data=json.dumps(upload_body))
 
-    if response.status_code == 200:
-        print(f"AI Search 업로드 성공! 업로드된 문서 수: {len(documents)}")
+def index_documents(actions, concurrency=SEARCH_UPLOAD_CONCURRENCY):
+    """@search.action이 들어 있는 문서 목록을 배치로 나눠 동시에 보내고 결과를 모읍니다.
+
+    Returns:
+        dict: {"succeeded": 성공 문서 수, "failed": [(id, 오류), ...], "seconds": 걸린 시간, "bytes": 보낸 바이트 수}
+    """
+    start = time.perf_counter()
+    batches = list(split_batches(actions))
+    total_bytes = sum(size for _, size in batches)
+    if len(batches) <= 1 or concurrency <= 1:
+        results = [_post_batch(batch) for batch, _ in batches]
     else:
-        print(f"업로드 실패: {response.status_code} - {response.text}")
+        with ThreadPoolExecutor(max_workers=min(concurrency, len(batches))) as pool:
+            results = list(pool.map(lambda item: _post_batch(item[0]), batches))
+
+    succeeded = sum(ok for ok, _ in results)
+    failed = [item for _, errors in results for item in errors]
+    seconds = time.perf_counter() - start
+    rate = succeeded / seconds if seconds else 0.0
+    print(
+        f"AI Search 색인: {succeeded}/{len(actions)}개 성공, 배치 {len(batches)}개, "
+        f"{total_bytes / 1024 / 1024:.1f}MB, {seconds:.2f}초 ({rate:.0f} docs/s)"
+    )
+    for doc_id, message in failed[:10]:
+        print(f"  실패 {doc_id}: {message}")
+    return {"succeeded": succeeded, "failed": failed, "seconds": seconds, "bytes": total_bytes}
+
+
+def upload_documents_to_ai_search(documents):
+    """
+    AI Search에 문서 리스트 업로드
+    :param documents: JSON 형식의 문서 리스트 (각 문서는 'id', 'chunk', 'embedding', 'metadata' 포함)
+    :return: 모든 문서가 업로드되었으면 True
+    """
+    actions = [
+        {
+            "@search.action": "upload",
+            "id": doc["id"],
+            "chunk": doc["chunk"],
+            "embedding": doc["embedding"],
+            "metadata_source": doc["metadata_source"],
+            "metadata_chunk_index": doc["metadata_chunk_index"]
+        }
+        for doc in documents
+    ]
+    return not index_documents(actions)["failed"]
+
+def delete_documents_from_ai_search(document_ids):
+    """
+    AI Search에서 문서 삭제 (재색인 후 더 이상 없는 청크 ID 정리)
+    :param document_ids: 삭제할 문서 id 리스트
+    """
+    if not document_ids:
+        return True
+    actions = [{"@search.action": "delete", "id": doc_id} for doc_id in document_ids]
+    return not index_documents(actions)["failed"]
@@ -0,0 +1,164 @@
+import io
+import os
+import json
+import logging
+import tempfile
+
+import numpy as np
+
+# 논문별 임베딩 샤드
+# 청크 임베딩을 JSON 숫자 목록 대신 논문 하나당 .npy 배열 하나(행 = 청크)로 Blob에 저장하고,
+# 청크 id/해시 등 메타데이터는 같은 이름의 .json에 둡니다. float32 배열도 JSON보다 약 5배 작고,
+# 읽을 때는 로컬 캐시 파일을 memory-map하므로 파싱 없이 필요한 행만 페이지 단위로 읽습니다.
+# - 재색인: 같은 내용의 청크는 샤드의 벡터를 그대로 AI Search에 다시 올리므로 원본(float32) 샤드에서만 재사용합니다.
+# - 검색: search_shards가 샤드를 memory-map으로 열어 AI Search 없이 코사인 유사도 상위 청크를 찾습니다.
+
+VECTOR_PREFIX = os.getenv("VECTOR_PREFIX", "_vectors")
+# 저장 형식 (float32: 원본 그대로 / float16: 절반 크기지만 재색인 때 재사용하지 않고 다시 임베딩)
+VECTOR_STORE_DTYPE = os.getenv("VECTOR_STORE_DTYPE", "float32")
+# 검색 때 한 번에 float32로 읽어 계산할 행 수 (memory-map에서 이만큼씩만 메모리에 올림)
+SHARD_SEARCH_BLOCK_ROWS = int(os.getenv("SHARD_SEARCH_BLOCK_ROWS", "4096"))
+# 내려받은 샤드를 두는 로컬 캐시 디렉터리
+VECTOR_CACHE_DIR = os.getenv("VECTOR_CACHE_DIR", os.path.join(tempfile.gettempdir(), "vector-shards"))
+
+
+def shard_blob_names(paper_prefix):
+    """(.npy 벡터 Blob 이름, .json 메타데이터 Blob 이름)"""
+    return f"{VECTOR_PREFIX}/{paper_prefix}.npy", f"{VECTOR_PREFIX}/{paper_prefix}.json"
+
+
+def save_shard(container_client, paper_prefix, rows, vectors, dtype=VECTOR_STORE_DTYPE):
+    """논문 하나의 임베딩 샤드를 저장합니다.
+
+    Args:
+        rows (list[dict]): 행 순서대로의 청크 메타데이터 (최소 "id", "hash")
+        vectors (np.ndarray): (행 수, 차원) 임베딩 배열
+    """
+    vectors = np.asarray(vectors, dtype=dtype)
+    if vectors.ndim != 2 or len(vectors) != len(rows):
+        raise ValueError(f"샤드 행 수 불일치: 벡터 {vectors.shape}, 메타데이터 {len(rows)}개")
+    npy_name, meta_name = shard_blob_names(paper_prefix)
+
+    buffer = io.BytesIO()
+    np.save(buffer, vectors, allow_pickle=False)
+    container_client.upload_blob(name=npy_name, data=buffer.getvalue(), overwrite=True)
+    meta = {
+        "paper_prefix": paper_prefix,
+        "dtype": str(vectors.dtype),
+        "dim": int(vectors.shape[1]),
+        "rows": rows,
+    }
+    # 메타데이터를 나중에 써서, 메타데이터가 있으면 벡터도 있도록 합니다
+    container_client.upload_blob(
+        name=meta_name,
+        data=json.dumps(meta, ensure_ascii=False).encode("utf-8"),
+        overwrite=True
+    )
+    return meta
+
+
+def load_shard(container_client, paper_prefix, cache_dir=VECTOR_CACHE_DIR):
+    """샤드를 로컬 캐시로 내려받아 memory-map으로 엽니다.
+
+    캐시 파일의 ETag가 Blob과 같으면 다시 내려받지 않습니다.
+
+    Returns:
+        tuple | None: (읽기 전용 memmap 벡터 배열, 메타데이터 dict), 샤드가 없거나 읽을 수 없으면 None
+    """
+    npy_name, meta_name = shard_blob_names(paper_prefix)
+    try:
+        meta = json.loads(container_client.download_blob(meta_name).readall())
+        os.makedirs(cache_dir, exist_ok=True)
+        local_path = os.path.join(cache_dir, f"{paper_prefix}.npy")
+        etag_path = f"{local_path}.etag"
+
+        blob_client = container_client.get_blob_client(npy_name)
+        etag = blob_client.get_blob_properties().etag
+        cached_etag = None
+        if os.path.exists(local_path) and os.path.exists(etag_path):
+            with open(etag_path, encoding="utf-8") as f:
+                cached_etag = f.read().strip()
+        if cached_etag != etag:
+            # 임시 파일에 받은 뒤 이름을 바꿔, 다른 프로세스가 반쯤 받은 파일을 열지 않도록 합니다
+            tmp_path = f"{local_path}.{os.getpid()}.part"
+            with open(tmp_path, "wb") as f:
+                blob_client.download_blob().readinto(f)
+            os.replace(tmp_path, local_path)
+            with open(etag_path, "w", encoding="utf-8") as f:
+                f.write(etag)
+
+        vectors = np.load(local_path, mmap_mode="r", allow_pickle=False)
+        if len(vectors) != len(meta.get("rows", [])):
+            logging.warning(f"[SHARD] {paper_prefix}: 벡터/메타데이터 행 수가 달라 무시합니다")
+            return None
+        return vectors, meta
+    except Exception as e:
+        logging.info(f"[SHARD] {paper_prefix}: 샤드 없음 또는 읽기 실패 ({e})")
+        return None
+
+
+def vectors_by_hash(shard):
+    """샤드에서 청크 해시 → float32 벡터를 찾는 함수를 만듭니다 (없으면 None 반환).
+
+    float16 등 원본이 아닌 샤드의 벡터는 AI Search에 다시 올리면 정밀도가 떨어지므로 재사용하지 않습니다.
+    """
+    if shard is None:
+        return lambda value: None
+    vectors, meta = shard
+    if vectors.dtype != np.float32:
+        logging.info(f"[SHARD] {meta.get('paper_prefix')}: {vectors.dtype} 샤드라 임베딩을 재사용하지 않습니다")
+        return lambda value: None
+    row_of = {row["hash"]: i for i, row in enumerate(meta["rows"]) if row.get("hash")}
+
+    def lookup(value):
+        i = row_of.get(value)
+        return None if i is None else np.array(vectors[i], dtype=np.float32)
+    return lookup
+
+
+def list_shards(container_client):
+    """저장된 샤드의 paper_prefix 목록"""
+    prefix = f"{VECTOR_PREFIX}/"
+    return sorted(
+        blob.name[len(prefix):-len(".json")]
+        for blob in container_client.list_blobs(name_starts_with=prefix)
+        if blob.name.endswith(".json")
+    )
+
+
+def search_shards(container_client, query_vector, top_k=5, paper_prefixes=None):
+    """샤드 벡터에서 질문 임베딩과 코사인 유사도가 높은 청크를 찾습니다.
+
+    샤드는 load_shard로 memory-map해 SHARD_SEARCH_BLOCK_ROWS행씩만 읽으므로, 논문이 많아도
+    전체 벡터를 한 번에 메모리에 올리지 않습니다.
+
+    Args:
+        query_vector: 질문 임베딩 (1차원)
+        top_k (int): 반환할 청크 수
+        paper_prefixes (list[str] | None): 검색할 논문 (None이면 저장된 샤드 전체)
+
+    Returns:
+        list[dict]: {"id", "paper_prefix", "chunk_index", "score"} 목록 (유사도 내림차순)
+    """
+    query = np.asarray(query_vector, dtype=np.float32).ravel()
+    query = query / (np.linalg.norm(query) or 1.0)
+    best = []  # (점수, paper_prefix, 메타데이터 행)
+    for paper_prefix in (list_shards(container_client) if paper_prefixes is None else paper_prefixes):
+        shard = load_shard(container_client, paper_prefix)
+        if shard is None:
+            continue
+        vectors, meta = shard
+        if vectors.shape[1] != len(query):
+            logging.warning(f"[SHARD] {paper_prefix}: 차원이 달라 건너뜁니다 ({vectors.shape[1]} != {len(query)})")
+            continue
+        for start in range(0, len(vectors), SHARD_SEARCH_BLOCK_ROWS):
+            block = np.asarray(vectors[start:start + SHARD_SEARCH_BLOCK_ROWS], dtype=np.float32)
+            norms = np.linalg.norm(block, axis=1)
+            scores = block @ query / np.where(norms == 0, 1.0, norms)
+            for i in np.argsort(-scores)[:top_k]:
+                best.append((float(scores[i]), paper_prefix, meta["rows"][start + i]))
+            best = sorted(best, key=lambda item: item[0], reverse=True)[:top_k]
+    return [
+        {"id": row["id"], "paper_prefix": paper_prefix, "chunk_index": row.get("chunk_index"), "score": score}
+        for score, paper_prefix, row in best
+    ]
@@ -0,0 +1,156 @@
+import os
+import time
+import logging
+import threading
+from collections import deque
+from contextlib import contextmanager
+
+import pyodbc
+
+# pyodbc 연결 풀
+# 같은 워커 프로세스의 모든 호출이 연결을 공유하여, 요청마다 Azure SQL에 TLS + 로그인하는 비용을 없앱니다.
+# Azure SQL은 유휴 연결을 일정 시간(약 30분) 후 끊으므로, 오래 쉬었던 연결은 꺼내기 전에 상태를 확인합니다.
+
+SQL_POOL_MAX_SIZE = int(os.environ.get("SQL_POOL_MAX_SIZE", "8"))
+# 호스트 시작 시 미리 열어 둘 연결 수
+SQL_POOL_MIN_SIZE = int(os.environ.get("SQL_POOL_MIN_SIZE", "1"))
+# 로그인 타임아웃(초)
+SQL_CONNECT_TIMEOUT = int(os.environ.get("SQL_CONNECT_TIMEOUT", "30"))
+# 풀이 가득 찼을 때 연결 반환을 기다리는 최대 시간(초)
+SQL_POOL_ACQUIRE_TIMEOUT = float(os.environ.get("SQL_POOL_ACQUIRE_TIMEOUT", "30"))
+# 이 시간(초) 이상 쉬었던 연결은 SELECT 1로 상태 확인 후 사용
+SQL_POOL_HEALTH_CHECK_IDLE = float(os.environ.get("SQL_POOL_HEALTH_CHECK_IDLE", "60"))
+# 이 시간(초) 이상 쉬었던 연결은 Azure SQL이 이미 끊었을 가능성이 높으므로 바로 폐기
+SQL_POOL_MAX_IDLE = float(os.environ.get("SQL_POOL_MAX_IDLE", "1500"))
+
+# 연결이 끊어졌음을 나타내는 ODBC SQLSTATE
+DISCONNECT_SQLSTATES = {"08S01", "08001", "08003", "08004", "08007", "HYT01"}
+
+logger = logging.getLogger(__name__)
+
+
+def is_disconnect_error(error):
+    """pyodbc 예외가 연결 끊김(재연결 필요)에 해당하는지 확인합니다."""
+    if not isinstance(error, pyodbc.Error) or not error.args:
+        return False
+    return str(error.args[0]) in DISCONNECT_SQLSTATES
+
+
+class ConnectionPool:
+    """상태 확인과 최대 크기 제한이 있는 pyodbc 연결 풀
+
+    Args:
+        conn_str_factory: 연결 문자열을 반환하는 함수 (환경 변수는 실제 연결 시점에 읽습니다)
+        max_size (int): 동시에 열 수 있는 최대 연결 수
+        min_size (int): warm()으로 미리 열어 둘 연결 수
+    """
+
+    def __init__(self, conn_str_factory, max_size=SQL_POOL_MAX_SIZE, min_size=SQL_POOL_MIN_SIZE):
+        self._conn_str_factory = conn_str_factory
+        self.max_size = max_size
+        self.min_size = min(min_size, max_size)
+        self._idle = deque()  # (connection, 마지막 반환 시각)
+        self._lock = threading.Lock()
+        self._slots = threading.BoundedSemaphore(max_size)
+
+    def _connect(self):
+        conn = pyodbc.connect(self._conn_str_factory(), timeout=SQL_CONNECT_TIMEOUT)
+        conn.autocommit = True  # 조회 전용이므로 트랜잭션을 열어 두지 않습니다
+        return conn
+
+    def _is_healthy(self, conn):
+        cursor = None
+        try:
+            cursor = conn.cursor()
+            cursor.execute("SELECT 1")
+            cursor.fetchone()
+            return True
+        except pyodbc.Error:
+            return False
+        finally:
+            if cursor is not None:
+                try:
+                    cursor.close()
+                except pyodbc.Error:
+                    pass
+
+    def _close_quietly(self, conn):
+        try:
+            conn.close()
+        except pyodbc.Error:
+            pass
+
+    def acquire(self):
+        """풀에서 연결을 꺼냅니다. 쉬고 있는 연결이 없으면 새로 연결합니다.
+
+        Raises:
+            TimeoutError: SQL_POOL_ACQUIRE_TIMEOUT 안에 연결을 얻지 못한 경우
+        """
+        if not self._slots.acquire(timeout=SQL_POOL_ACQUIRE_TIMEOUT):
+            raise TimeoutError(f"SQL 연결 풀 대기 시간 초과 (최대 {self.max_size}개 사용 중)")
+        try:
+            while True:
+                with self._lock:
+                    if not self._idle:
+                        break
+                    conn, released_at = self._idle.pop()  # 가장 최근에 반환된 연결부터 사용
+                idle_for = time.monotonic() - released_at
+                if idle_for > SQL_POOL_MAX_IDLE:
+                    self._close_quietly(conn)
+                    continue
+                if idle_for > SQL_POOL_HEALTH_CHECK_IDLE and not self._is_healthy(conn):
+                    logger.info(f"끊어진 SQL 연결 폐기 ({idle_for:.0f}초 유휴)")
+                    self._close_quietly(conn)
+                    continue
+                return conn
+            return self._connect()
+        except Exception:
+            self._slots.release()
+            raise
+
+    def release(self, conn, discard=False):
+        """연결을 풀에 반환합니다. discard=True이면 연결을 닫고 버립니다."""
+        try:
+            if discard:
+                self._close_quietly(conn)
+            else:
+                with self._lock:
+                    self._idle.append((conn, time.monotonic()))
+        finally:
+            self._slots.release()
+
+    @contextmanager
+    def connection(self):
+        """with 블록 동안 연결을 빌려 줍니다. 연결 끊김 오류가 발생하면 해당 연결은 폐기합니다."""
+        conn = self.acquire()
+        discard = False
+        try:
+            yield conn
+        except Exception as e:
+            discard = is_disconnect_error(e)
+            raise
+        finally:
+            self.release(conn, discard=discard)
+
+    def warm(self):
+        """min_size 개수만큼 연결을 미리 열어 둡니다."""
+        opened = []
+        try:
+            while len(opened) + len(self._idle) < self.min_size:
+                opened.append(self.acquire())
+        except Exception as e:
+            logger.warning(f"SQL 연결 풀 예열 실패: {e}")
+        finally:
+            for conn in opened:
+                self.release(conn)
+        logger.info(f"SQL 연결 풀 예열 완료: {len(self._idle)}개 대기 중")
+
+    def warm_async(self):
+        """호스트 시작을 막지 않도록 백그라운드 스레드에서 예열합니다."""
+        threading.Thread(target=self.warm, name="sql-pool-warmup", daemon=True).start()
+
+    def close_all(self):
+        with self._lock:
+            idle, self._idle = list(self._idle), deque()
+        for conn, _ in idle:
+            self._close_quietly(conn)
@@ -2,9 +2,69 @@ import azure.functions as func
 import pyodbc
 import os
 import json
+import time
+import logging
+from query_result_cache import QueryResultCache
+from db_pool import ConnectionPool
+from query_catalog import QueryCatalog
 
 app = func.FunctionApp(http_auth_level=func.AuthLevel.FUNCTION)  # 필요시 ANONYMOUS 로 변경
 
+# SQL 연결 문자열 (연결 풀이 새 연결을 열 때 호출)
+def build_connection_string():
+    server = os.environ["SQL_SERVER"]
+    database = os.environ["SQL_DATABASE"]
+    username = os.environ["SQL_USERNAME"]
+    password = os.environ["SQL_PASSWORD"]
+    driver = "ODBC Driver 18 for SQL Server"
+    return f"DRIVER={driver};SERVER={server};DATABASE={database};UID={username};PWD={password}"
+
+# 배치 요청 한 번에 받을 수 있는 최대 질문 수
+SQL_BATCH_MAX_QUESTIONS = int(os.environ.get("SQL_BATCH_MAX_QUESTIONS", "20"))
+
+# 쿼리 결과 캐시 (적재 워터마크가 바뀌기 전까지 같은 쿼리 결과 재사용)
+result_cache = QueryResultCache()
+# 워커 프로세스 단위로 공유하는 연결 풀 (호스트 시작 시 예열)
+db_pool = ConnectionPool(build_connection_string)
+db_pool.warm_async()
+# 질문 → 분석 쿼리 카탈로그 (적재 워터마크가 바뀌면 자주 쓰는 결과를 미리 계산)
+query_catalog = QueryCatalog()
+
+# 쿼리를 실행하고 행마다 {컬럼: 값} dict 목록으로 반환하는 함수
+def execute_query(conn, query, params=None):
+    cursor = conn.cursor()
+    try:
+        if params:
+            cursor.execute(query, params)
+        else:
+            cursor.execute(query)
+        rows = cursor.fetchall()
+        columns = [column[0] for column in cursor.description]
+        return [dict(zip(columns, row)) for row in rows]
+    finally:
+        cursor.close()
+
+# 적재 워터마크를 확인하고, 적재 후 처음 들어온 요청이면 카탈로그 쿼리 사전 계산을 백그라운드로 시작하는 함수
+def refresh_catalog(conn):
+    watermark = result_cache.watermark(conn)
+    if query_catalog.needs_refresh(watermark):
+        query_catalog.refresh_async(db_pool.connection, watermark, execute_query)
+    return watermark
+
+# 카탈로그 쿼리 결과를 사전 계산 결과 → 결과 캐시 → 실제 실행 순으로 찾는 함수
+def run_catalog_query(conn, entry, params, watermark):
+    query = entry["sql"]
+    query_params = query_catalog.bind(entry, params)
+    result = query_catalog.materialized(entry, params, watermark)
+    if result is not None:
+        return result, "materialized"
+    result = result_cache.get(query, query_params, watermark)
+    if result is not None:
+        return result, "cache"
+    result = execute_query(conn, query, query_params)
+    result_cache.put(query, query_params, watermark, result)
+    return result, "query"
+
 @app.function_name(name="SqlQueryFunction")
 @app.route(route="sqlquery")  # 호출 경로: /api/sqlquery
 def sql_query_function(req: func.HttpRequest) -> func.HttpResponse:
@@ -14,69 +74,104 @@ def sql_query_function(req: func.HttpRequest) -> func.HttpResponse:
     except Exception as e:
         return func.HttpResponse(f"Invalid request body: {e}", status_code=400)
 
-    # 간단한 질문 → 쿼리 매핑
-        # 질문 → 쿼리 매핑
-    if "상품별 평균 가격" in user_question:
-        query = """
-        SELECT v2ProductName, AVG(productPrice) AS avgPrice
-        FROM [ga_data].[HitsProduct]
-        GROUP BY v2ProductName
-        """
-    elif "새 방문자 수" in user_question:
-        query = """
-        SELECT COUNT(*) as new_user_count
-        FROM [ga_data].[Totals]
-        WHERE newVisits = 1
-        """
-    elif "채널별 사용자 수" in user_question or "방문 채널" in user_question:
-        query = """
-        SELECT 'browser' as channel_type, browser as channel_name, count(visitorId) as user_count
-        FROM [ga_data].[DeviceGeo]
-        GROUP BY browser
-
-        UNION ALL
-
-        SELECT 'deviceCategory' as channel_type, deviceCategory as channel_name, count(visitorId) as user_count
-        FROM [ga_data].[DeviceGeo]
-        GROUP BY deviceCategory
+    if not user_question:
+        return func.HttpResponse(
+            json.dumps({"error": "질문을 입력해주세요."}, ensure_ascii=False),
+            status_code=400,
+            mimetype="application/json"
+        )
 
-        UNION ALL
-        
-        SELECT 'operatingSystem' as channel_type, operatingSystem as channel_name, count(visitorId) as user_count
-        FROM [ga_data].[DeviceGeo]
-        GROUP BY operatingSystem
-        """
-    else:
+    # 질문 → 카탈로그 쿼리 매핑 (퍼지/임베딩 매칭)
+    matched = query_catalog.match(user_question)
+    if matched is None:
         return func.HttpResponse(
-            json.dumps({"error": "지원하지 않는 질문입니다."}, ensure_ascii=False),
+            json.dumps({
+                "error": "지원하지 않는 질문입니다.",
+                "suggestions": query_catalog.suggestions(user_question)
+            }, ensure_ascii=False),
             status_code=400,
             mimetype="application/json"
         )
+    entry, params, score = matched
+    logging.info(f"카탈로그 쿼리 매칭: {entry['name']} (score={score:.2f}, params={params})")
 
+    try:
+        connect_start = time.time()
+        with db_pool.connection() as conn:
+            query_start = time.time()
+            watermark = refresh_catalog(conn)
+            result, source = run_catalog_query(conn, entry, params, watermark)
+            query_end = time.time()
 
-    # SQL 연결 정보
-    server = os.environ["SQL_SERVER"]
-    database = os.environ["SQL_DATABASE"]
-    username = os.environ["SQL_USERNAME"]
-    password = os.environ["SQL_PASSWORD"]
-    driver = "ODBC Driver 18 for SQL Server"
+        # 응답 본문(목록) 형식은 유지하고, 연결/쿼리 시간은 헤더로 전달합니다
+        connect_time = query_start - connect_start
+        query_time = query_end - query_start
+        logging.info(f"SqlQueryFunction 완료 ({source}): 연결 {connect_time:.3f}s, 쿼리 {query_time:.3f}s")
+        return func.HttpResponse(
+            json.dumps(result, ensure_ascii=False, default=str), # date 컬럼(일별 쿼리)은 문자열로
+            status_code=200,
+            mimetype="application/json",
+            headers={
+                "X-Connect-Time": f"{connect_time:.3f}s",
+                "X-Query-Time": f"{query_time:.3f}s",
+                "X-Catalog-Query": entry["name"],
+                "X-Result-Source": source
+            }
+        )
+    except Exception as e:
+        return func.HttpResponse(
+            json.dumps({"error": str(e)}, ensure_ascii=False),
+            status_code=500,
+            mimetype="application/json"
+        )
 
+@app.function_name(name="SqlBatchQueryFunction")
+@app.route(route="sqlquery/batch", methods=["POST"])  # 호출 경로: /api/sqlquery/batch
+def sql_batch_query_function(req: func.HttpRequest) -> func.HttpResponse:
+    # 요청: {"questions": ["상품별 평균 가격", "daily_sessions", ...]} - 질문 또는 카탈로그 쿼리 이름
+    # 응답: {"질문": [...결과 행...] 또는 {"error": ...}} - 모든 쿼리를 연결 하나로 순서대로 실행
     try:
-        with pyodbc.connect(
-            f"DRIVER={driver};SERVER={server};DATABASE={database};UID={username};PWD={password}",
-            timeout=5
-        ) as conn:
-            cursor = conn.cursor()
-            cursor.execute(query)
-            rows = cursor.fetchall()
-            columns = [column[0] for column in cursor.description]
-            result = [dict(zip(columns, row)) for row in rows]
+        questions = req.get_json().get('questions')
+    except Exception as e:
+        return func.HttpResponse(f"Invalid request body: {e}", status_code=400)
+    if not isinstance(questions, list) or not questions or not all(isinstance(q, str) and q for q in questions):
+        return func.HttpResponse(
+            json.dumps({"error": "questions에 질문 또는 카탈로그 쿼리 이름 목록을 입력해주세요."}, ensure_ascii=False),
+            status_code=400,
+            mimetype="application/json"
+        )
+    if len(questions) > SQL_BATCH_MAX_QUESTIONS:
+        return func.HttpResponse(
+            json.dumps({"error": f"한 번에 최대 {SQL_BATCH_MAX_QUESTIONS}개까지 요청할 수 있습니다."}, ensure_ascii=False),
+            status_code=400,
+            mimetype="application/json"
+        )
 
-            return func.HttpResponse(
-                json.dumps(result, ensure_ascii=False),
-                status_code=200,
-                mimetype="application/json"
-            )
+    results = {}
+    try:
+        start = time.time()
+        with db_pool.connection() as conn:
+            watermark = refresh_catalog(conn)
+            for question in dict.fromkeys(questions):
+                if question in query_catalog.entries:
+                    entry = query_catalog.entries[question]
+                    params = dict(entry["params"])
+                else:
+                    matched = query_catalog.match(question)
+                    if matched is None:
+                        results[question] = {"error": "지원하지 않는 질문입니다.", "suggestions": query_catalog.suggestions(question)}
+                        continue
+                    entry, params, _ = matched
+                try:
+                    results[question], _ = run_catalog_query(conn, entry, params, watermark)
+                except pyodbc.ProgrammingError as e:
+                    results[question] = {"error": str(e)}
+        logging.info(f"SqlBatchQueryFunction 완료: {len(results)}개, {time.time() - start:.3f}s")
+        return func.HttpResponse(
+            json.dumps(results, ensure_ascii=False, default=str),
+            status_code=200,
+            mimetype="application/json"
+        )
     except Exception as e:
         return func.HttpResponse(
             json.dumps({"error": str(e)}, ensure_ascii=False),
@@ -0,0 +1,448 @@
+import os
+import re
+import math
+import time
+import logging
+import threading
+import unicodedata
+from difflib import SequenceMatcher
+
+import requests
+
+# 질문 → 분석 쿼리 라우팅 카탈로그
+# 마케터가 자주 묻는 질문을 이름이 있는 파라미터 쿼리로 등록해 두고, 질문을 한국어/영어 표현과
+# 퍼지 매칭(필요하면 임베딩 유사도)으로 연결합니다. materialize=True인 쿼리는 적재 워터마크가 바뀔 때
+# 백그라운드에서 미리 실행해 두므로, 적재 직후에도 기본 테이블을 다시 읽지 않고 바로 응답합니다.
+
+# 퍼지 점수가 높아도 질문에 쿼리가 다루지 않는 측정값/차원(예: "전환율", "카테고리별")이나
+# 바인딩할 수 없는 기간/필터 조건(예: "2017년", "이번달", "모바일")이 있으면 매칭하지 않고 NL→SQL로 넘깁니다.
+
+# 이 점수 이상이어야 카탈로그 쿼리로 인정 (0~1)
+QUERY_CATALOG_MIN_SCORE = float(os.environ.get("QUERY_CATALOG_MIN_SCORE", "0.8"))
+# 퍼지 매칭이 실패했을 때 사용하는 임베딩 코사인 유사도 하한
+QUERY_CATALOG_MIN_SIMILARITY = float(os.environ.get("QUERY_CATALOG_MIN_SIMILARITY", "0.8"))
+# 질문에서 읽은 행 수(TOP N)의 상한
+QUERY_CATALOG_MAX_LIMIT = int(os.environ.get("QUERY_CATALOG_MAX_LIMIT", "100"))
+
+# 등록된 분석 쿼리
+# - phrasings: 매칭에 쓰는 대표 질문 표현 (한국어/영어)
+# - terms: 이 쿼리가 답하는 측정값/차원 (TERMS의 이름). 질문에 나온 측정값/차원이 모두 여기에 있어야 매칭됩니다
+# - params: 파라미터 이름 → 기본값. 현재는 TOP (?)에 바인딩되는 limit만 지원합니다
+# - materialize: 적재 후 기본 파라미터로 미리 실행해 둘지 여부
+CATALOG = [
+    {
+        "name": "avg_price_by_product",
+        "phrasings": ["상품별 평균 가격", "제품별 평균 가격", "average price by product", "average product price"],
+        "sql": """
+        SELECT v2ProductName, AVG(productPrice) AS avgPrice
+        FROM [ga_data].[HitsProduct]
+        GROUP BY v2ProductName
+        """,
+        "terms": {"price", "product"},
+        "params": {},
+        "materialize": True,
+    },
+    {
+        "name": "new_visitor_count",
+        "phrasings": ["새 방문자 수", "신규 방문자 수", "신규 사용자 수", "new visitor count", "number of new users"],
+        "sql": """
+        SELECT COUNT(*) as new_user_count
+        FROM [ga_data].[Totals]
+        WHERE newVisits = 1
+        """,
+        "terms": {"new_users"},
+        "params": {},
+        "materialize": True,
+    },
+    {
+        "name": "users_by_channel",
+        "phrasings": ["채널별 사용자 수", "방문 채널별 사용자 수", "브라우저 기기 운영체제별 사용자 수", "users by channel", "users by browser device and os"],
+        "sql": """
+        SELECT 'browser' as channel_type, browser as channel_name, count(visitorId) as user_count
+        FROM [ga_data].[DeviceGeo]
+        GROUP BY browser
+
+        UNION ALL
+
+        SELECT 'deviceCategory' as channel_type, deviceCategory as channel_name, count(visitorId) as user_count
+        FROM [ga_data].[DeviceGeo]
+        GROUP BY deviceCategory
+
+        UNION ALL
+
+        SELECT 'operatingSystem' as channel_type, operatingSystem as channel_name, count(visitorId) as user_count
+        FROM [ga_data].[DeviceGeo]
+        GROUP BY operatingSystem
+        """,
+        "terms": {"users", "channel", "browser", "device", "os"},
+        "params": {},
+        "materialize": True,
+    },
+    {
+        "name": "sessions_by_channel_grouping",
+        "phrasings": ["유입 채널별 세션 수", "채널 그룹별 세션 수", "sessions by channel grouping", "sessions by default channel"],
+        "sql": """
+        SELECT channelGrouping, COUNT(*) AS session_count
+        FROM [ga_data].[Sessions]
+        GROUP BY channelGrouping
+        ORDER BY session_count DESC
+        """,
+        "terms": {"sessions", "channel_grouping", "channel"},
+        "params": {},
+        "materialize": True,
+    },
+    {
+        "name": "daily_sessions",
+        "phrasings": ["일별 세션 수", "날짜별 방문 수", "일별 방문자 추이", "daily sessions", "sessions per day"],
+        "sql": """
+        SELECT date, COUNT(*) AS session_count, COUNT(DISTINCT fullVisitorId) AS visitor_count
+        FROM [ga_data].[Sessions]
+        GROUP BY date
+        ORDER BY date
+        """,
+        "terms": {"sessions", "users", "day"},
+        "params": {},
+        "materialize": True,
+    },
+    {
+        "name": "daily_revenue",
+        "phrasings": ["일별 매출", "날짜별 수익", "일별 거래 수", "daily revenue", "revenue per day"],
+        "sql": """
+        SELECT s.date, SUM(t.transactions) AS transactions, SUM(t.totalTransactionRevenue) AS revenue
+        FROM [ga_data].[Sessions] s
+        JOIN [ga_data].[Totals] t ON t.session_key = s.session_key
+        GROUP BY s.date
+        ORDER BY s.date
+        """,
+        "terms": {"revenue", "transactions", "day"},
+        "params": {},
+        "materialize": True,
+    },
+    {
+        "name": "bounce_rate_by_device",
+        "phrasings": ["기기별 이탈률", "디바이스별 이탈률", "bounce rate by device"],
+        "sql": """
+        SELECT d.deviceCategory, COUNT(*) AS session_count,
+               CAST(SUM(ISNULL(t.bounces, 0)) AS FLOAT) / NULLIF(COUNT(*), 0) AS bounce_rate
+        FROM [ga_data].[DeviceGeo] d
+        JOIN [ga_data].[Totals] t ON t.session_key = d.session_key
+        GROUP BY d.deviceCategory
+        """,
+        "terms": {"bounce", "sessions", "device"},
+        "params": {},
+        "materialize": True,
+    },
+    {
+        "name": "top_products_by_revenue",
+        "phrasings": ["매출 상위 상품", "수익이 높은 상품", "가장 많이 팔린 상품", "top products by revenue", "best selling products"],
+        "sql": """
+        SELECT TOP (?) v2ProductName, SUM(productRevenue) AS revenue, COUNT(*) AS hit_count
+        FROM [ga_data].[HitsProduct]
+        GROUP BY v2ProductName
+        ORDER BY revenue DESC
+        """,
+        "terms": {"revenue", "sold", "product"},
+        "params": {"limit": 10},
+        "materialize": True,
+    },
+    {
+        "name": "sessions_by_country",
+        "phrasings": ["국가별 세션 수", "나라별 방문자 수", "국가별 방문 수", "sessions by country", "visitors by country"],
+        "sql": """
+        SELECT TOP (?) country, COUNT(*) AS session_count
+        FROM [ga_data].[DeviceGeo]
+        GROUP BY country
+        ORDER BY session_count DESC
+        """,
+        "terms": {"sessions", "users", "country"},
+        "params": {"limit": 20},
+        "materialize": True,
+    },
+    {
+        "name": "sessions_by_source_medium",
+        "phrasings": ["유입 소스 매체별 세션 수", "트래픽 소스별 방문 수", "sessions by source and medium", "traffic sources"],
+        "sql": """
+        SELECT TOP (?) source, medium, COUNT(*) AS session_count
+        FROM [ga_data].[Traffic]
+        GROUP BY source, medium
+        ORDER BY session_count DESC
+        """,
+        "terms": {"sessions", "source"},
+        "params": {"limit": 20},
+        "materialize": True,
+    },
+]
+
+# 측정값/차원 이름 → 질문에서 찾을 표현. 한국어는 띄어쓰기와 상관없이, 영어는 단어 시작에서만(복수형 허용) 찾고,
+# 긴 표현부터 찾아 지운 뒤 다음 표현을 찾습니다 ("신규 방문자"가 "방문자"/"방문"으로 다시 잡히지 않도록)
+TERMS = {
+    # 측정값
+    "sessions": ["세션", "방문", "session", "visit"],
+    "users": ["사용자", "방문자", "유저", "고객", "user", "visitor"],
+    "new_users": ["신규방문자", "새방문자", "신규사용자", "새사용자", "신규유저", "신규고객", "new visitor", "new user"],
+    "revenue": ["매출", "수익", "수입", "revenue", "sales"],
+    "transactions": ["거래", "주문", "구매", "transaction", "order", "purchase"],
+    "sold": ["팔린", "판매", "수량", "sold", "selling", "quantity"],
+    "price": ["가격", "단가", "price"],
+    "bounce": ["이탈", "bounce"],
+    "conversion": ["전환", "conversion"],
+    "pageviews": ["페이지뷰", "페이지", "조회수", "pageview", "page view"],
+    "duration": ["체류", "머문", "시간", "duration", "time on site"],
+    # 차원
+    "product": ["상품", "제품", "product"],
+    "category": ["상품카테고리", "카테고리", "분류", "category"],
+    "brand": ["브랜드", "brand"],
+    "channel_grouping": ["유입채널", "채널그룹", "channel grouping", "default channel"],
+    "channel": ["방문채널", "채널", "channel"],
+    "source": ["트래픽소스", "유입경로", "소스", "매체", "트래픽", "source", "medium", "traffic"],
+    "country": ["국가", "나라", "country"],
+    "city": ["도시", "city"],
+    "region": ["지역", "대륙", "region", "continent"],
+    "device": ["디바이스", "기기", "장치", "device"],
+    "browser": ["브라우저", "browser"],
+    "os": ["운영체제", "operating system"],
+    "day": ["일별", "날짜", "일자", "하루", "daily", "per day", "by day"],
+    "week": ["주별", "weekly"],
+    "month": ["월별", "매월", "monthly"],
+    "hour": ["시간대", "hourly", "hour"],
+}
+
+# 카탈로그 쿼리가 바인딩할 수 없는 기간 조건 (연도, 특정 월/일, 상대 기간)
+_DATE_FILTER_RE = re.compile(
+    r"(?:19|20)\d{2}|\d{1,2}\s*(?:월(?!별)|일(?!별)|주|개월|분기)"
+    r"|오늘|어제|그제|이번\s*(?:달|주|해|분기)|지난\s*(?:달|주|해|분기)|작년|올해|금년|전년|최근|상반기|하반기|주말|평일|부터|까지"
+    r"|\b(?:today|yesterday|since|between|ytd|q[1-4]|january|february|march|april|june|july|august|september|october|november|december)\b"
+    r"|\b(?:this|last|past|previous)\s+(?:\d+\s+)?(?:day|week|month|quarter|year)s?\b"
+)
+# 특정 값으로 거르는 조건 (기기/브라우저/채널/국가 값, 제외/한정 표현)
+_VALUE_FILTER_RE = re.compile(
+    r"제외|빼고|말고|에서\s*(?:온|유입)|모바일|데스크[톱탑]|태블릿|크롬|사파리|파이어폭스|안드로이드|아이폰|윈도우|오가닉"
+    r"|미국|한국|일본|중국|영국|캐나다|인도|독일|프랑스"
+    r"|\b(?:only|excluding|except|without|where|mobile|desktop|tablet|chrome|safari|firefox|android|ios|iphone"
+    r"|windows|macintosh|organic|referral|direct|paid|cpc|usa|united states)\b"
+)
+
+_NUMBER_RE = re.compile(r"(?<![A-Za-z0-9.])\d{1,3}(?![A-Za-z0-9.])")
+
+logger = logging.getLogger(__name__)
+
+
+def _normalize(text):
+    """NFKC + 소문자, 숫자/문장부호/공백 제거 (한국어는 띄어쓰기가 제각각이므로 글자 단위로 비교)"""
+    text = unicodedata.normalize("NFKC", text).lower()
+    return re.sub(r"[\W\d_]+", "", text)
+
+
+def fuzzy_score(phrasing, question):
+    """대표 표현이 질문에 얼마나 들어 있는지(0~1).
+
+    표현 글자가 질문에 순서대로 나타나는 비율(coverage)을 주로 보고, 전체 유사도(ratio)를 보조로 사용합니다.
+    """
+    a, b = _normalize(phrasing), _normalize(question)
+    if not a or not b:
+        return 0.0
+    if a in b:
+        return 1.0
+    matcher = SequenceMatcher(None, a, b, autojunk=False)
+    coverage = sum(block.size for block in matcher.get_matching_blocks()) / len(a)
+    return 0.8 * coverage + 0.2 * matcher.ratio()
+
+
+def _term_pattern(phrase):
+    if phrase.isascii():
+        return r"(?<![a-z])" + r"\s*".join(re.escape(word) for word in phrase.split())
+    return r"\s*".join(re.escape(ch) for ch in phrase)
+
+
+_TERM_PATTERNS = sorted(
+    ((phrase, re.compile(_term_pattern(phrase)), term) for term, phrases in TERMS.items() for phrase in phrases),
+    key=lambda item: len(item[0]), reverse=True,
+)
+
+
+def question_terms(question):
+    """질문에 나온 측정값/차원 이름 집합"""
+    text = unicodedata.normalize("NFKC", question).lower()
+    found = set()
+    for _, pattern, term in _TERM_PATTERNS:
+        text, count = pattern.subn("\x00", text)
+        if count:
+            found.add(term)
+    return found
+
+
+def unbound_filter(question):
+    """카탈로그 쿼리가 바인딩할 수 없는 기간/필터 조건이 있으면 그 표현을, 없으면 None을 반환합니다."""
+    text = unicodedata.normalize("NFKC", question).lower()
+    found = _DATE_FILTER_RE.search(text) or _VALUE_FILTER_RE.search(text)
+    return found.group(0) if found else None
+
+
+def _cosine(a, b):
+    dot = sum(x * y for x, y in zip(a, b))
+    norm = math.sqrt(sum(x * x for x in a)) * math.sqrt(sum(y * y for y in b))
+    return dot / norm if norm else 0.0
+
+
+def _params_key(params):
+    return tuple(sorted(params.items()))
+
+
+class QueryCatalog:
+    """등록된 분석 쿼리로 질문을 라우팅하고, 미리 계산한 결과를 보관합니다.
+
+    Args:
+        entries (list): CATALOG 형식의 쿼리 목록
+    """
+
+    def __init__(self, entries=CATALOG):
+        self.entries = {entry["name"]: entry for entry in entries}
+        self._phrasing_embeddings = None
+        self._materialized = {}       # name → 결과 (기본 파라미터)
+        self._materialized_watermark = None
+        self._refresh_lock = threading.Lock()
+        self._refresh_thread = None
+        self._lock = threading.Lock()
+
+    def _embedding_match(self, question):
+        """Azure OpenAI 임베딩으로 가장 가까운 쿼리를 찾습니다 (설정이 없거나 실패하면 (None, 0.0))."""
+        endpoint = os.environ.get("AZURE_OPENAI_ENDPOINT")
+        api_key = os.environ.get("AZURE_OPENAI_API_KEY")
+        deployment = os.environ.get("AZURE_OPENAI_EMBEDDING_DEPLOYMENT")
+        if not all([endpoint, api_key, deployment]):
+            return None, 0.0
+
+        def embed(texts):
+            response = requests.post(
+                f"{endpoint}/openai/deployments/{deployment}/embeddings?api-version=2023-05-15",
+                headers={"Content-Type": "application/json", "api-key": api_key},
+                json={"input": texts},
+                timeout=10
+            )
+            response.raise_for_status()
+            return [item["embedding"] for item in response.json()["data"]]
+
+        try:
+            if self._phrasing_embeddings is None:
+                pairs = [(entry["name"], p) for entry in self.entries.values() for p in entry["phrasings"]]
+                vectors = embed([p for _, p in pairs])
+                self._phrasing_embeddings = [(name, vector) for (name, _), vector in zip(pairs, vectors)]
+            question_vector = embed([question])[0]
+        except Exception as e:
+            logger.warning(f"쿼리 카탈로그 임베딩 매칭 실패: {e}")
+            return None, 0.0
+        best_name, best_sim = None, 0.0
+        for name, vector in self._phrasing_embeddings:
+            sim = _cosine(question_vector, vector)
+            if sim > best_sim:
+                best_name, best_sim = name, sim
+        return best_name, best_sim
+
+    def rank(self, question):
+        """(점수, 쿼리 이름) 목록을 점수 내림차순으로 반환합니다."""
+        scores = [
+            (max(fuzzy_score(p, question) for p in entry["phrasings"]), name)
+            for name, entry in self.entries.items()
+        ]
+        return sorted(scores, reverse=True)
+
+    def match(self, question):
+        """질문에 맞는 쿼리를 찾습니다.
+
+        질문의 측정값/차원이 모두 쿼리의 terms에 있어야 하며, 바인딩할 수 없는 기간/필터 조건이 있으면
+        매칭하지 않습니다 (호출 측이 NL→SQL로 넘어가도록).
+
+        Returns:
+            tuple: (entry, params, score) 또는 매칭 실패 시 None
+        """
+        condition = unbound_filter(question)
+        if condition:
+            logger.info(f"카탈로그 매칭 생략: 바인딩할 수 없는 조건 '{condition}'")
+            return None
+        terms = question_terms(question)
+        ranked = [(score, name) for score, name in self.rank(question) if terms <= self.entries[name]["terms"]]
+        score, name = ranked[0] if ranked else (0.0, None)
+        if score < QUERY_CATALOG_MIN_SCORE:
+            name, score = self._embedding_match(question)
+            if score < QUERY_CATALOG_MIN_SIMILARITY or not terms <= self.entries[name]["terms"]:
+                return None
+        entry = self.entries[name]
+        return entry, self._extract_params(entry, question), score
+
+    def suggestions(self, question, count=3):
+        """매칭 실패 시 안내용으로 점수가 높은 쿼리의 대표 표현을 반환합니다."""
+        return [self.entries[name]["phrasings"][0] for _, name in self.rank(question)[:count]]
+
+    @staticmethod
+    def _extract_params(entry, question):
+        params = dict(entry["params"])
+        if "limit" in params:
+            numbers = [int(n) for n in _NUMBER_RE.findall(question)]
+            if numbers:
+                params["limit"] = max(1, min(numbers[0], QUERY_CATALOG_MAX_LIMIT))
+        return params
+
+    @staticmethod
+    def bind(entry, params):
+        """SQL의 ? 자리에 넣을 파라미터 목록 (CATALOG params 정의 순서)"""
+        return [params[key] for key in entry["params"]]
+
+    def materialized(self, entry, params, watermark):
+        """같은 워터마크로 미리 계산된 결과가 있으면 반환합니다 (기본 파라미터일 때만)."""
+        if watermark is None or watermark != self._materialized_watermark:
+            return None
+        if _params_key(params) != _params_key(entry["params"]):
+            return None
+        return self._materialized.get(entry["name"])
+
+    def needs_refresh(self, watermark):
+        return watermark is not None and watermark != self._materialized_watermark
+
+    def refresh_materialized(self, conn_factory, watermark, execute):
+        """materialize=True인 쿼리를 기본 파라미터로 실행해 결과를 교체합니다.
+
+        Args:
+            conn_factory: with 문으로 연결을 빌려 주는 함수 (예: db_pool.connection)
+            watermark: 이 결과가 해당하는 적재 워터마크
+            execute: (conn, sql, params) → 결과 함수
+        """
+        if not self._refresh_lock.acquire(blocking=False):
+            return False  # 다른 스레드가 이미 갱신 중
+        try:
+            if watermark == self._materialized_watermark:
+                return False
+            start = time.time()
+            results = {}
+            with conn_factory() as conn:
+                for name, entry in self.entries.items():
+                    if not entry.get("materialize"):
+                        continue
+                    try:
+                        results[name] = execute(conn, entry["sql"], self.bind(entry, entry["params"]))
+                    except Exception as e:
+                        logger.warning(f"카탈로그 쿼리 사전 계산 실패 ({name}): {e}")
+            self._materialized = results
+            self._materialized_watermark = watermark
+            logger.info(f"카탈로그 쿼리 {len(results)}개 사전 계산 완료 (watermark={watermark}, {time.time() - start:.2f}s)")
+            return True
+        except Exception as e:
+            logger.warning(f"카탈로그 사전 계산 실패: {e}")
+            return False
+        finally:
+            self._refresh_lock.release()
+
+    def refresh_async(self, conn_factory, watermark, execute):
+        """요청을 막지 않도록 백그라운드 스레드에서 사전 계산합니다.
+
+        이미 갱신 스레드가 돌고 있으면 새로 만들지 않고 False를 반환합니다
+        (적재 직후 요청이 몰려도 스레드는 하나만 생기며, 끝난 뒤 워터마크가 또 바뀌었으면 다음 요청이 다시 시작).
+        """
+        with self._lock:
+            if self._refresh_thread is not None and self._refresh_thread.is_alive():
+                return False
+            self._refresh_thread = threading.Thread(
+                target=self.refresh_materialized, args=(conn_factory, watermark, execute),
+                name="query-catalog-refresh", daemon=True
+            )
+            self._refresh_thread.start()
+        return True
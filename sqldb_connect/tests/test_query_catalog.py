@@ -0,0 +1,90 @@
+import unittest
+from unittest.mock import patch
+import sys
+import os
+import threading
+
+# 상위 디렉토리를 import 경로에 추가
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from query_catalog import CATALOG, QueryCatalog, question_terms, unbound_filter
+
+
+class TestQueryCatalogMatch(unittest.TestCase):
+    """QueryCatalog.match: 대표 표현은 매칭되고, 비슷하지만 다른 질문은 NL→SQL로 넘어가는지 확인"""
+
+    def setUp(self):
+        # 임베딩 매칭은 Azure 호출이므로 항상 실패로 처리
+        self.patcher = patch.object(QueryCatalog, "_embedding_match", return_value=(None, 0.0))
+        self.patcher.start()
+        self.catalog = QueryCatalog()
+
+    def tearDown(self):
+        self.patcher.stop()
+
+    def assertMatches(self, question, name, params=None):
+        matched = self.catalog.match(question)
+        self.assertIsNotNone(matched, question)
+        self.assertEqual(matched[0]["name"], name, question)
+        if params is not None:
+            self.assertEqual(matched[1], params, question)
+
+    def test_phrasings_match_their_entry(self):
+        """모든 대표 표현이 자기 쿼리로 매칭"""
+        for entry in CATALOG:
+            for phrasing in entry["phrasings"]:
+                self.assertMatches(phrasing, entry["name"])
+
+    def test_limit_is_read_from_question(self):
+        """질문의 숫자를 TOP (?) limit으로 사용"""
+        self.assertMatches("국가별 세션 수 상위 3개", "sessions_by_country", {"limit": 3})
+        self.assertMatches("가장 많이 팔린 상품 5개", "top_products_by_revenue", {"limit": 5})
+        self.assertMatches("top 500 best selling products", "top_products_by_revenue", {"limit": 100})
+
+    def test_uncovered_measure_or_dimension_is_a_miss(self):
+        """쿼리가 다루지 않는 측정값/차원이 있으면 매칭하지 않음"""
+        for question in ["방문 채널별 전환율", "상품 카테고리별 평균 가격", "국가별 평균 세션 시간", "브랜드별 매출"]:
+            self.assertIsNone(self.catalog.match(question), question)
+
+    def test_unbound_date_or_filter_is_a_miss(self):
+        """바인딩할 수 없는 기간/필터 조건이 있으면 매칭하지 않음"""
+        for question in ["2017년 국가별 세션 수 상위 3개", "이번달 가장 많이 팔린 상품 5개",
+                         "sessions by country last month", "모바일 기기별 이탈률", "미국 제외 국가별 방문 수"]:
+            self.assertIsNone(self.catalog.match(question), question)
+
+    def test_question_terms(self):
+        """긴 표현을 먼저 찾아 짧은 표현으로 다시 잡히지 않음"""
+        self.assertEqual(question_terms("신규 방문자 수"), {"new_users"})
+        self.assertEqual(question_terms("방문 채널별 전환율"), {"channel", "conversion"})
+        self.assertEqual(question_terms("visitors by country"), {"users", "country"})
+        self.assertIsNone(unbound_filter("일별 방문자 추이"))
+        self.assertEqual(unbound_filter("2017년 국가별 세션 수"), "2017")
+
+
+class TestQueryCatalogRefresh(unittest.TestCase):
+    """refresh_async: 갱신 중에는 스레드를 새로 만들지 않음"""
+
+    def test_refresh_async_runs_once_while_in_flight(self):
+        catalog = QueryCatalog()
+        started, release = threading.Event(), threading.Event()
+        calls = []
+
+        def refresh(conn_factory, watermark, execute):
+            calls.append(watermark)
+            started.set()
+            release.wait(5)
+
+        with patch.object(catalog, "refresh_materialized", side_effect=refresh):
+            self.assertTrue(catalog.refresh_async(None, 1, None))
+            started.wait(5)
+            self.assertFalse(catalog.refresh_async(None, 1, None))
+            self.assertFalse(catalog.refresh_async(None, 2, None))
+            release.set()
+            catalog._refresh_thread.join(5)
+            self.assertTrue(catalog.refresh_async(None, 2, None))
+            catalog._refresh_thread.join(5)
+        self.assertEqual(calls, [1, 2])
+
+
+if __name__ == "__main__":
+    unittest.main()
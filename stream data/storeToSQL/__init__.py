@@ -11,7 +11,8 @@ def main(req: func.HttpRequest) -> func.HttpResponse:
     이 함수는 HTTP 트리거로 실행되며, 다음과 같은 작업을 수행합니다:
     1. BigQuery에서 데이터 조회
     2. 조회된 데이터를 가공하여 SQL Database에 저장
-    3. 처리 결과를 HTTP 응답으로 반환
+    3. 적재 워터마크를 갱신하여 SQL 조회 함수의 결과 캐시를 무효화
+    4. 처리 결과를 HTTP 응답으로 반환
     
     Returns:
         func.HttpResponse: 성공 시 처리된 데이터 요약, 실패 시 오류 메시지
@@ -63,6 +64,15 @@ def main(req: func.HttpRequest) -> func.HttpResponse:
         
         summary_text = format_success_message(success_summary, duplicate_counts)
         
+        # 5. 적재 워터마크 갱신
+        # 새 데이터가 저장된 경우에만 버전을 올려 SQL 조회 함수의 결과 캐시를 무효화합니다
+        if sum(success_summary.values()) > 0:
+            try:
+                client_manager.bump_ingestion_watermark()
+            except Exception as watermark_error:
+                # 워터마크 갱신 실패는 적재 결과에 영향을 주지 않으므로 로깅만 합니다
+                logging.error(f"❌ 적재 워터마크 갱신 실패: {watermark_error}")
+        
         # 중복 키 처리 정보 로깅
         if skipped_hit_keys:
             logging.info(f"🔄 중복으로 건너뛴 hit_key 수: {len(skipped_hit_keys)}")
@@ -74,7 +84,7 @@ def main(req: func.HttpRequest) -> func.HttpResponse:
         )
 
     except Exception as e:
-        # 5. 오류 처리
+        # 6. 오류 처리
         # 전체 프로세스 실행 중 발생한 오류를 로깅하고 클라이언트에게 반환합니다
         error_msg = create_error_response(e, "메인 함수")
         logging.error(error_msg)
@@ -123,6 +123,44 @@ class ClientManager:
         finally:
             cursor.close()
     
+    def bump_ingestion_watermark(self):
+        """적재 워터마크(ga_data.IngestionWatermark.version)를 1 증가시킵니다.
+        
+        적재가 끝난 뒤 호출되며, SQL 조회 함수들은 이 값이 바뀌면 쿼리 결과 캐시를 무효화합니다.
+        워터마크 행이 없으면 새로 만듭니다.
+        
+        Returns:
+            int: 증가된 워터마크 버전
+            
+        Raises:
+            Exception: 갱신 실패 시 발생하며 트랜잭션이 롤백됩니다
+        """
+        cursor = self._sql_conn.cursor()
+        
+        try:
+            cursor.execute(
+                """
+                MERGE ga_data.IngestionWatermark WITH (HOLDLOCK) AS target
+                USING (SELECT 1 AS id) AS source ON target.id = source.id
+                WHEN MATCHED THEN
+                    UPDATE SET version = target.version + 1, updated_at = SYSUTCDATETIME()
+                WHEN NOT MATCHED THEN
+                    INSERT (id, version, updated_at) VALUES (1, 1, SYSUTCDATETIME())
+                OUTPUT inserted.version;
+                """
+            )
+            version = cursor.fetchone()[0]
+            self._sql_conn.commit()
+            logging.info(f"적재 워터마크 갱신: version={version}")
+            return version
+            
+        except Exception as e:
+            self._sql_conn.rollback()
+            logging.error(f"적재 워터마크 갱신 실패: {str(e)}")
+            raise
+        finally:
+            cursor.close()
+    
     def __del__(self):
         """소멸자: 연결을 정리합니다.
         
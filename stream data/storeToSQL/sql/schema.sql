@@ -153,6 +153,28 @@ CREATE TABLE ga_data.HitsProduct (
 );
 GO
 
+-- IngestionWatermark 테이블 생성 (DROP 하지 않음: 버전은 테이블 재생성 후에도 계속 증가해야 합니다)
+-- storeToSQL 적재가 끝날 때마다 version이 1씩 증가하며, SQL 조회 함수의 결과 캐시 무효화 기준으로 사용됩니다
+IF OBJECT_ID('ga_data.IngestionWatermark', 'U') IS NULL
+BEGIN
+    CREATE TABLE ga_data.IngestionWatermark (
+        id INT PRIMARY KEY,                    -- 항상 1 (단일 행)
+        version BIGINT NOT NULL,               -- 적재 버전 (적재 완료 시마다 증가)
+        updated_at DATETIME2 NOT NULL          -- 마지막 적재 완료 시각 (UTC)
+    );
+END
+GO
+
+-- 위에서 ga_data 테이블을 다시 만들었으므로 워터마크를 1 증가 (행이 없으면 생성)
+-- 증가시키지 않으면 SQL 조회 함수들이 삭제 전 데이터로 만든 캐시 결과를 계속 반환합니다
+MERGE ga_data.IngestionWatermark WITH (HOLDLOCK) AS target
+USING (SELECT 1 AS id) AS source ON target.id = source.id
+WHEN MATCHED THEN
+    UPDATE SET version = target.version + 1, updated_at = SYSUTCDATETIME()
+WHEN NOT MATCHED THEN
+    INSERT (id, version, updated_at) VALUES (1, 1, SYSUTCDATETIME());
+GO
+
 -- 인덱스 생성
 -- 쿼리 성능 향상을 위한 인덱스
 CREATE INDEX IX_Sessions_VisitStartTime ON ga_data.Sessions(visitStartTime);